@@ -1,7 +1,8 @@
-import os, sys
+import asyncio
+import os, re, sys
 from typing import TypedDict, Annotated, List, Literal, Optional
+from dataclasses import dataclass
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_groq import ChatGroq
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import create_react_agent
@@ -14,13 +15,41 @@ from langchain_core.prompts import PromptTemplate
 from langgraph.prebuilt import ToolNode
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import InjectedState
-from .database import SessionLocal
-from . import models
+from .blocking_io import run_blocking
+from .llm_scheduler import llm_scheduler, Priority
+from .llm_providers import provider_pool
+from .history import HistoryManager, SUMMARY_RUN_CONFIG, recent_entries, strip_think
+from .tool_dispatch import ToolDispatcher, parse_timeouts
+from .search_cache import SearchCache
+from .report_writer import acreate_consultation, awrite_reports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from Knowledge_notebooks.initialize_rag import VectorRAG_initialize
+from Knowledge_notebooks.semantic_cache import SemanticAnswerCache
+from Knowledge_notebooks.query_embedder import QueryEmbedder
+from Knowledge_notebooks.bm25_index import reciprocal_rank_fusion
+from Knowledge_notebooks.context_compression import ContextCompressor
 from custom_libs.Audioconvert import text_to_speech, speech_to_text
-vector_rag = VectorRAG_initialize()
+from .config import settings
+vector_rag = VectorRAG_initialize(settings.rag_store_layout, settings.rag_vector_format, settings.rag_rerank_factor)
+rag_answer_cache = SemanticAnswerCache(
+    threshold=settings.rag_cache_threshold,
+    max_entries=settings.rag_cache_max_entries,
+    ttl_seconds=settings.rag_cache_ttl_seconds,
+    persist_dir=settings.rag_cache_dir,
+    require_same_terms=settings.rag_cache_require_same_terms,
+) if settings.rag_cache_enabled else None
+query_embedder = QueryEmbedder(
+    vector_rag.embed_documents,
+    run_blocking,
+    cache_size=settings.rag_embed_cache_size,
+    wait_ms=settings.rag_embed_batch_wait_ms,
+    max_batch=settings.rag_embed_max_batch,
+)
+context_compressor = ContextCompressor(
+    sentence_selection=settings.rag_sentence_selection,
+    token_budget=settings.rag_context_token_budget,
+) if settings.rag_compress_context else None
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
@@ -35,51 +64,77 @@ class AgentState(TypedDict):
     current_agent: str
     consultation_id: Optional[int]
     patient_id: Optional[int]
-patient_info = ""
-final_report = ""
+    route: Optional[str]       # where the last agent's plain-text turn goes (set by the node, read by its router)
+    self_loops: int            # consecutive agent turns that routed back to the same agent
+    history: dict              # channel -> {"summary", "upto"}: older turns folded out of the prompt (history.py)
+    patient_info: str          # GP triage summary from Patient_data_report, inlined into specialist / helper prompts
+    final_report: list[str]    # current_report as of the specialist's "Final Report:" turn
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 from dotenv import load_dotenv
-from google.api_core.exceptions import ResourceExhausted
-from tenacity import wait_exponential
 from pathlib import Path
 
 # Load .env from the backend directory (same directory as this file)
 load_dotenv(Path(__file__).parent / ".env")
 
-# === GEMINI (5 req/min limit) ===
-# llm = ChatGoogleGenerativeAI(
-#     model="gemini-2.5-flash",
-#     google_api_key=os.getenv("GEMINI_API_KEY"),
-# )
-
-# llm_rag = ChatGoogleGenerativeAI(
-#     model="gemini-2.0-flash",
-#     google_api_key=os.getenv("GEMINI_API_KEY"),
-# )
-
-# === GROQ (30 req/min limit) ===
-# Using qwen3-32b for better tool calling support (recommended by Groq docs)
-# Other supported models: meta-llama/llama-4-scout-17b-16e-instruct, llama-3.1-8b-instant
-llm = ChatGroq(
-    model="qwen/qwen3-32b",
-    api_key=os.getenv("GROQ_API_KEY"),
-    temperature=0.7,
-)
-
-llm_rag = ChatGroq(
-    model="qwen/qwen3-32b", 
-    api_key=os.getenv("GROQ_API_KEY"),
-    temperature=0.3,
-)
+# Each role is a pool of "provider:model" backends (LLM_*_MODELS, see llm_providers.py), e.g.
+#   LLM_TRIAGE_MODELS=groq:llama-3.1-8b-instant,groq:qwen/qwen3-32b
+#   LLM_SPECIALIST_MODELS=groq:qwen/qwen3-32b,gemini:gemini-2.5-flash
+# qwen3-32b is the default for better tool calling support (recommended by Groq docs)
+llm_triage = provider_pool("triage", settings.llm_triage_models, temperature=0.7)
+llm = provider_pool("specialist", settings.llm_specialist_models, temperature=0.7)
+llm_rag = provider_pool("rag", settings.llm_rag_models, temperature=0.3)
 
 print("LLM instances with retry logic configured successfully.")
 
+
+async def _summarize_history(previous: str, lines: list, max_tokens: int) -> str:
+    """Fold older turns of a channel into its running summary (llm_rag: low temperature, no tools)."""
+    prompt = SystemMessage(content=f"""You maintain the running summary of a medical consultation.
+Update the summary with the new turns below. Keep every clinically relevant fact: symptoms and their duration, age and other demographics, history, findings, test results, referrals, reports filed and questions still open. Drop greetings and repetition.
+Answer with the updated summary only, in at most {max_tokens * 3 // 4} words.
+
+Current summary:
+{previous or "None"}
+
+New turns:
+""" + "\n".join(lines))
+    response = await llm_scheduler.ainvoke(llm_rag, [prompt, HumanMessage(content="Update the summary.")],
+                                           config=SUMMARY_RUN_CONFIG)
+    summary = strip_think(_get_content_str(response))
+    if not summary:
+        raise ValueError("empty summary")
+    return summary
+
+
+# Per-channel prompt budgets: recent turns verbatim, older ones folded into AgentState['history']
+history_manager = HistoryManager(
+    budgets={
+        'messages': settings.history_gp_token_budget,
+        'specialist_messages': settings.history_specialist_token_budget,
+        'patho_messages': settings.history_patho_token_budget,
+        'radio_messages': settings.history_radio_token_budget,
+    },
+    keep_turns=settings.history_keep_turns,
+    summary_tokens=settings.history_summary_tokens,
+    summarizer=_summarize_history if settings.history_summarizer == "llm" else None,
+    enabled=settings.history_enabled,
+)
+
 tavily_search = TavilySearch(
     max_results=5,
     search_depth="basic",
 )
+search_cache = SearchCache(
+    lambda query: tavily_search.ainvoke({"query": query}),
+    params={"max_results": 5, "search_depth": "basic"},
+    ttl_seconds=settings.search_cache_ttl_seconds,
+    max_entries=settings.search_cache_max_entries,
+    max_chars=settings.search_result_max_chars,
+    mode=settings.search_mode,
+    replay_dir=settings.search_replay_dir,
+    enabled=settings.search_cache_enabled,
+)
 
 @tool
 def ask_user(question: str) -> str:
@@ -95,7 +150,7 @@ def ask_user(question: str) -> str:
 
 
 @tool
-def search_internet(query: str) -> str:
+async def search_internet(query: str) -> str:
     """Search the internet for the given query and return the top results.
 
     Args:
@@ -105,119 +160,56 @@ def search_internet(query: str) -> str:
         str: Top search results or an error message.
     """
     try:
-        result = tavily_search.invoke({"query": query})
-        if isinstance(result, (dict, list)):
-            import json
-            return json.dumps(result, indent=2)
-        return str(result)
+        return await search_cache.search(query)
     except Exception as e:
         return f"Search failed: {str(e)}"
 
 
-@tool
-def add_report(report: str, state: Annotated[dict, InjectedState]) -> str:
+@tool(response_format="content_and_artifact")
+async def add_report(report: str, state: Annotated[dict, InjectedState]):
     """
     Add a report. Automatically attaches to the currently ACTIVE consultation.
     """
     
     current_patient_id = state.get("patient_id")
     if not current_patient_id:
-        return "Error: No Patient ID linked."
+        return "Error: No Patient ID linked.", None
 
     is_final = "Final Report" in report or "Diagnosis" in report
+    if settings.report_buffering:
+        # Written together with the rest of this turn's reports by the tool node (_flush_queued_reports)
+        return "Report queued for the patient's record.", {"queued_report": [report, is_final]}
 
     try:
-        with SessionLocal() as db:
-            consult = db.query(models.Consultation).filter(
-                models.Consultation.patient_id == current_patient_id,
-                models.Consultation.status == 'Active'
-            ).order_by(models.Consultation.consultation_id.desc()).first()
-            
-            if not consult:
-                return "Error: No Active Consultation found. Please triage patient first."
-
-            if is_final:
-                db_report = models.MedicalReport(
-                    consultation_id=consult.consultation_id,
-                    diagnosis=report,
-                    treatment="See details"
-                )
-                db.add(db_report)
-                consult.status = "Completed"
-                db.commit()
-                print(f"✅ DB: Saved FINAL REPORT for Consult #{consult.consultation_id}")
-                
-            else:
-                new_order = models.LabOrder(
-                    consultation_id=consult.consultation_id,
-                    test_name="Helper Finding",
-                    status="Completed"
-                )
-                db.add(new_order)
-                db.commit()
-                
-                new_result = models.LabResult(
-                    order_id=new_order.order_id,
-                    findings=report
-                )
-                db.add(new_result)
-                db.commit()
-                print(f"✅ DB: Saved LAB RESULT for Consult #{consult.consultation_id}")
-
-            return "Report added to patient's record."
-
+        consultation_id = await awrite_reports(current_patient_id, state.get("consultation_id"), [(report, is_final)])
     except Exception as e:
-        return f"Database Error: {str(e)}"
-@tool
-def Patient_data_report(data: str, state: Annotated[dict, InjectedState]) -> str:
+        return f"Database Error: {str(e)}", None
+    if consultation_id is None:
+        return "Error: No Active Consultation found. Please triage patient first.", None
+    return "Report added to patient's record.", {"consultation_id": consultation_id}
+
+
+@tool(response_format="content_and_artifact")
+async def Patient_data_report(data: str, state: Annotated[dict, InjectedState]):
     """
     Process patient data. Creates a new 'Active' Consultation in the database.
     """
-    global patient_info
-    patient_info = data
-    
+    # The artifact carries `data` (and the new consultation's id) into this thread's AgentState (see make_tool_invoker)
+    recorded = {"patient_info": data}
+
     current_patient_id = state.get("patient_id")
     if not current_patient_id:
-        return "Error: Patient ID not found."
+        return "Error: Patient ID not found.", recorded
 
     try:
-        with SessionLocal() as db:
-            existing = db.query(models.Consultation).filter(
-                models.Consultation.patient_id == current_patient_id,
-                models.Consultation.status == "Active"
-            ).first()
-            if existing:
-                existing.status = "Abandoned"
-                db.commit()
-            
-            new_consult = models.Consultation(
-                patient_id=current_patient_id,
-                status="Active"
-            )
-            db.add(new_consult)
-            db.commit()
-            db.refresh(new_consult)
-            print(f"✅ DB: Created Consultation #{new_consult.consultation_id}")
-            return f"Patient Data compiled. Consultation #{new_consult.consultation_id} Started."
-            
+        consultation_id = await acreate_consultation(current_patient_id)
+        return f"Patient Data compiled. Consultation #{consultation_id} Started.", {**recorded, "consultation_id": consultation_id}
     except Exception as e:
         error_msg = f"❌ DB Error in Patient_data_report: {str(e)}"
         print(error_msg)
-        return f"Error: Failed to create consultation - {str(e)}"
-@tool
-def VectorRAG_Retrival(query:str, agent:str)->str:
-    """Retrieve and synthesize information from a domain-specific vector store.
-
-    Args:
-        query (str): The user's question to be answered.
-        agent (str): The medical specialist domain from list: ['Ophthalmologist', 'Dermatology', 'ENT', 'Gynecology', 'Internal Medicine', 'Orthopedics', 'Pathology', 'Pediatrics', 'Psychiatry'], 
-            (e.g., "Ophthalmologist") 
-            used to select the appropriate vector store.
-
-    Returns:
-        str: A synthesized, context-based answer generated by the language model.
-
-    """
+        return f"Error: Failed to create consultation - {str(e)}", recorded
+def _rag_domain(agent: str) -> str:
+    """Map a free-form specialist/domain name onto a vector store key."""
     if "opthal" in agent.lower():
         agent = "Ophthalmologist"
     elif "derma" in agent.lower():
@@ -236,13 +228,53 @@ def VectorRAG_Retrival(query:str, agent:str)->str:
         agent = "Pediatrics"
     elif "psych" in agent.lower():
         agent = "Psychiatry"
+    return agent.strip()
 
-    retriever = vector_rag.vector_store[agent].as_retriever(search_kwargs={"k": 5})
-    relevant_docs = retriever.invoke(query)
 
+@tool
+async def VectorRAG_Retrival(query:str, agent:str)->str:
+    """Retrieve and synthesize information from a domain-specific vector store.
+
+    Args:
+        query (str): The user's question to be answered.
+        agent (str): The medical specialist domain from list: ['Ophthalmologist', 'Dermatology', 'ENT', 'Gynecology', 'Internal Medicine', 'Orthopedics', 'Pathology', 'Pediatrics', 'Psychiatry'], 
+            (e.g., "Ophthalmologist") 
+            used to select the appropriate vector store. Several domains can be
+            searched together by separating them with commas (e.g., "Internal Medicine, Pathology").
+
+    Returns:
+        str: A synthesized, context-based answer generated by the language model.
+
+    """
+    domains = list(dict.fromkeys(_rag_domain(part) for part in agent.split(",") if part.strip()))
+    agent = ", ".join(domains)
+
+    # First use of a domain loads the embedding model / Chroma store; keep that off the event loop
+    for domain in domains:
+        if await run_blocking(vector_rag.get_store, domain) is None:
+            return f"No knowledge base is available for {domain}."
+    # Lexical search doesn't need the embedding, so it runs while the query is embedded
+    lexical = asyncio.ensure_future(
+        run_blocking(vector_rag.lexical_search, domains, query, settings.rag_candidates_k)
+    ) if settings.rag_hybrid else None
+    query_embedding = await query_embedder.embed(query)
+    fingerprint = tuple(vector_rag.store_fingerprint(domain) for domain in domains)
+    if rag_answer_cache is not None:
+        cached = rag_answer_cache.get(agent, query_embedding, fingerprint, query_text=query)
+        if cached is not None:
+            if lexical is not None:
+                lexical.cancel()
+            return cached
+    dense = await run_blocking(vector_rag.search_by_vector, domains, query_embedding, settings.rag_candidates_k)
+    if lexical is not None:
+        relevant_docs = reciprocal_rank_fusion([dense, await lexical], k=settings.rag_top_k)
+    else:
+        relevant_docs = dense[:settings.rag_top_k]
+
+    context = context_compressor.compress(relevant_docs, query) if context_compressor else relevant_docs
     Systemprompt = SystemMessage(content=f"""
     <context>
-    {relevant_docs}
+    {context}
     </context>
 
     Based ONLY on the documents in the context above, provide a clear, consolidated answer to the following question. Use bullet points and headings if it improves clarity.
@@ -252,23 +284,155 @@ def VectorRAG_Retrival(query:str, agent:str)->str:
     If the documents do not contain enough information to form a comprehensive answer, you must state that a complete answer is not available in the provided text.
     """
     )
-    response = llm_rag.invoke([Systemprompt]+[HumanMessage(content="Help me with this")])
+    response = await llm_scheduler.ainvoke(llm_rag, [Systemprompt]+[HumanMessage(content="Help me with this")], Priority.BACKGROUND)
+    if rag_answer_cache is not None:
+        await run_blocking(rag_answer_cache.put, agent, query, query_embedding, response.content, fingerprint)
     return response.content
 
-gp_llm = llm.bind_tools([ask_user, Patient_data_report])
-pediallm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-ophthalllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-orthollm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-dermallm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-entllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-gynecllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-psychllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-intmedllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-radllm = llm.bind_tools([ask_user, search_internet, add_report])
-pathllm = llm.bind_tools([ask_user, search_internet, add_report, VectorRAG_Retrival])
-
-def general_physician(state: AgentState) -> AgentState:
-    SystemPrompt = SystemMessage(content=f"""
+
+@dataclass(frozen=True)
+class Specialist:
+    """One row of the specialist registry; everything else about the node is generated."""
+    node: str                  # graph node name and `current_agent` label
+    prefix: str                # prefix of the `<prefix>_Tooler` / `<prefix>_AskUser` nodes
+    title: str                 # "You are a High Quality {title}."
+    rag_domain: str            # VectorRAG_Retrival domain the prompt points the agent at
+    aliases: tuple             # other names the GP may refer by (matched whole, case-insensitive)
+
+
+SPECIALISTS = [
+    Specialist("Pediatrician", "Pedia", "Pediatrician", "Pediatrics", ("pediatric", "paediatrics")),
+    Specialist("Ophthalmologist", "Ophthal", "Ophthalmologist", "Ophthalmologist", ("ophthalmology",)),
+    Specialist("Orthopedist", "Ortho", "Orthopedist", "Orthopedics", ("orthopedic", "orthopaedics")),
+    Specialist("Dermatologist", "Dermat", "Dermatologist", "Dermatology", ()),
+    Specialist("Gynecologist", "Gynec", "Gynecologist", "Gynecology", ("gynaecology",)),
+    Specialist("Psychiatrist", "Psych", "Psychiatrist", "Psychiatry", ()),
+    Specialist("Internal Medicine", "IntMed", "Internal Medicine Specialist", "Internal Medicine", ("internist",)),
+    Specialist("ENT", "ENT", "ENT Specialist", "ENT", ("otolaryngology", "ear nose and throat")),
+]
+SPECIALIST_NODES = [s.node for s in SPECIALISTS]
+HELPER_NODES = ("Pathologist", "Radiologist")
+
+def _route_key(text: str) -> str:
+    """Normalize a specialist name (or a whole answer that should be one) for the lookup tables."""
+    text = strip_think(text).lower().replace("&", "and")
+    return " ".join(re.sub(r"[^a-z ]+", " ", text).split())
+
+
+# Every accepted name -> registry row; routing is one dict lookup, never a substring scan
+SPECIALIST_ROUTES = {
+    _route_key(name): spec
+    for spec in SPECIALISTS
+    for name in (spec.node, spec.title, spec.rag_domain, *spec.aliases)
+}
+HELPER_ROUTES = {_route_key(name): name for name in HELPER_NODES}
+
+# Terminal plain-text formats the prompts ask for (anchored, so a passing mention doesn't end a thread)
+FINAL_REPORT = re.compile(r"^\W*final report\s*:", re.IGNORECASE | re.MULTILINE)
+HELPER_FINAL_REPORT = re.compile(r"^\W*this is the final report to (the )?specialist", re.IGNORECASE | re.MULTILINE)
+HELPER_CALLER = re.compile(r"^Question from (.+) to (?:Pathologist|Radiologist): $")
+
+
+@tool(response_format="content_and_artifact")
+def refer_to_specialist(specialist: str):
+    """Hand the patient over to a specialist. Call it once, after Patient_data_report, as your last action.
+
+    Args:
+        specialist (str): One of: Pediatrics, Ophthalmology, Orthopedics, Dermatology, ENT, Gynecology, Psychiatry, Internal Medicine.
+
+    Returns:
+        str: Confirmation of the referral, or the list of valid specialists.
+    """
+    spec = SPECIALIST_ROUTES.get(_route_key(specialist))
+    if spec is None:
+        return f"Unknown specialist '{specialist}'. Choose one of: {', '.join(s.rag_domain for s in SPECIALISTS)}.", None
+    return f"Patient referred to {spec.node}.", {"target": spec.node}
+
+
+@tool(response_format="content_and_artifact")
+def consult_helper(helper: Literal["Pathologist", "Radiologist"], question: str):
+    """Ask the Pathologist (lab tests) or Radiologist (imaging) for help. Their findings are added to your context.
+
+    Args:
+        helper (str): "Pathologist" or "Radiologist".
+        question (str): What you need from them, e.g. the tests or imaging to request and why.
+
+    Returns:
+        str: Confirmation that the question was sent.
+    """
+    target = HELPER_ROUTES.get(_route_key(helper))
+    if target is None:
+        return f"Unknown helper '{helper}'. Choose Pathologist or Radiologist.", None
+    return f"Question sent to {target}. Their findings will appear in your context.", {"target": target, "question": question}
+
+
+ROUTING_TOOLS = {"refer_to_specialist", "consult_helper"}
+
+GP_TOOLS = [ask_user, Patient_data_report, refer_to_specialist]
+PATHO_TOOLS = [ask_user, search_internet, add_report, VectorRAG_Retrival]
+SPECIALIST_TOOLS = PATHO_TOOLS + [consult_helper]
+RADIO_TOOLS = [ask_user, search_internet, add_report]
+ASK_TOOLS = [ask_user]
+
+_bound_llms = {}
+_tool_nodes = {}
+
+
+def _tool_set_key(tools) -> tuple:
+    return tuple(t.name for t in tools)
+
+
+def bound_llm(tools, model=None):
+    """One `model.bind_tools` per distinct (role, tool set), shared by every agent using it."""
+    model = model or llm
+    key = (model.role,) + _tool_set_key(tools)
+    if key not in _bound_llms:
+        _bound_llms[key] = model.bind_tools(tools)
+    return _bound_llms[key]
+
+
+def tool_node(tools) -> ToolNode:
+    """One ToolNode per distinct tool set, shared by every *_Tooler / *_AskUser node."""
+    key = _tool_set_key(tools)
+    if key not in _tool_nodes:
+        _tool_nodes[key] = ToolNode(tools)
+    return _tool_nodes[key]
+
+
+# Tools that write the consultation: never overlapped, run in the order the model called them
+SEQUENTIAL_TOOLS = ("add_report", "Patient_data_report")
+_tool_dispatchers = {}
+
+
+def tool_dispatcher(tools) -> ToolDispatcher:
+    """One ToolDispatcher per tool set, over the shared ToolNode (see tool_dispatch.py)."""
+    key = _tool_set_key(tools)
+    if key not in _tool_dispatchers:
+        _tool_dispatchers[key] = ToolDispatcher(
+            tool_node(tools),
+            sequential=SEQUENTIAL_TOOLS,
+            timeouts=parse_timeouts(settings.tool_timeouts),
+            default_timeout=settings.tool_timeout_seconds,
+        )
+    return _tool_dispatchers[key]
+
+
+def tool_dispatch_stats() -> dict:
+    return {
+        "dispatch": {", ".join(key): d.stats() for key, d in _tool_dispatchers.items()},
+        "search_cache": search_cache.stats(),
+    }
+
+
+gp_llm = bound_llm(GP_TOOLS, llm_triage)
+specialist_llm = bound_llm(SPECIALIST_TOOLS)
+pathllm = bound_llm(PATHO_TOOLS)
+radllm = bound_llm(RADIO_TOOLS)
+
+
+# Static instructions are built once at import and always sent first, so providers that cache prompt
+# prefixes can reuse them; per-turn data goes in a short context message after them (_context).
+GP_PREFIX = SystemMessage(content="""
 You are a Medical Router AI / General Physician.
 
 Your job is to assign patients to the MOST APPROPRIATE specialist from the list:
@@ -284,7 +448,7 @@ Rules & Process:
 
 2. Only AFTER you have enough information, call Patient_data_report with a concise structured summary (demographics + key symptoms + relevant negatives).
 
-3. Just AFTER Patient_data_report has been called and confirmed (Patient_data_report status: {bool(patient_info)} is True), output EXACTLY the specialist name; return ONLY the name, nothing else.
+3. Just AFTER Patient_data_report has been called and confirmed (see "Patient_data_report status" in the consultation context), call refer_to_specialist with the specialist name. (If you cannot call it, reply with ONLY the name, nothing else.)
 
 4. Specialist criteria:
 
@@ -304,13 +468,32 @@ Rules & Process:
    - If symptoms overlap multiple specialties, prioritize the **underlying cause** over just local symptoms.
    - Do NOT prescribe medications; your role is purely triage.
    - Never guess age or other demographic details — always collect via ask_user.
-7. If you do not call any tool and neither a valid specialist name, it will simply loop back to you, try avoiding that.
+7. If you neither call a tool nor reply with exactly a valid specialist name, it will loop back to you, and after a few such replies the consultation ends. Avoid that.
 Begin by greeting the patient, then ask the first clarifying question using ask_user.
 """)
 
-    response = gp_llm.invoke([SystemPrompt]+state['messages'])
-    return {'messages' : [response], 'current_agent': 'GP'}
+GP_CONTEXT = """Consultation context (updated every turn):
+- Patient_data_report status: {recorded}"""
+
+
+def _context(template: str, **values) -> SystemMessage:
+    return SystemMessage(content=template.format(**values))
+
 
+async def general_physician(state: AgentState) -> AgentState:
+    context = _context(GP_CONTEXT, recorded=bool(state.get('patient_info')))
+
+    window, history = await history_manager.window(state, 'messages')
+    response = await llm_scheduler.ainvoke(gp_llm, [GP_PREFIX, context]+window)
+    update = {'messages' : [response], 'current_agent': 'GP', **history}
+    if getattr(response, 'tool_calls', None):
+        return {**update, 'self_loops': 0}
+    # Constrained output: the whole answer must be a specialist name
+    spec = SPECIALIST_ROUTES.get(_route_key(_get_content_str(response)))
+    if spec is not None:
+        return {**update, 'route': spec.node, 'self_loops': 0, 'next_agent': list(state.get('next_agent') or []) + [spec.node]}
+    loops, capped = _self_loop(state, "GP")
+    return {**update, 'route': "end" if capped else "GP", 'self_loops': loops}
 
 
 def _get_content_str(message) -> str:
@@ -328,536 +511,53 @@ def _get_content_str(message) -> str:
     return content if content else ''
 
 
-def router_gp(state: AgentState) -> AgentState:
-    last_message = state['messages'][-1]
-    content = _get_content_str(last_message).lower()
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        if ask_user_called:
-            return "GP_AskUser"
-        return "GP_Tooler"
-    elif "pediatrics" in content or "pediatrician" in content:
-        state['next_agent'].append('Pediatrician')
-        return "pediatrics"
-    elif "ophthalmology" in content or "ophthalmologist" in content:
-        state['next_agent'].append('Ophthalmologist')
-        return "ophthalmology"
-    elif "Orthopedist" in content or "orthopedist" in content:
-        state['next_agent'].append('Orthopedist')
-        return "Orthopedics"
-    elif "dermatology" in content or "dermatologist" in content:
-        state['next_agent'].append('Dermatologist')
-        return "dermatology"
-    elif "gynecology" in content or "gynecologist" in content:
-        state['next_agent'].append('Gynecologist')
-        return "gynecology"
-    elif "psychiatry" in content or "psychiatrist" in content:
-        state['next_agent'].append('Psychiatrist')
-        return "psychiatry"
-    elif "internal medicine" in content or "internal" in content:
-        state['next_agent'].append('Internal Medicine')
-        return "internal medicine"
-    elif "ent" in content:
-        state['next_agent'].append('ENT')
-        return "ent"
-    else:
-        return "GP"
-
+def _self_loop(state: AgentState, agent: str):
+    """Count a turn that routes `agent` back to itself; capped once the thread exceeds GRAPH_MAX_SELF_LOOPS in a row."""
+    loops = (state.get('self_loops') or 0) + 1
+    capped = loops > settings.graph_max_self_loops
+    if capped:
+        print(f"⚠️ {agent} looped back to itself {loops - 1} times in a row; loop guard taking over")
+    return loops, capped
 
-def Ophthalmologist(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Ophthalmologist.
 
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (e.g., "Ophthalmologist").  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
+def _reports(state: AgentState, response) -> dict:
+    """`current_report` update for the add_report calls in an agent's turn."""
+    reports = [tc['args'].get('report', '') for tc in response.tool_calls if tc['name'] == 'add_report']
+    return {'current_report': list(state.get('current_report') or []) + reports} if reports else {}
 
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
 
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
+def _route_tool_calls(last_message, ask_node: str, tooler_node: str):
+    if any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls):
+        return ask_node
+    return tooler_node
 
-""")
 
-    
-    response = ophthalllm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Ophthalmologist'}
-
-def router_opthal(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-
-        if ask_user_called:
-            return "Ophthal_AskUser"
-        return "Ophthal_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Ophthalmologist')
-        state["patho_QnA"].append("Question from Ophthalmologist to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Ophthalmologist')
-        state['radio_QnA'].append("Question from Ophthalmologist to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Ophthalmologist"
-
-def Pediatrician(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Pediatrician.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain ("Pediatrics").  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
-
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = pediallm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Pediatrician'}
-
-def router_pedia(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Pedia_AskUser"
-        return "Pedia_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Pediatrician')
-        state["patho_QnA"].append("Question from Pediatrician to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Pediatrician')
-        state['radio_QnA'].append("Question from Pediatrician to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Pediatrician"
-
-def Orthopedist(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Orthopedist.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (Orthopedics).  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
-
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = orthollm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Orthopedist'}
-
-def router_ortho(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Ortho_AskUser"
-        return "Ortho_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Orthopedist')
-        state["patho_QnA"].append("Question from Orthopedist to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Orthopedist')
-        state['radio_QnA'].append("Question from Orthopedist to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Orthopedist"
-
-def Dermatologist(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Dermatologist.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (Dermatology).  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
-
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = dermallm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Dermatologist'}
-
-def router_dermat(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Dermat_AskUser"
-        return "Dermat_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Dermatologist')
-        state["patho_QnA"].append("Question from Dermatologist to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Dermatologist')
-        state['radio_QnA'].append("Question from Dermatologist to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Dermatologist"
-
-def ENT(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality ENT Specialist.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (ENT).  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
-
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = entllm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'ENT'}
-
-def router_ent(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "ENT_AskUser"
-        return "ENT_Tooler"
-
-    elif "pathologist" in content:
-        state['next_agent'].append('ENT')
-        state["patho_QnA"].append("Question from ENT to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('ENT')
-        state['radio_QnA'].append("Question from ENT to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "ENT"
-
-def Gynecologist(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Gynecologist.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (Gynecology).  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
-
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = gynecllm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Gynecologist'}
-
-def router_gynec(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Gynec_AskUser"
-        return "Gynec_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Gynecologist')
-        state["patho_QnA"].append("Question from Gynecologist to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Gynecologist')
-        state['radio_QnA'].append("Question from Gynecologist to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Gynecologist"
+def router_gp(state: AgentState) -> str:
+    last_message = state['messages'][-1]
+    if isinstance(last_message, ToolMessage):
+        return "GP"  # the patient's answer, injected by api.py on resume
+    if getattr(last_message, 'tool_calls', None):
+        return _route_tool_calls(last_message, "GP_AskUser", "GP_Tooler")
+    return state.get('route') or "GP"
 
-def Psychiatrist(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Psychiatrist.
 
-Your patient's initial data is: {patient_info}.
+SPECIALIST_PROMPT = """You are a High Quality {title}.
 
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
+The patient's initial data, the Radiologist and Pathologist QnA and the current report are given in the consultation context message that follows these instructions.
 
-You have access to three tools:
+You have access to these tools:
 1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
 2. **search_internet** - Use this tool to look up any medical information you need. 
 3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (Psychiatry).  
+4. **consult_helper(helper, question)** - Use this tool to ask the Pathologist (lab tests) or Radiologist (imaging) for help.
+5. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
+   - Always pass the correct `agent` domain ("{rag_domain}").  
    - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
    - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
 
 Your tasks:
 1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
+2. **Use Helpers**: If you need a Pathologist or Radiologist, call `consult_helper` with helper "Pathologist" or "Radiologist" and your question.
 3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
 4. **Final Analysis & Reporting (VERY LAST ACTION):**
    Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
@@ -871,135 +571,108 @@ Rules:
 - Responses from Pathologist or Radiologist will automatically be added to your context.
 - Never ask multiple questions in one tool call.
 - Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
-
-""")
-
-    
-    response = psychllm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Psychiatrist'}
-
-def router_psych(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Psych_AskUser"
-        return "Psych_Tooler"
-
-    elif "pathologist" in content:
-        state['next_agent'].append('Psychiatrist')
-        state["patho_QnA"].append("Question from Psychiatrist to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Psychiatrist')
-        state['radio_QnA'].append("Question from Psychiatrist to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Psychiatrist"
-
-
-def Internal_Medicine(state: AgentState) -> AgentState:
-    global patient_info
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Internal Medicine Specialist.
-
-Your patient's initial data is: {patient_info}.
-
-Current status:
-1. Status of Radiologist QnA: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}.
-2. Status of Pathologist QnA: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}.
-3. Current report status: {", ".join(state['current_report']) if state['current_report'] else "None"}.
-
-You have access to three tools:
-1. **ask_user** - Use this tool to ask the patient any questions you need answered. 
-2. **search_internet** - Use this tool to look up any medical information you need. 
-3. **add_report** - Use this tool to add relevant findings to the report. You can call it multiple times. 'current_report' will include Pathologist and Radiologist findings after you request their help.
-4. **VectorRAG_Retrival(query:str, agent:str)** - Use this tool to retrieve and synthesize knowledge from a high-quality vector store of medical books and guidelines.  
-   - Always pass the correct `agent` domain (Internal Medicine).  
-   - You may use it any number of times whenever deeper, authoritative medical knowledge is needed.  
-   - If the first query does not provide a satisfactory answer, you may try **one or two re-phrased queries**, but do not enter an infinite loop.
-
-Your tasks:
-1. **Ask Questions**: If more patient information is needed, you MUST use the 'ask_user' tool. Ask one question at a time.
-2. **Use Helpers**: If you need a Pathologist or Radiologist, output plain text like: 
-   - "I need a blood report from Pathologist, (your question)"
-   - "I need imaging studies from Radiologist, (your question)"
-3. **Use Knowledge Bases**: If medical domain expertise is required, you may use the VectorRAG_Retrival tool. Prefer it over raw internet search for authoritative textbook knowledge.
-4. **Final Analysis & Reporting (VERY LAST ACTION):**
-   Only when you have gathered ALL necessary information (from the patient, helpers, and internet searches) should you begin the final two-step reporting process.
-
-   **Step A (Log Final Summary):** First, you MUST call the `add_report` tool one last time. This single tool call must contain your complete, synthesized findings, including a definitive Diagnosis, a full Treatment Plan, and clear Follow-up Instructions.
+- If you return plain text that does not start with 'Final Report:', it will be ignored.
+
+"""
+
+
+def _recent_or_none(items) -> str:
+    return recent_entries(items, settings.history_qna_token_budget)
+
+
+SPECIALIST_CONTEXT = """Consultation context (updated every turn):
+- Patient's initial data: {patient_info}
+- Radiologist QnA: {radio_qna}
+- Pathologist QnA: {patho_qna}
+- Current report: {current_report}"""
+
+SPECIALIST_PREFIXES = {
+    spec.node: SystemMessage(content=SPECIALIST_PROMPT.format(title=spec.title, rag_domain=spec.rag_domain))
+    for spec in SPECIALISTS
+}
+
+
+def make_specialist_node(spec: Specialist):
+    prefix = SPECIALIST_PREFIXES[spec.node]
+
+    async def specialist(state: AgentState) -> AgentState:
+        context = _context(
+            SPECIALIST_CONTEXT,
+            patient_info=state.get('patient_info') or "None",
+            radio_qna=_recent_or_none(state['radio_QnA']),
+            patho_qna=_recent_or_none(state['patho_QnA']),
+            current_report=_recent_or_none(state['current_report']),
+        )
+        window, history = await history_manager.window(state, 'specialist_messages')
+        response = await llm_scheduler.ainvoke(specialist_llm, [prefix, context]+window)
+        update = {'specialist_messages' : [response], 'current_agent': spec.node, **history}
+        if getattr(response, 'tool_calls', None):
+            return {**update, **_reports(state, response), 'self_loops': 0}
+        if FINAL_REPORT.search(_get_content_str(response)):
+            return {**update, 'route': "end", 'self_loops': 0, 'final_report': list(state.get('current_report') or [])}
+        loops, capped = _self_loop(state, spec.node)
+        return {**update, 'route': "end" if capped else spec.node, 'self_loops': loops}
+
+    specialist.__name__ = spec.node.replace(" ", "_")
+    return specialist
+
+
+def make_specialist_router(spec: Specialist):
+    def router(state: AgentState) -> str:
+        last_message = state['specialist_messages'][-1]
+        if isinstance(last_message, ToolMessage):
+            return spec.node
+        if getattr(last_message, 'tool_calls', None):
+            return _route_tool_calls(last_message, f"{spec.prefix}_AskUser", f"{spec.prefix}_Tooler")
+        return state.get('route') or spec.node
+
+    router.__name__ = f"router_{spec.prefix.lower()}"
+    return router
+
+
+def _caller_from_qna(qna) -> str:
+    for entry in reversed(qna or []):
+        match = HELPER_CALLER.match(entry)
+        if match and match.group(1) in SPECIALIST_NODES:
+            return match.group(1)
+    return "Orthopedist"
+
+
+def _helper_outcome(state: AgentState, response, helper: str, qna_key: str) -> dict:
+    """A helper's turn: report calls, or hand the answer back to the specialist that asked (popping `next_agent`)."""
+    if getattr(response, 'tool_calls', None):
+        return {**_reports(state, response), 'self_loops': 0}
+    answer = _get_content_str(response)
+    if not HELPER_FINAL_REPORT.search(answer):
+        loops, capped = _self_loop(state, helper)
+        if not capped:
+            return {'route': helper, 'self_loops': loops}
+        answer = f"{helper} could not produce a report for this request."
+    callers = list(state.get('next_agent') or [])
+    caller = callers.pop() if callers else _caller_from_qna(state.get(qna_key))
+    return {
+        'route': caller,
+        'self_loops': 0,  # the caller starts its own count; the exhausted loops were the helper's
+        'next_agent': callers,
+        qna_key: list(state.get(qna_key) or []) + [f"{helper} Answer report to specialist:", answer],
+    }
 
-   **Step B (Output Final Report):** After the final `add_report` tool call is confirmed, you MUST immediately output the complete, human-readable report using the exact phrase `Final Report: (your full report text)`. Do not perform any other actions after this.
-Rules:
-- Always use the 'ask_user' tool for questions to the patient.
-- The conversation continues until a Final Report is produced.
-- Responses from Pathologist or Radiologist will automatically be added to your context.
-- Never ask multiple questions in one tool call.
-- Do not loop indefinitely with VectorRAG_Retrival: maximum 2 reformulations if the first query fails.
-- If you return plain text that does not mention 'pathologist', 'radiologist', or 'Final Report:', it will be ignored.
 
-""")
+def make_helper_router(name: str, prefix: str, channel: str):
+    def router(state: AgentState) -> str:
+        last_message = state[channel][-1]
+        if isinstance(last_message, ToolMessage):
+            return name
+        if getattr(last_message, 'tool_calls', None):
+            return _route_tool_calls(last_message, f"{prefix}_AskUser", f"{prefix}_Tooler")
+        return state.get('route') or name
 
-    
-    response = intmedllm.invoke([SystemPrompt]+state['specialist_messages']) 
-    return {'specialist_messages' : [response], 'current_agent': 'Internal Medicine'}
-
-def router_medicine(state: AgentState) -> AgentState:
-    global final_report
-    last_message = state['specialist_messages'][-1]
-    content = _get_content_str(last_message).lower()
-
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "IntMed_AskUser"
-        return "IntMed_Tooler"
-    
-    elif "pathologist" in content:
-        state['next_agent'].append('Internal Medicine')
-        state["patho_QnA"].append("Question from Internal Medicine to Pathologist: ")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        return "Pathologist"
-    elif "radiologist" in content:
-        state['next_agent'].append('Internal Medicine')
-        state['radio_QnA'].append("Question from Internal Medicine to Radiologist: ")
-        state['radio_QnA'].append(_get_content_str(last_message))
-        return "Radiologist"
-    elif "final report:" in content:
-        global final_report 
-        final_report = state['current_report']
-        return "end"
-    else:
-        return "Internal Medicine"
+    router.__name__ = f"router_{prefix.lower()}"
+    return router
 
-def Pathologist(state: AgentState) -> AgentState:
-    global patient_info
-    callers = state.get('next_agent') or []
-    caller = callers[-1] if callers else "General Physician"
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Pathologist. You were called in by specialist {caller}.
 
-    Patient data: {patient_info}
+PATHO_PREFIX = SystemMessage(content="""You are a High Quality Pathologist. The specialist who called you in, the patient data and your conversation with the specialist so far are given in the consultation context message that follows these instructions.
 
-    Current context:
-    - Total conversation with specialist: {", ".join(state['patho_QnA']) if state['patho_QnA'] else "None"}
     - If the last message is a question from the specialist, frame your response accordingly. You may also use tools if needed.
 
     Tools available:
@@ -1022,55 +695,28 @@ def Pathologist(state: AgentState) -> AgentState:
 
     """)
 
-    response = pathllm.invoke([SystemPrompt] + state['patho_messages'])
-    return {'patho_messages': [response], 'current_agent': 'Pathologist'}
-
-
-def router_patho(state: AgentState) -> AgentState:
-    last_message = state['patho_messages'][-1]
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Patho_AskUser"
-        return "Patho_Tooler"
-    elif "final report" in _get_content_str(last_message).lower() and "specialist" in _get_content_str(last_message).lower():
-        state["patho_QnA"].append("Pathologist Answer report to specialist:")
-        state["patho_QnA"].append(_get_content_str(last_message))
-        if state.get('next_agent') and len(state['next_agent']) > 0:
-            return state['next_agent'].pop()
-        caller_map = {
-            'ophthalmologist': 'Ophthalmologist',
-            'orthopedist': 'Orthopedist',
-            'dermatologist': 'Dermatologist',
-            'ent': 'ENT',
-            'gynecologist': 'Gynecologist',
-            'psychiatrist': 'Psychiatrist',
-            'pediatrician': 'Pediatrician',
-            'internal medicine': 'Internal Medicine',
-        }
-        for entry in reversed(state.get('patho_QnA') or []):
-            low = entry.lower()
-            for key, node in caller_map.items():
-                if f"from {key}" in low:
-                    return node
-        return "Orthopedist"
-    else:
-        return "Pathologist"
+PATHO_CONTEXT = """Consultation context (updated every turn):
+- Called in by specialist: {caller}
+- Patient data: {patient_info}
+- Total conversation with specialist: {qna}"""
+
 
-def Radiologist(state: AgentState) -> AgentState:
-    global patient_info
+async def Pathologist(state: AgentState) -> AgentState:
     callers = state.get('next_agent') or []
     caller = callers[-1] if callers else "General Physician"
-    SystemPrompt = SystemMessage(content=f"""You are a High Quality Radiologist. You were called in by specialist {caller}.
+    context = _context(PATHO_CONTEXT, caller=caller, patient_info=state.get('patient_info') or "None", qna=_recent_or_none(state['patho_QnA']))
+
+    window, history = await history_manager.window(state, 'patho_messages')
+    response = await llm_scheduler.ainvoke(pathllm, [PATHO_PREFIX, context] + window)
+    return {'patho_messages': [response], 'current_agent': 'Pathologist', **history,
+            **_helper_outcome(state, response, "Pathologist", "patho_QnA")}
+
+
+router_patho = make_helper_router("Pathologist", "Patho", "patho_messages")
 
-    Patient data: {patient_info}
 
-    Current context:
-    - Total conversation with specialist: {", ".join(state['radio_QnA']) if state['radio_QnA'] else "None"}
+RADIO_PREFIX = SystemMessage(content="""You are a High Quality Radiologist. The specialist who called you in, the patient data and your conversation with the specialist so far are given in the consultation context message that follows these instructions.
+
     - If the last message is a question from the specialist, analyze it and frame your response. You may use tools if needed.
 
     Tools available:
@@ -1088,616 +734,222 @@ def Radiologist(state: AgentState) -> AgentState:
     4. **Error Handling**: If you do not use a tool or your plain text output doesn't match the required final report format, you will be prompted again. Avoid this to prevent loops.
 
     """)
-    response = radllm.invoke([SystemPrompt] + state['radio_messages'])
-    return {'radio_messages': [response], 'current_agent': 'Radiologist'}
-
-def router_radio(state: AgentState) -> AgentState:
-    last_message = state['radio_messages'][-1]
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        ask_user_called = any(tc.get('name') == 'ask_user' for tc in last_message.tool_calls)
-        for tool_call in last_message.tool_calls:
-            if tool_call['name'] == 'add_report':
-                report_content = tool_call['args']['report']
-                state['current_report'].append(report_content)
-        if ask_user_called:
-            return "Radio_AskUser"
-        return "Radio_Tooler"
-    elif "final report" in _get_content_str(last_message).lower() and "specialist" in _get_content_str(last_message).lower():
-        state["radio_QnA"].append("Radiologist Answer report to specialist:")
-        state["radio_QnA"].append(_get_content_str(last_message))
-        if state.get('next_agent') and len(state['next_agent']) > 0:
-            return state['next_agent'].pop()
-        caller_map = {
-            'ophthalmologist': 'Ophthalmologist',
-            'orthopedist': 'Orthopedist',
-            'dermatologist': 'Dermatologist',
-            'ent': 'ENT',
-            'gynecologist': 'Gynecologist',
-            'psychiatrist': 'Psychiatrist',
-            'pediatrician': 'Pediatrician',
-            'internal medicine': 'Internal Medicine',
-        }
-        for entry in reversed(state.get('radio_QnA') or []):
-            low = entry.lower()
-            for key, node in caller_map.items():
-                if f"from {key}" in low:
-                    return node
-        return "Orthopedist"
-    else:
-        return "Radiologist"
 
-gp_tools = [ask_user, Patient_data_report]
-opthal_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-pedia_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-ortho_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-derma_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-ent_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-gynec_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-psych_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-med_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-patho_tools = [ask_user, search_internet, add_report, VectorRAG_Retrival]
-radio_tools = [ask_user, search_internet, add_report]
+RADIO_CONTEXT = """Consultation context (updated every turn):
+- Called in by specialist: {caller}
+- Patient data: {patient_info}
+- Total conversation with specialist: {qna}"""
 
 
-opthal_tool_node = ToolNode(opthal_tools)
+async def Radiologist(state: AgentState) -> AgentState:
+    callers = state.get('next_agent') or []
+    caller = callers[-1] if callers else "General Physician"
+    context = _context(RADIO_CONTEXT, caller=caller, patient_info=state.get('patient_info') or "None", qna=_recent_or_none(state['radio_QnA']))
+    window, history = await history_manager.window(state, 'radio_messages')
+    response = await llm_scheduler.ainvoke(radllm, [RADIO_PREFIX, context] + window)
+    return {'radio_messages': [response], 'current_agent': 'Radiologist', **history,
+            **_helper_outcome(state, response, "Radiologist", "radio_QnA")}
 
-def opthal_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    
-    tool_output_dict = opthal_tool_node.invoke(tool_input)
-    
-    tool_output_messages = tool_output_dict['messages']
-    
-    return {'specialist_messages': tool_output_messages}
-
-agents = ["General Physician", "Pediatrics", "Ophthalmology", "Orthopedics", "Gastroenterology",
-          "Radiology", "Pathology", "Dermatology", "ENT", "Gynecology", "Psychiatry", "Internal Medicine"]
-
-opthal_tool_node = ToolNode(opthal_tools)
-pedia_tool_node = ToolNode(pedia_tools)
-ortho_tool_node = ToolNode(ortho_tools)
-derma_tool_node = ToolNode(derma_tools)
-ent_tool_node = ToolNode(ent_tools)
-gynec_tool_node = ToolNode(gynec_tools)
-psych_tool_node = ToolNode(psych_tools)
-med_tool_node = ToolNode(med_tools)
-patho_tool_node = ToolNode(patho_tools)
-radio_tool_node = ToolNode(radio_tools)
-gp_tool_node = ToolNode(gp_tools)
-
-gp_ask_toolnode = ToolNode([ask_user])
-opthal_ask_toolnode = ToolNode([ask_user])
-pedia_ask_toolnode = ToolNode([ask_user])
-ortho_ask_toolnode = ToolNode([ask_user])
-derma_ask_toolnode = ToolNode([ask_user])
-ent_ask_toolnode = ToolNode([ask_user])
-gynec_ask_toolnode = ToolNode([ask_user])
-psych_ask_toolnode = ToolNode([ask_user])
-med_ask_toolnode = ToolNode([ask_user])
-patho_ask_toolnode = ToolNode([ask_user])
-radio_ask_toolnode = ToolNode([ask_user])
-
-
-def opthal_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = opthal_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Ophthalmologist')
-    }
+router_radio = make_helper_router("Radiologist", "Radio", "radio_messages")
 
-def opthal_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = opthal_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Ophthalmologist')
-        }
-    return {}
 
-def derma_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = derma_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Dermatologist')
-    }
+def _handoff(messages) -> Optional[dict]:
+    """Artifact of the first successful refer_to_specialist / consult_helper result in a tool batch."""
+    for message in messages:
+        if isinstance(message, ToolMessage) and message.name in ROUTING_TOOLS and message.artifact:
+            return message.artifact
+    return None
 
-def derma_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = derma_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Dermatologist')
-        }
-    return {}
 
-def pedia_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = pedia_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Pediatrician')
-    }
+# AgentState keys that Patient_data_report / add_report hand back as artifacts (routing artifacts: _handoff_update)
+STATE_ARTIFACT_KEYS = ('patient_info', 'consultation_id')
 
-def pedia_askuser_invoker(state: AgentState) -> dict:
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = pedia_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Pediatrician')
-        }
-    return {}
 
-def ortho_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = ortho_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Orthopedist')
-    }
+def _artifact_state_update(messages) -> dict:
+    """State update from the tool artifacts of a batch (later calls win)."""
+    update = {}
+    for message in messages:
+        if isinstance(message, ToolMessage) and message.name not in ROUTING_TOOLS and isinstance(message.artifact, dict):
+            update.update({k: message.artifact[k] for k in STATE_ARTIFACT_KEYS if message.artifact.get(k) is not None})
+    return update
 
-def ortho_askuser_invoker(state: AgentState) -> dict:
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = ortho_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Orthopedist')
-        }
-    return {}
 
-def ent_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = ent_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
+async def _flush_queued_reports(state: AgentState, messages) -> None:
+    """REPORT_BUFFERING: write every add_report queued in this tool batch in one transaction, then report back."""
+    queued = [m for m in messages if isinstance(m, ToolMessage) and m.name == "add_report"
+              and isinstance(m.artifact, dict) and "queued_report" in m.artifact]
+    if not queued:
+        return
+    try:
+        consultation_id = await awrite_reports(
+            state.get('patient_id'), state.get('consultation_id'),
+            [tuple(m.artifact["queued_report"]) for m in queued],
+        )
+        outcome = ("Report added to patient's record." if consultation_id is not None
+                   else "Error: No Active Consultation found. Please triage patient first.")
+    except Exception as e:
+        consultation_id, outcome = None, f"Database Error: {str(e)}"
+    for message in queued:
+        message.content = outcome
+        message.artifact = {"consultation_id": consultation_id} if consultation_id is not None else None
+
+
+def _handoff_update(state: AgentState, caller: str, messages) -> dict:
+    handoff = _handoff(messages)
+    if handoff is None:
+        return {}
+    target = handoff['target']
+    if target not in HELPER_NODES:
+        return {'next_agent': list(state.get('next_agent') or []) + [target]}
+    qna_key = 'patho_QnA' if target == "Pathologist" else 'radio_QnA'
     return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'ENT')
+        'next_agent': list(state.get('next_agent') or []) + [caller],
+        qna_key: list(state.get(qna_key) or []) + [f"Question from {caller} to {target}: ", handoff['question']],
     }
 
-def ent_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = ent_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'ENT')
-        }
-    return {}
 
-def gynec_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = gynec_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Gynecologist')
-    }
+def make_tooler_router(channel: str, agent: str):
+    """After a tool batch: follow a referral / helper consult made in it, otherwise back to `agent`."""
+    def router(state: AgentState) -> str:
+        batch = []
+        for message in reversed(state[channel]):
+            if not isinstance(message, ToolMessage):
+                break
+            batch.append(message)
+        handoff = _handoff(reversed(batch))
+        return handoff['target'] if handoff else agent
 
-def gynec_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = gynec_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Gynecologist')
-        }
-    return {}
+    router.__name__ = f"router_{agent.lower().replace(' ', '_')}_tools"
+    return router
 
-def psych_tool_invoker(state: AgentState) -> dict:
+
+def make_tool_invoker(channel: str, tools, agent: str):
     """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
+    Takes tool calls from the last message on `channel`, runs them (concurrently, writes in order,
+    under per-tool timeouts; see tool_dispatch.py) and returns the output to be added back to `channel`.
     """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = psych_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Psychiatrist')
-    }
+    dispatcher = tool_dispatcher(tools)
 
-def psych_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = psych_ask_toolnode.invoke(tool_input)
+    async def tool_invoker(state: AgentState) -> dict:
+        injected = {
+            'patient_id': state.get('patient_id'),
+            'consultation_id': state.get('consultation_id')
+        }
+        tool_messages = await dispatcher.dispatch(state[channel][-1], injected)
+        await _flush_queued_reports(state, tool_messages)
         return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Psychiatrist')
+            channel: tool_messages,
+            'current_agent': state.get('current_agent', agent),
+            **_handoff_update(state, agent, tool_messages),
+            **_artifact_state_update(tool_messages),
         }
-    return {}
 
-def med_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'specialist_messages', runs them,
-    and returns the output to be added back to 'specialist_messages'.
-    """
-    tool_input = {
-        'messages': [state['specialist_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = med_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'specialist_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Internal Medicine')
-    }
+    return tool_invoker
 
-def med_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['specialist_messages'][-1]]}
-    last = state['specialist_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = med_ask_toolnode.invoke(tool_input)
-        return {
-            'specialist_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Internal Medicine')
-        }
-    return {}
 
-def patho_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'patho_messages', runs them,
-    and returns the output to be added back to 'patho_messages'.
-    """
-    tool_input = {
-        'messages': [state['patho_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = patho_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'patho_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Pathologist')
-    }
+def make_askuser_invoker(channel: str, agent: str):
+    node = tool_node(ASK_TOOLS)
 
-def patho_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['patho_messages'][-1]]}
-    last = state['patho_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = patho_ask_toolnode.invoke(tool_input)
-        return {
-            'patho_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Pathologist')
-        }
-    return {}
+    async def askuser_invoker(state: AgentState) -> dict:
+        last = state[channel][-1]
+        if isinstance(last, AIMessage):
+            tool_output_dict = await node.ainvoke({'messages': [last]})
+            return {
+                channel: tool_output_dict['messages'],
+                'current_agent': state.get('current_agent', agent)
+            }
+        return {}
 
-def radio_tool_invoker(state: AgentState) -> dict:
-    """
-    Takes tool calls from 'radio_messages', runs them,
-    and returns the output to be added back to 'radio_messages'.
-    """
-    tool_input = {
-        'messages': [state['radio_messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = radio_tool_node.invoke(tool_input)
-    tool_output_messages = tool_output_dict['messages']
-    return {
-        'radio_messages': tool_output_messages,
-        'current_agent': state.get('current_agent', 'Radiologist')
-    }
+    return askuser_invoker
 
-def radio_askuser_invoker(state: AgentState) -> dict:
-    tool_input = {'messages': [state['radio_messages'][-1]]}
-    last = state['radio_messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = radio_ask_toolnode.invoke(tool_input)
-        return {
-            'radio_messages': tool_output_dict['messages'],
-            'current_agent': state.get('current_agent', 'Radiologist')
+
+# (node, tool/ask prefix, message channel, tools, agent fn, router) for the two helpers
+HELPERS = [
+    ("Pathologist", "Patho", "patho_messages", PATHO_TOOLS, Pathologist, router_patho),
+    ("Radiologist", "Radio", "radio_messages", RADIO_TOOLS, Radiologist, router_radio),
+]
+
+# Nodes the graph pauses before so api.py can surface the ask_user question
+ASK_NODES = ["GP_AskUser"] + [f"{s.prefix}_AskUser" for s in SPECIALISTS] + [f"{h[1]}_AskUser" for h in HELPERS]
+
+# LLM-backed nodes and the message channel each one writes to
+AGENT_NODE_STREAMS = {
+    "GP": "messages",
+    **{s.node: "specialist_messages" for s in SPECIALISTS},
+    **{h[0]: h[2] for h in HELPERS},
+}
+
+
+def build_graph() -> StateGraph:
+    graph = StateGraph(AgentState)
+
+    graph.add_node("GP", general_physician)
+    graph.add_node("GP_Tooler", make_tool_invoker("messages", GP_TOOLS, "GP"))
+    graph.add_node("GP_AskUser", make_askuser_invoker("messages", "GP"))
+    graph.add_edge(START, "GP")
+    graph.add_conditional_edges(
+        "GP_Tooler",
+        make_tooler_router("messages", "GP"),
+        {**{node: node for node in SPECIALIST_NODES}, "GP": "GP"}
+    )
+    graph.add_conditional_edges(
+        "GP",
+        router_gp,
+        {
+            "GP_AskUser": "GP_AskUser",
+            "GP_Tooler": "GP_Tooler",
+            **{node: node for node in SPECIALIST_NODES},
+            "GP": "GP",
+            "end": END,
         }
-    return {}
-
-
-
-graph = StateGraph(AgentState)
-graph.add_node("GP", general_physician)
-graph.add_node("Ophthalmologist", Ophthalmologist)
-graph.add_node("Pediatrician", Pediatrician)
-graph.add_node("Orthopedist", Orthopedist)
-graph.add_node("Dermatologist", Dermatologist)
-graph.add_node("ENT", ENT)
-graph.add_node("Gynecologist", Gynecologist)
-graph.add_node("Psychiatrist", Psychiatrist)
-graph.add_node("Internal Medicine", Internal_Medicine)
-
-graph.add_node("Pathologist", Pathologist)
-graph.add_node("Radiologist", Radiologist)
-graph.add_node("Patho_Tooler", patho_tool_invoker)
-graph.add_node("Radio_Tooler", radio_tool_invoker)
-graph.add_node("Patho_AskUser", patho_askuser_invoker)
-graph.add_node("Radio_AskUser", radio_askuser_invoker)
-graph.add_edge("Patho_Tooler", "Pathologist")
-graph.add_edge("Radio_Tooler", "Radiologist")
-
-def gp_askuser_invoker(state: AgentState) -> dict:
-    last = state['messages'][-1]
-    if isinstance(last, AIMessage):
-        tool_input = {'messages': [last]}
-        tool_output_dict = gp_ask_toolnode.invoke(tool_input)
-        return {'messages': tool_output_dict['messages'], 'current_agent': state.get('current_agent', 'GP')}
-    return {}
-
-def gp_tool_invoker(state: AgentState) -> dict:
-    tool_input = {
-        'messages': [state['messages'][-1]],
-        'patient_id': state.get('patient_id'),
-        'consultation_id': state.get('consultation_id')
-    }
-    tool_output_dict = gp_tool_node.invoke(tool_input)
-    return {'messages': tool_output_dict['messages'], 'current_agent': state.get('current_agent', 'GP')}
-
-graph.add_node("GP_Tooler", gp_tool_invoker)
-graph.add_node("GP_AskUser", gp_askuser_invoker)
-
-graph.add_node("Ophthal_Tooler", opthal_tool_invoker)
-graph.add_node("Pedia_Tooler", pedia_tool_invoker)
-graph.add_node("Ortho_Tooler", ortho_tool_invoker)
-graph.add_node("Dermat_Tooler", derma_tool_invoker)
-graph.add_node("ENT_Tooler", ent_tool_invoker)
-graph.add_node("Gynec_Tooler", gynec_tool_invoker)
-graph.add_node("Psych_Tooler", psych_tool_invoker)
-graph.add_node("IntMed_Tooler", med_tool_invoker)
-graph.add_node("Ophthal_AskUser", opthal_askuser_invoker)
-graph.add_node("Pedia_AskUser", pedia_askuser_invoker)
-graph.add_node("Ortho_AskUser", ortho_askuser_invoker)
-graph.add_node("Dermat_AskUser", derma_askuser_invoker)
-graph.add_node("ENT_AskUser", ent_askuser_invoker)
-graph.add_node("Gynec_AskUser", gynec_askuser_invoker)
-graph.add_node("Psych_AskUser", psych_askuser_invoker)
-graph.add_node("IntMed_AskUser", med_askuser_invoker)
-
-graph.add_edge(START, "GP")
-graph.add_edge("GP_Tooler", "GP")
-graph.add_edge("Ophthal_Tooler", "Ophthalmologist")
-graph.add_edge("Pedia_Tooler", "Pediatrician")
-graph.add_edge("Ortho_Tooler", "Orthopedist")
-graph.add_edge("Dermat_Tooler", "Dermatologist")
-graph.add_edge("ENT_Tooler", "ENT")
-graph.add_edge("Gynec_Tooler", "Gynecologist")
-graph.add_edge("Psych_Tooler", "Psychiatrist")
-graph.add_edge("IntMed_Tooler", "Internal Medicine")
-
-
-graph.add_conditional_edges(
-    "GP",
-    router_gp,
-    {
-        "GP_AskUser": "GP_AskUser",
-        "GP_Tooler": "GP_Tooler",
-        "pediatrics": "Pediatrician",
-        "Orthopedics": "Orthopedist",
-        "ophthalmology": "Ophthalmologist",
-        "dermatology": "Dermatologist",
-        "ent": "ENT",
-        "gynecology": "Gynecologist",
-        "psychiatry": "Psychiatrist",
-        "internal medicine": "Internal Medicine",
-        "GP":"GP"
-    }
-)
-graph.add_conditional_edges(
-    "Ophthalmologist",
-    router_opthal,
-    {
-        "Ophthal_AskUser": "Ophthal_AskUser",
-        "Ophthal_Tooler": "Ophthal_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Ophthalmologist": "Ophthalmologist",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Dermatologist",
-    router_dermat,
-    {
-        "Dermat_AskUser": "Dermat_AskUser",
-        "Dermat_Tooler": "Dermat_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Dermatologist": "Dermatologist",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Pediatrician",
-    router_pedia,
-    {
-        "Pedia_AskUser": "Pedia_AskUser",
-        "Pedia_Tooler": "Pedia_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Pediatrician": "Pediatrician",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Orthopedist",
-    router_ortho,
-    {
-        "Ortho_AskUser": "Ortho_AskUser",
-        "Ortho_Tooler": "Ortho_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Orthopedist": "Orthopedist",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "ENT",
-    router_ent,
-    {
-        "ENT_AskUser": "ENT_AskUser",
-        "ENT_Tooler": "ENT_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "ENT": "ENT",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Gynecologist",
-    router_gynec,
-    {
-        "Gynec_AskUser": "Gynec_AskUser",
-        "Gynec_Tooler": "Gynec_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Gynecologist": "Gynecologist",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Psychiatrist",
-    router_psych,
-    {
-        "Psych_AskUser": "Psych_AskUser",
-        "Psych_Tooler": "Psych_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Psychiatrist": "Psychiatrist",
-        "end": END
-    }
-)
-graph.add_conditional_edges(
-    "Internal Medicine",
-    router_medicine,
-    {
-        "IntMed_AskUser": "IntMed_AskUser",
-        "IntMed_Tooler": "IntMed_Tooler",
-        "Pathologist": "Pathologist",
-        "Radiologist": "Radiologist",
-        "Internal Medicine": "Internal Medicine",
-        "end": END
-    }
-)
+    )
 
-graph.add_conditional_edges(
-    "Pathologist",
-    router_patho,
-    {
-        "Patho_AskUser": "Patho_AskUser",
-        "Patho_Tooler": "Patho_Tooler",
-        'Pediatrician': 'Pediatrician',
-        'Ophthalmologist': 'Ophthalmologist',
-        'Orthopedist': 'Orthopedist',
-        'Dermatologist': 'Dermatologist',
-        'ENT': 'ENT',
-        'Gynecologist': 'Gynecologist',
-        'Psychiatrist': 'Psychiatrist',
-        'Internal Medicine': 'Internal Medicine',
-        "Pathologist": "Pathologist"
-    }
-)
-graph.add_conditional_edges(
-    "Radiologist",
-    router_radio,
-    {
-        "Radio_AskUser": "Radio_AskUser",
-        "Radio_Tooler": "Radio_Tooler",
-        'Pediatrician': 'Pediatrician',
-        'Ophthalmologist': 'Ophthalmologist',
-        'Orthopedist': 'Orthopedist',
-        'Dermatologist': 'Dermatologist',
-        'ENT': 'ENT',
-        'Gynecologist': 'Gynecologist',
-        'Psychiatrist': 'Psychiatrist',
-        'Internal Medicine': 'Internal Medicine',
-        "Radiologist": "Radiologist"
-    }
-)
-from langgraph.checkpoint.memory import MemorySaver
+    for spec in SPECIALISTS:
+        tooler, asker = f"{spec.prefix}_Tooler", f"{spec.prefix}_AskUser"
+        graph.add_node(spec.node, make_specialist_node(spec))
+        graph.add_node(tooler, make_tool_invoker("specialist_messages", SPECIALIST_TOOLS, spec.node))
+        graph.add_node(asker, make_askuser_invoker("specialist_messages", spec.node))
+        graph.add_conditional_edges(
+            tooler,
+            make_tooler_router("specialist_messages", spec.node),
+            {**{helper: helper for helper in HELPER_NODES}, spec.node: spec.node}
+        )
+        graph.add_conditional_edges(
+            spec.node,
+            make_specialist_router(spec),
+            {
+                asker: asker,
+                tooler: tooler,
+                spec.node: spec.node,
+                "end": END
+            }
+        )
+
+    for name, prefix, channel, tools, agent_fn, router in HELPERS:
+        tooler, asker = f"{prefix}_Tooler", f"{prefix}_AskUser"
+        graph.add_node(name, agent_fn)
+        graph.add_node(tooler, make_tool_invoker(channel, tools, name))
+        graph.add_node(asker, make_askuser_invoker(channel, name))
+        graph.add_edge(tooler, name)
+        graph.add_conditional_edges(
+            name,
+            router,
+            {
+                asker: asker,
+                tooler: tooler,
+                **{node: node for node in SPECIALIST_NODES},
+                name: name
+            }
+        )
+
+    return graph
+
+
+graph = build_graph()
+
+# MemorySaver is only the import-time default; main.py swaps in the configured
+# persistent checkpointer (see checkpointer.py) once the event loop is running.
 memory = MemorySaver()
-myapp = graph.compile(
-    interrupt_before=[
-        "GP_AskUser","Ophthal_AskUser","Pedia_AskUser","Ortho_AskUser",
-        "Dermat_AskUser","ENT_AskUser","Gynec_AskUser","Psych_AskUser",
-        "IntMed_AskUser","Patho_AskUser","Radio_AskUser"
-    ],
-    checkpointer=memory
-)
+myapp = graph.compile(interrupt_before=ASK_NODES, checkpointer=memory)
 
-__all__ = ["myapp", "AgentState"]
\ No newline at end of file
+__all__ = ["myapp", "AgentState", "ASK_NODES", "AGENT_NODE_STREAMS"]
@@ -0,0 +1,150 @@
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+
+SIDECAR_FILE = "bm25_index.npz"
+
+# Keeps drug names, lab codes and ICD-style terms ("e11.9", "hba1c", "il-6") as single tokens
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def reciprocal_rank_fusion(result_lists, k=5, c=60):
+    """Merge ranked Document lists: score = sum of 1 / (c + rank). Documents are matched by id, else text."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results or []):
+            key = getattr(doc, "id", None) or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (c + rank + 1)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:k]]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a store's chunks, saved as a compact CSR sidecar.
+
+    `bm25_index.npz` holds the sorted vocabulary, per-term posting offsets,
+    int32 chunk rows and uint16 term frequencies, chunk lengths, chunk ids and
+    each chunk's `specialty`. Texts stay in Chroma; `search` returns chunk ids.
+    """
+
+    def __init__(self, vocab, offsets, postings, freqs, doc_lens, ids, specialties, k1=1.5, b=0.75):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.freqs = freqs
+        self.doc_lens = doc_lens
+        self.ids = ids
+        self.specialties = specialties
+        self.k1 = k1
+        self.b = b
+        self._term_index = {term: i for i, term in enumerate(vocab)}
+        self._avgdl = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    @classmethod
+    def build(cls, collection, page_size=5000):
+        """Tokenize every chunk of a Chroma store (paged) into a BM25 index."""
+        ids, specialties, doc_lens = [], [], []
+        term_postings = {}
+        row = 0
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                counts = Counter(tokenize(text or ""))
+                for term, tf in counts.items():
+                    term_postings.setdefault(term, []).append((row, min(tf, 65535)))
+                ids.append(chunk_id)
+                specialties.append((metadata or {}).get("specialty", ""))
+                doc_lens.append(sum(counts.values()))
+                row += 1
+            offset += len(page["ids"])
+
+        vocab = sorted(term_postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for i, term in enumerate(vocab):
+            offsets[i + 1] = offsets[i] + len(term_postings[term])
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(vocab):
+            rows, tfs = zip(*term_postings[term])
+            postings[offsets[i]:offsets[i + 1]] = rows
+            freqs[offsets[i]:offsets[i + 1]] = tfs
+        return cls(
+            np.array(vocab, dtype=object),
+            offsets,
+            postings,
+            freqs,
+            np.array(doc_lens, dtype=np.int32),
+            np.array(ids, dtype=object),
+            np.array(specialties, dtype=object),
+        )
+
+    def save(self, persist_directory):
+        path = os.path.join(persist_directory, SIDECAR_FILE)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp,
+            vocab=self.vocab.astype(str),
+            offsets=self.offsets,
+            postings=self.postings,
+            freqs=self.freqs,
+            doc_lens=self.doc_lens,
+            ids=self.ids.astype(str),
+            specialties=self.specialties.astype(str),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, persist_directory):
+        """Load the sidecar, or return None if the store has none."""
+        path = os.path.join(persist_directory, SIDECAR_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["vocab"].astype(object),
+                data["offsets"],
+                data["postings"],
+                data["freqs"],
+                data["doc_lens"],
+                data["ids"].astype(object),
+                data["specialties"].astype(object),
+            )
+
+    def scores(self, query):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        n = len(self.ids)
+        for term in set(tokenize(query)):
+            i = self._term_index.get(term)
+            if i is None:
+                continue
+            rows = self.postings[self.offsets[i]:self.offsets[i + 1]]
+            tf = self.freqs[self.offsets[i]:self.offsets[i + 1]].astype(np.float32)
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[rows] / self._avgdl)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, k=5, specialties=None):
+        """Ids of the top-`k` chunks with a non-zero score, optionally restricted to `specialties`."""
+        scores = self.scores(query)
+        if specialties is not None:
+            scores[~np.isin(self.specialties, list(specialties))] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0:
+            return []
+        top = hits[np.argsort(-scores[hits])[:k]]
+        return [str(chunk_id) for chunk_id in self.ids[top]]
@@ -0,0 +1,126 @@
+import os
+import numpy as np
+
+SIDECAR_FILE = "compact_index.npz"
+
+
+def quantize(vectors, fmt):
+    """Return (codes, scales). int8 is symmetric per-vector scalar quantization; float16 needs no scale."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if fmt == "float16":
+        return vectors.astype(np.float16), None
+    if fmt == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown compact vector format: {fmt}")
+
+
+def approximate_scores(codes, scales, query, block_rows=8192):
+    # Upcast block by block so a query never materializes the full float32 matrix
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), block_rows):
+        scores[start:start + block_rows] = codes[start:start + block_rows].astype(np.float32) @ query
+    return scores * scales if scales is not None else scores
+
+
+class CompactIndex:
+    """
+    Brute-force search over quantized copies of a Chroma store's embeddings.
+
+    The sidecar (`compact_index.npz` in the store directory) holds chunk ids,
+    the `specialty` of each chunk, and int8 or float16 codes: 1 or 2 bytes per
+    dimension instead of 4, and no HNSW graph in RAM. `search` ranks all codes,
+    takes the top `k * rerank_factor` candidates and re-ranks them on their
+    full-precision embeddings fetched from Chroma by id, so the returned top-k
+    matches float32 search unless a true neighbour fell outside the candidates.
+    """
+
+    def __init__(self, ids, specialties, codes, scales, fmt):
+        self.ids = ids
+        self.specialties = specialties
+        self.codes = codes
+        self.scales = scales
+        self.format = fmt
+
+    @classmethod
+    def build(cls, collection, fmt="int8", page_size=5000):
+        """Read every embedding from a Chroma store (paged) and quantize it."""
+        ids, specialties, codes, scales = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            page_codes, page_scales = quantize(page["embeddings"], fmt)
+            ids.extend(page["ids"])
+            specialties.extend((m or {}).get("specialty", "") for m in page["metadatas"])
+            codes.append(page_codes)
+            if page_scales is not None:
+                scales.append(page_scales)
+            offset += len(page["ids"])
+        dtype = np.int8 if fmt == "int8" else np.float16
+        return cls(
+            np.array(ids, dtype=object),
+            np.array(specialties, dtype=object),
+            np.concatenate(codes) if codes else np.zeros((0, 0), dtype=dtype),
+            np.concatenate(scales) if scales else None,
+            fmt,
+        )
+
+    def save(self, persist_directory):
+        path = os.path.join(persist_directory, SIDECAR_FILE)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            ids=self.ids.astype(str),
+            specialties=self.specialties.astype(str),
+            codes=self.codes,
+            scales=self.scales if self.scales is not None else np.zeros(0, dtype=np.float32),
+            format=np.array(self.format),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, persist_directory):
+        """Load the sidecar, or return None if the store has none."""
+        path = os.path.join(persist_directory, SIDECAR_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            fmt = str(data["format"])
+            return cls(
+                data["ids"].astype(object),
+                data["specialties"].astype(object),
+                data["codes"],
+                data["scales"] if fmt == "int8" else None,
+                fmt,
+            )
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def candidates(self, query, n, specialties=None):
+        """Row indexes of the `n` best approximate matches, optionally restricted to `specialties`."""
+        scores = approximate_scores(self.codes, self.scales, np.asarray(query, dtype=np.float32))
+        if specialties is not None:
+            scores = np.where(np.isin(self.specialties, list(specialties)), scores, -np.inf)
+        n = min(n, len(scores))
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.isfinite(scores[top])]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, collection, query, k=5, specialties=None, rerank_factor=4):
+        """Top-`k` (score, id, document, metadata) re-ranked on full-precision embeddings."""
+        rows = self.candidates(query, k * rerank_factor, specialties)
+        if len(rows) == 0:
+            return []
+        full = collection.get(ids=[str(i) for i in self.ids[rows]], include=["embeddings", "documents", "metadatas"])
+        exact = np.asarray(full["embeddings"], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+        order = np.argsort(-exact)[:k]
+        return [(float(exact[i]), full["ids"][i], full["documents"][i], full["metadatas"][i]) for i in order]
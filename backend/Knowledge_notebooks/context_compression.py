@@ -0,0 +1,121 @@
+import os
+import re
+from Knowledge_notebooks.bm25_index import tokenize
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+_WHITESPACE = re.compile(r"[ \t]*\n[ \t\n]*|[ \t]{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English); good enough for budgets and reports."""
+    return (len(text) + 3) // 4
+
+
+def _overlap(left: str, right: str, min_overlap: int = 40, max_overlap: int = 400) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _source_label(metadata: dict) -> str:
+    source = os.path.basename(str(metadata.get("source", ""))) or "unknown"
+    page = metadata.get("page_number")
+    return f"{source}, p. {page}" if page is not None else source
+
+
+class ContextCompressor:
+    """
+    Turns retrieved chunks into a compact context block for the RAG synthesis prompt.
+
+    1. Drops duplicate chunks and stitches chunks whose text overlaps (the
+       splitter uses chunk_overlap=200, so neighbours share a 200-character seam).
+    2. Renders each passage as `[n] (file, p. X)` + text instead of the full
+       `Document(...)` repr with every metadata field.
+    3. Optionally keeps only the sentences that share terms with the query,
+       best first, until `token_budget` is reached (kept in reading order).
+    """
+
+    def __init__(self, sentence_selection: bool = False, token_budget: int = 800):
+        self.sentence_selection = sentence_selection
+        self.token_budget = token_budget
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def merge(self, docs):
+        """[(label, text)] with duplicates removed and overlapping neighbours stitched together."""
+        passages = []
+        seen = set()
+        for doc in docs:
+            text = _WHITESPACE.sub(lambda m: "\n" if "\n" in m.group() else " ", doc.page_content).strip()
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            label = _source_label(doc.metadata or {})
+            for i, (other_label, other_text) in enumerate(passages):
+                if text in other_text:
+                    break
+                if other_text in text:
+                    passages[i] = (other_label, text)
+                    break
+                tail = _overlap(other_text, text)
+                if tail:
+                    passages[i] = (other_label, other_text + text[tail:])
+                    break
+                head = _overlap(text, other_text)
+                if head:
+                    passages[i] = (label, text + other_text[head:])
+                    break
+            else:
+                passages.append((label, text))
+        return passages
+
+    def _select_sentences(self, passages, query):
+        query_terms = set(tokenize(query))
+        sentences = []
+        for p, (_, text) in enumerate(passages):
+            for s, sentence in enumerate(_SENTENCE_END.split(text)):
+                terms = set(tokenize(sentence))
+                score = len(terms & query_terms) / (1 + len(terms) ** 0.5)
+                sentences.append((score, p, s, sentence))
+
+        kept, used, seen = set(), 0, set()
+        for score, p, s, sentence in sorted(sentences, key=lambda item: -item[0]):
+            if score == 0 and kept:
+                break
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+            cost = estimate_tokens(sentence)
+            if used + cost > self.token_budget:
+                continue
+            kept.add((p, s))
+            used += cost
+
+        selected = []
+        for p, (label, _) in enumerate(passages):
+            text = " ".join(sentence for _, sp, s, sentence in sentences if sp == p and (sp, s) in kept)
+            if text:
+                selected.append((label, text))
+        return selected
+
+    def compress(self, docs, query: str) -> str:
+        passages = self.merge(docs)
+        if self.sentence_selection:
+            passages = self._select_sentences(passages, query)
+        context = "\n\n".join(f"[{i}] ({label})\n{text}" for i, (label, text) in enumerate(passages, 1))
+
+        self.calls += 1
+        self.tokens_in += estimate_tokens(str(docs))
+        self.tokens_out += estimate_tokens(context)
+        return context
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "est_tokens_in": self.tokens_in,
+            "est_tokens_out": self.tokens_out,
+            "ratio": round(self.tokens_out / self.tokens_in, 3) if self.tokens_in else None,
+        }
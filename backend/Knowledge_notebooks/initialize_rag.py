@@ -1,45 +1,246 @@
 import os
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+import threading
+import time
+from Knowledge_notebooks.compact_index import CompactIndex
+from Knowledge_notebooks.bm25_index import BM25Index, reciprocal_rank_fusion
+
+UNIFIED_STORE = "_unified"
 
 class VectorRAG:
+    """
+    Embedding model and per-specialty Chroma stores, loaded on first use.
+
+    The bge-large model is ~1.3 GB and used to be loaded as a class attribute at
+    import time, which held up server startup. Now `embedding_model` is built the
+    first time a store is opened, and each store is opened the first time
+    `get_store` asks for it (or by `warm_up` in the background).
+
+    With `layout="unified"` all specialties live in one collection under
+    `vector_stores/_unified` (built with `vector_rag.py --unified`) and every
+    chunk carries a `specialty` metadata field; `search_by_vector` filters on it,
+    so a cross-specialty search is a single ANN query.
+
+    With `vector_format` "int8" or "float16", stores that have a compact sidecar
+    (`vector_rag.py --compact ...`) are searched through `CompactIndex` instead of
+    Chroma's float32 HNSW index, re-ranking `rerank_factor * k` candidates on full
+    precision. Stores without a usable sidecar fall back to Chroma.
+
+    `lexical_search` runs BM25 over the `bm25_index.npz` sidecar that
+    vector_rag.py writes next to each store; the RAG tool fuses it with the
+    dense results (reciprocal-rank fusion).
+    """
     model_name = "BAAI/bge-large-en-v1.5"
     model_kwargs = {"device": "cpu"}
     encode_kwargs = {"normalize_embeddings": True}
-    embedding_model = HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
-    vector_store = {
-    "Ophthalmologist":None,
-    "Dermatology":None,
-    "ENT":None,
-    "Gynecology":None,
-    "Internal Medicine":None,
-    "Orthopedics":None,
-    "Pathology":None,
-    "Pediatrics":None,
-    "Psychiatry":None
-    }
-    def initialize(self):
+    base_directory = "./backend/vector_stores"
+
+    def __init__(self, layout: str = "per_specialty", vector_format: str = "float32", rerank_factor: int = 4):
+        if layout not in ("per_specialty", "unified"):
+            raise ValueError(f"Unknown vector store layout: {layout}")
+        if vector_format not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unknown vector format: {vector_format}")
+        self.layout = layout
+        self.vector_format = vector_format
+        self.rerank_factor = rerank_factor
+        self._stores = {}
+        self._compact = {}
+        self._bm25 = {}
+        self._embedding_model = None
+        self._lock = threading.RLock()
+        self.load_seconds = {}
+        self.vector_store = {
+        "Ophthalmologist":None,
+        "Dermatology":None,
+        "ENT":None,
+        "Gynecology":None,
+        "Internal Medicine":None,
+        "Orthopedics":None,
+        "Pathology":None,
+        "Pediatrics":None,
+        "Psychiatry":None
+        }
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            with self._lock:
+                if self._embedding_model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    print(f"Loading embedding model {self.model_name}...")
+                    start = time.perf_counter()
+                    self._embedding_model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        model_kwargs=self.model_kwargs,
+                        encode_kwargs=self.encode_kwargs
+                    )
+                    self.load_seconds["embedding_model"] = round(time.perf_counter() - start, 3)
+        return self._embedding_model
+
+    def persist_directory(self, name: str) -> str:
+        return f"{self.base_directory}/{name}"
+
+    def _store_name(self, domain: str) -> str:
+        return UNIFIED_STORE if self.layout == "unified" else domain
+
+    def store_fingerprint(self, domain: str):
+        """(mtime, size) of the store's chroma.sqlite3; changes whenever vector_rag.py rebuilds it."""
         try:
-            for i in self.vector_store.keys():
-                persist_directory = f"./backend/vector_stores/{i}"
-                if os.path.exists(persist_directory):
-                    print(f"Loading vector store for {i}...")
-                    self.vector_store[i] = Chroma(
-                        persist_directory=persist_directory,
-                        embedding_function=self.embedding_model
+            st = os.stat(os.path.join(self.persist_directory(self._store_name(domain)), "chroma.sqlite3"))
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def embed_documents(self, texts):
+        return self.embedding_model.embed_documents(texts)
+
+    def get_store(self, domain: str):
+        """Return the Chroma store holding `domain`, opening it on first use (None if it doesn't exist on disk)."""
+        if domain not in self.vector_store:
+            raise KeyError(f"Unknown vector store domain: {domain}")
+        name = self._store_name(domain)
+        store = self._stores.get(name)
+        if store is not None:
+            return store
+        with self._lock:
+            if name not in self._stores:
+                persist_directory = self.persist_directory(name)
+                if not os.path.exists(persist_directory):
+                    return None
+                from langchain_chroma import Chroma
+                print(f"Loading vector store for {name}...")
+                start = time.perf_counter()
+                self._stores[name] = Chroma(
+                    persist_directory=persist_directory,
+                    embedding_function=self.embedding_model
                 )
+                self.load_seconds[name] = round(time.perf_counter() - start, 3)
+                if self.layout == "per_specialty":
+                    self.vector_store[domain] = self._stores[name]
+            return self._stores[name]
+
+    def _compact_index(self, name: str, store):
+        """The store's CompactIndex, or None when disabled, missing or out of date."""
+        if self.vector_format == "float32":
+            return None
+        if name not in self._compact:
+            with self._lock:
+                if name not in self._compact:
+                    index = CompactIndex.load(self.persist_directory(name))
+                    if index is not None and index.format != self.vector_format:
+                        print(f"Compact index for {name} is {index.format}, expected {self.vector_format}; using Chroma")
+                        index = None
+                    elif index is not None and len(index.ids) != store._collection.count():
+                        print(f"Compact index for {name} is out of date; using Chroma (rerun vector_rag.py)")
+                        index = None
+                    self._compact[name] = index
+        return self._compact[name]
+
+    def _compact_search(self, name, store, domains, embedding, k):
+        from langchain_core.documents import Document
+        index = self._compact_index(name, store)
+        if index is None:
+            return None
+        specialties = domains if self.layout == "unified" else None
+        return [
+            (score, Document(id=chunk_id, page_content=text, metadata=metadata or {}))
+            for score, chunk_id, text, metadata in index.search(store, embedding, k, specialties, self.rerank_factor)
+        ]
+
+    def _stores_for(self, domains) -> dict:
+        stores = {}
+        for domain in domains:
+            store = self.get_store(domain)
+            if store is not None:
+                stores.setdefault(self._store_name(domain), store)
+        return stores
+
+    def search_by_vector(self, domains, embedding, k: int = 5):
+        """
+        Top-`k` chunks for `embedding` across `domains`. Returns None if none of
+        the stores exist. Blocking; call through run_blocking from async code.
+        """
+        stores = self._stores_for(domains)
+        if not stores:
+            return None
+
+        compact = [self._compact_search(name, store, domains, embedding, k) for name, store in stores.items()]
+        if all(results is not None for results in compact):
+            merged = sorted((pair for results in compact for pair in results), key=lambda pair: -pair[0])
+            return [doc for _, doc in merged[:k]]
+
+        if self.layout == "unified":
+            store = next(iter(stores.values()))
+            if len(domains) == 1:
+                specialty_filter = {"specialty": domains[0]}
+            else:
+                specialty_filter = {"specialty": {"$in": list(domains)}}
+            return store.similarity_search_by_vector(embedding, k=k, filter=specialty_filter)
+
+        if len(stores) == 1:
+            return next(iter(stores.values())).similarity_search_by_vector(embedding, k=k)
+        # One query per store, merged by distance
+        scored = []
+        for store in stores.values():
+            scored.extend(store.similarity_search_by_vector_with_relevance_scores(embedding, k=k))
+        scored.sort(key=lambda pair: pair[1])
+        return [doc for doc, _ in scored[:k]]
+
+    def _bm25_index(self, name: str):
+        if name not in self._bm25:
+            with self._lock:
+                if name not in self._bm25:
+                    self._bm25[name] = BM25Index.load(self.persist_directory(name))
+        return self._bm25[name]
+
+    def lexical_search(self, domains, query: str, k: int = 5):
+        """Top-`k` BM25 matches across `domains` ([] when no store has a BM25 sidecar). Blocking."""
+        from langchain_core.documents import Document
+        specialties = domains if self.layout == "unified" else None
+        per_store = []
+        for name, store in self._stores_for(domains).items():
+            index = self._bm25_index(name)
+            if index is None:
+                continue
+            ids = index.search(query, k, specialties)
+            if not ids:
+                continue
+            found = store.get(ids=ids, include=["documents", "metadatas"])
+            by_id = {
+                chunk_id: Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+            }
+            per_store.append([by_id[chunk_id] for chunk_id in ids if chunk_id in by_id])
+        # BM25 scores aren't comparable across separate indexes, so merge stores by rank
+        return per_store[0] if len(per_store) == 1 else reciprocal_rank_fusion(per_store, k)
+
+    def warm_up(self, domains=None):
+        """Load the embedding model and the given (default: all) stores. Safe to call from a worker thread."""
+        try:
+            self.embedding_model
+            for domain in domains or list(self.vector_store.keys()):
+                self.get_store(domain)
         except Exception as e:
             print(f"Error loading vector store: {e}")
-        
+            return f"❌ Vector store warm-up failed: {e}"
         return "✅ Vector store loaded successfully."
 
-def VectorRAG_initialize():
-    vector_rag = VectorRAG()
-    vector_rag.initialize()
-    return vector_rag
+    def initialize(self):
+        # Kept for the notebooks: eager load of everything
+        return self.warm_up()
 
+    def status(self) -> dict:
+        names = dict.fromkeys(self._store_name(d) for d in self.vector_store)
+        available = [n for n in names if os.path.exists(self.persist_directory(n))]
+        loaded = list(self._stores)
+        return {
+            "layout": self.layout,
+            "embedding_model_loaded": self._embedding_model is not None,
+            "stores_available": available,
+            "stores_loaded": loaded,
+            "warm": self._embedding_model is not None and set(available) <= set(loaded),
+            "load_seconds": dict(self.load_seconds),
+        }
 
+def VectorRAG_initialize(layout: str = "per_specialty", vector_format: str = "float32", rerank_factor: int = 4):
+    # Nothing heavy happens here any more; see VectorRAG.get_store / warm_up
+    return VectorRAG(layout, vector_format, rerank_factor)
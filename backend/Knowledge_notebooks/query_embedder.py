@@ -0,0 +1,96 @@
+import asyncio
+import re
+from collections import OrderedDict
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class QueryEmbedder:
+    """
+    Async front end for query embeddings: LRU cache + micro-batching.
+
+    Repeated queries (after whitespace/case normalization) come from a bounded
+    LRU. Misses are queued; the queue is flushed after `wait_ms` or as soon as it
+    holds `max_batch` texts, and the whole batch goes through one
+    `embed_documents` forward pass. Concurrent requests for the same text share
+    one slot in the batch.
+
+    `embed_documents` is the blocking model call and `run_blocking` the coroutine
+    used to run it off the event loop (backend.blocking_io.run_blocking).
+    """
+
+    def __init__(self, embed_documents, run_blocking, cache_size=1024, wait_ms=5.0, max_batch=32):
+        self.embed_documents = embed_documents
+        self.run_blocking = run_blocking
+        self.cache_size = cache_size
+        self.wait_seconds = wait_ms / 1000
+        self.max_batch = max_batch
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._flush_handle = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    async def embed(self, text: str):
+        key = normalize_query(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        slot = self._pending.get(key)
+        if slot is None:
+            loop = asyncio.get_running_loop()
+            slot = self._pending[key] = (text, loop.create_future())
+            if len(self._pending) >= self.max_batch:
+                self._schedule_flush(loop, now=True)
+            elif self._flush_handle is None:
+                self._schedule_flush(loop)
+        return await asyncio.shield(slot[1])
+
+    def _schedule_flush(self, loop, now=False):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if now:
+            self._flush_handle = None
+            loop.create_task(self._flush())
+        else:
+            self._flush_handle = loop.call_later(self.wait_seconds, lambda: loop.create_task(self._flush()))
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        keys = list(batch.keys())
+        try:
+            vectors = await self.run_blocking(self.embed_documents, [batch[k][0] for k in keys])
+        except Exception as e:
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_texts += len(keys)
+        for key, vector in zip(keys, vectors):
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            batch[key][1].set_result(vector)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "cached": len(self._cache),
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+        }
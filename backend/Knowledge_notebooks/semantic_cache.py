@@ -0,0 +1,162 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from Knowledge_notebooks.bm25_index import tokenize
+
+# Question phrasing that never changes the clinical meaning
+_FILLER = frozenset(
+    "what how does do should can could would when why who which about tell me please explain give list "
+    "best recommended usual patient patients".split()
+)
+_SUFFIXES = ("ments", "ment", "ing", "ed", "es", "s")
+
+
+def _stem(token):
+    for suffix in _SUFFIXES:
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def key_terms(query):
+    """The query's content terms, lightly stemmed: "treating allergic conjunctivitis" -> {treat, allergic, conjunctivitis}."""
+    return frozenset(_stem(t) for t in tokenize(query) if t not in _FILLER)
+
+
+@dataclass
+class _CachedAnswer:
+    query: str
+    embedding: np.ndarray
+    answer: str
+    created: float
+    terms: frozenset = None  # key_terms(query); None in caches pickled before the term guard
+
+
+class SemanticAnswerCache:
+    """
+    Per-specialty cache of synthesized VectorRAG answers, keyed on the query embedding.
+
+    A lookup hits when a cached query of the same domain has cosine similarity
+    >= `threshold` (bge embeddings are normalized, so this is a dot product)
+    and, with `require_same_terms`, the same `key_terms`. Embeddings alone put
+    "allergic conjunctivitis treatment" and "bacterial conjunctivitis treatment",
+    or child and adult dosing, above any usable threshold; the term guard
+    keeps such near neighbours from answering each other while rephrasings
+    ("treating X" / "treatment for X") still hit.
+    Each domain is an LRU capped at `max_entries`, entries expire after
+    `ttl_seconds`, and a domain is dropped as soon as the fingerprint of its
+    Chroma store changes (i.e. the store was rebuilt). With `persist_dir` set,
+    every domain is pickled to `<persist_dir>/<domain>.pkl` and reloaded on start.
+    """
+
+    def __init__(self, threshold=0.92, max_entries=256, ttl_seconds=86400, persist_dir=None, require_same_terms=True):
+        self.threshold = threshold
+        self.require_same_terms = require_same_terms
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_dir = persist_dir
+        self._domains = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.term_rejections = 0
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            self._load()
+
+    def _entries(self, domain, fingerprint):
+        if domain not in self._domains or self._fingerprints.get(domain) != fingerprint:
+            if self._domains.get(domain):
+                self.invalidations += 1
+            self._domains[domain] = OrderedDict()
+            self._fingerprints[domain] = fingerprint
+        return self._domains[domain]
+
+    def get(self, domain, embedding, fingerprint=None, query_text=None):
+        """Return the closest cached answer that clears the threshold (and matches `query_text`'s terms), else None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        terms = key_terms(query_text) if self.require_same_terms and query_text is not None else None
+        now = time.time()
+        with self._lock:
+            entries = self._entries(domain, fingerprint)
+            for key in [k for k, e in entries.items() if now - e.created > self.ttl_seconds]:
+                del entries[key]
+            if not entries:
+                self.misses += 1
+                return None
+            keys = list(entries.keys())
+            scores = np.stack([entries[k].embedding for k in keys]) @ query
+            for best in np.argsort(-scores):
+                if scores[best] < self.threshold:
+                    break
+                entry = entries[keys[best]]
+                if terms is not None and (entry.terms or key_terms(entry.query)) != terms:
+                    self.term_rejections += 1
+                    continue
+                entries.move_to_end(keys[best])
+                self.hits += 1
+                return entry.answer
+            self.misses += 1
+            return None
+
+    def put(self, domain, query, embedding, answer, fingerprint=None):
+        with self._lock:
+            entries = self._entries(domain, fingerprint)
+            entries[query] = _CachedAnswer(query, np.asarray(embedding, dtype=np.float32), answer, time.time(),
+                                           key_terms(query))
+            entries.move_to_end(query)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            snapshot = (fingerprint, list(entries.values())) if self.persist_dir else None
+        if snapshot is not None:
+            self._save(domain, snapshot)
+
+    def clear(self, domain=None):
+        with self._lock:
+            for d in [domain] if domain else list(self._domains):
+                self._domains.pop(d, None)
+                self._fingerprints.pop(d, None)
+                if self.persist_dir and os.path.exists(self._path(d)):
+                    os.remove(self._path(d))
+
+    def _path(self, domain):
+        return os.path.join(self.persist_dir, f"{domain}.pkl")
+
+    def _save(self, domain, snapshot):
+        tmp = self._path(domain) + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(domain))
+
+    def _load(self):
+        for name in os.listdir(self.persist_dir):
+            if not name.endswith(".pkl"):
+                continue
+            domain = name[:-len(".pkl")]
+            try:
+                with open(os.path.join(self.persist_dir, name), "rb") as f:
+                    fingerprint, entries = pickle.load(f)
+            except Exception as e:
+                print(f"Skipping unreadable RAG cache {name}: {e}")
+                continue
+            self._fingerprints[domain] = fingerprint
+            self._domains[domain] = OrderedDict((e.query, e) for e in entries[-self.max_entries:])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "term_rejections": self.term_rejections,
+                "entries": {d: len(e) for d, e in self._domains.items()},
+                "threshold": self.threshold,
+            }
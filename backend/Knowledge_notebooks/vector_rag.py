@@ -1,9 +1,17 @@
+import argparse
+import hashlib
+import json
 import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
 from langchain_community.document_loaders import UnstructuredPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_community.vectorstores.utils import filter_complex_metadata
+from compact_index import CompactIndex
+from bm25_index import BM25Index
 
 all_slicing_rules = {
     "Ophthalmologist": {
@@ -141,80 +149,303 @@ all_slicing_rules = {
     }
 }
 
-knowledge_base_dir = "../Knowledge Base/"
+_here = os.path.dirname(os.path.abspath(__file__))
+knowledge_base_dir = os.path.join(_here, "..", "Knowledge Base")
+vector_stores_dir = os.path.join(_here, "..", "vector_stores")
 specialists = list(all_slicing_rules.keys())
 
 model_name = "BAAI/bge-large-en-v1.5"
 model_kwargs = {"device": "cpu"}
 encode_kwargs = {"normalize_embeddings": True}
-embedding_model = HuggingFaceEmbeddings(
-    model_name=model_name,
-    model_kwargs=model_kwargs,
-    encode_kwargs=encode_kwargs
-)
-
-for specialist in specialists:
-    print(f"--- Processing specialist: {specialist} ---")
-    
+
+MANIFEST_FILE = "manifest.json"
+UNIFIED_STORE = "_unified"  # keep in sync with initialize_rag.UNIFIED_STORE
+
+
+def _chunk_id(specialist, filename, sha256, index):
+    # The content hash is part of the id, so a changed file never overwrites its old chunks in place
+    return f"{specialist}/{filename}/{sha256[:12]}/{index}"
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_pdf(specialist, filename, file_path, sha256, page_range):
+    """
+    Worker: load one PDF, keep the pages in `page_range` and split them into chunks.
+    Runs in a separate process; returns plain (id, text, metadata) tuples.
+    """
+    loader = UnstructuredPDFLoader(file_path, mode="paged")
+    documents = loader.load()
+
+    if page_range:
+        start_page, end_page = page_range
+        documents = [
+            doc for doc in documents
+            if start_page <= doc.metadata.get('page_number', 0) <= end_page
+        ]
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        add_start_index=True
+    )
+    chunked_documents = filter_complex_metadata(text_splitter.split_documents(documents))
+    for doc in chunked_documents:
+        doc.metadata["specialty"] = specialist
+    return [
+        (_chunk_id(specialist, filename, sha256, i), doc.page_content, doc.metadata)
+        for i, doc in enumerate(chunked_documents)
+    ]
+
+
+def _manifest_file(specialist, unified):
+    # The unified store holds every specialty, so each keeps its own manifest next to it
+    return f"manifest.{specialist}.json" if unified else MANIFEST_FILE
+
+
+def load_manifest(persist_directory, manifest_file=MANIFEST_FILE):
+    """
+    Per-specialty record of what is in the store:
+    {"files": {filename: {"sha256", "page_range", "chunk_ids"}}}.
+    Returns None when the store predates the manifest (or doesn't exist).
+    """
+    path = os.path.join(persist_directory, manifest_file)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def _save_manifest(persist_directory, manifest, manifest_file=MANIFEST_FILE):
+    path = os.path.join(persist_directory, manifest_file)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+@dataclass
+class IngestPlan:
+    specialist: str
+    pdf_directory: str
+    persist_directory: str
+    manifest: dict
+    manifest_file: str = MANIFEST_FILE
+    add: dict = field(default_factory=dict)       # filename -> sha256, new files
+    update: dict = field(default_factory=dict)    # filename -> sha256, changed content or page range
+    delete: list = field(default_factory=list)    # filenames gone from the Knowledge Base
+    unchanged: int = 0
+    reset_store: bool = False                     # store exists but has no manifest
+
+    @property
+    def has_work(self):
+        return bool(self.add or self.update or self.delete or self.reset_store)
+
+    def summary(self):
+        stale = sum(len(self.manifest["files"][f]["chunk_ids"]) for f in [*self.update, *self.delete])
+        lines = [f"{self.specialist}: +{len(self.add)} new, ~{len(self.update)} changed, "
+                 f"-{len(self.delete)} removed, {self.unchanged} unchanged ({stale} chunks to delete)"]
+        if self.reset_store:
+            lines.append("  store has no manifest: it will be cleared and rebuilt")
+        lines += [f"  + {f}" for f in self.add] + [f"  ~ {f}" for f in self.update] + [f"  - {f}" for f in self.delete]
+        return "\n".join(lines)
+
+
+def plan_specialist(specialist, unified=False, force=False):
+    """Diff the specialty's PDFs against its manifest. `force` re-ingests every file."""
     pdf_directory = os.path.join(knowledge_base_dir, specialist)
-    persist_directory = f"../vector_stores/{specialist}/"
-    
+    persist_directory = os.path.join(vector_stores_dir, UNIFIED_STORE if unified else specialist)
     if not os.path.exists(pdf_directory):
         print(f"--- ⚠️ Warning: Directory {pdf_directory} not found, skipping. ---")
-        continue
+        return None
 
-    all_chapter_docs = []
-    slicing_rules = all_slicing_rules.get(specialist, {})
-    
-    pdf_files = [f for f in os.listdir(pdf_directory) if f.endswith('.pdf')]
+    manifest_file = _manifest_file(specialist, unified)
+    manifest = load_manifest(persist_directory, manifest_file)
+    plan = IngestPlan(specialist, pdf_directory, persist_directory, manifest or {"files": {}}, manifest_file)
+    # The unified store is only ever written through manifests, so there is nothing legacy to clear
+    plan.reset_store = (not unified and manifest is None
+                        and os.path.exists(os.path.join(persist_directory, "chroma.sqlite3")))
 
+    slicing_rules = all_slicing_rules.get(specialist, {})
+    known = plan.manifest["files"]
+    pdf_files = sorted(f for f in os.listdir(pdf_directory) if f.endswith('.pdf'))
     for filename in pdf_files:
-        file_path = os.path.join(pdf_directory, filename)
-        
-        if not os.path.exists(file_path):
-            print(f"--- ⚠️ Warning: File {filename} not found, skipping. ---")
-            continue
-
-        loader = UnstructuredPDFLoader(file_path, mode="paged")
-        documents = loader.load()
-        
-        if filename in slicing_rules:
-            start_page, end_page = slicing_rules[filename]
-            print(f"--- Processing: {filename}, pages {start_page}-{end_page} ---")
-            main_content = [
-                doc for doc in documents 
-                if start_page <= doc.metadata.get('page_number', 0) <= end_page
-            ]
+        sha256 = file_sha256(os.path.join(pdf_directory, filename))
+        page_range = slicing_rules.get(filename)
+        entry = known.get(filename)
+        if entry is None:
+            plan.add[filename] = sha256
+        elif force or entry["sha256"] != sha256 or entry["page_range"] != (list(page_range) if page_range else None):
+            plan.update[filename] = sha256
         else:
-            print(f"--- Processing: {filename} (all pages) ---")
-            main_content = documents
-        
-        all_chapter_docs.extend(main_content)
+            plan.unchanged += 1
+    plan.delete = [f for f in known if f not in pdf_files]
+    return plan
 
-    if not all_chapter_docs:
-        print(f"--- No documents found for {specialist}, skipping vector store creation. ---")
-        continue
 
-    print(f"\n✅ Total documents collected for {specialist}: {len(all_chapter_docs)}")
+def _add_in_batches(store, chunks, batch_size):
+    # Chroma upserts by id, so re-adding a half-written file after a crash is harmless
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        store.add_texts(
+            texts=[text for _, text, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch],
+            ids=[chunk_id for chunk_id, _, _ in batch],
+        )
+
+
+def _delete_file(store, manifest, filename):
+    chunk_ids = manifest["files"][filename]["chunk_ids"]
+    if chunk_ids:
+        store.delete(ids=chunk_ids)
+    del manifest["files"][filename]
+
+
+def apply_plan(plan, pool, embedding_model, batch_size, max_in_flight):
+    print(f"--- Processing specialist: {plan.specialist} ---")
+    os.makedirs(plan.persist_directory, exist_ok=True)
+    store = Chroma(persist_directory=plan.persist_directory, embedding_function=embedding_model)
+    manifest = plan.manifest
+
+    if plan.reset_store:
+        store.reset_collection()
+        _save_manifest(plan.persist_directory, manifest, plan.manifest_file)
+
+    # The manifest is saved after every file, so it doubles as the resume checkpoint:
+    # a file only counts as ingested once its chunks are in and its old ones are gone
+    for filename in plan.delete:
+        _delete_file(store, manifest, filename)
+        _save_manifest(plan.persist_directory, manifest, plan.manifest_file)
+        print(f"🗑️ {plan.specialist}/{filename}: removed")
+
+    slicing_rules = all_slicing_rules.get(plan.specialist, {})
+    queue = list({**plan.add, **plan.update}.items())
+    in_flight = {}
+    # Bounded window of files being parsed, so a 1300-page book doesn't pile up
+    # behind the embedder with every other file of the specialty
+    while queue or in_flight:
+        while queue and len(in_flight) < max_in_flight:
+            filename, sha256 = queue.pop(0)
+            page_range = slicing_rules.get(filename)
+            label = f"pages {page_range[0]}-{page_range[1]}" if page_range else "all pages"
+            print(f"--- Processing: {filename}, {label} ---")
+            future = pool.submit(parse_pdf, plan.specialist, filename,
+                                 os.path.join(plan.pdf_directory, filename), sha256, page_range)
+            in_flight[future] = (filename, sha256, page_range)
+
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            filename, sha256, page_range = in_flight.pop(future)
+            try:
+                chunks = future.result()
+            except Exception as e:
+                print(f"--- ❌ Failed to parse {filename}: {e} ---")
+                continue
+            _add_in_batches(store, chunks, batch_size)
+            new_ids = [chunk_id for chunk_id, _, _ in chunks]
+            old = manifest["files"].get(filename)
+            if old:
+                keep = set(new_ids)
+                stale = [chunk_id for chunk_id in old["chunk_ids"] if chunk_id not in keep]
+                if stale:
+                    store.delete(ids=stale)
+            manifest["files"][filename] = {
+                "sha256": sha256,
+                "page_range": list(page_range) if page_range else None,
+                "chunk_ids": new_ids,
+            }
+            _save_manifest(plan.persist_directory, manifest, plan.manifest_file)
+            print(f"✅ {plan.specialist}/{filename}: {len(chunks)} chunks")
+
+    total = sum(len(entry["chunk_ids"]) for entry in manifest["files"].values())
+    print(f"✅ Vector store for {plan.specialist} up to date at: {plan.persist_directory} ({total} chunks)\n")
+
+
+def refresh_compact_index(persist_directory, fmt=None, changed=False):
+    """
+    (Re)build the store's int8/float16 sidecar when asked for (`fmt`) or when
+    an existing sidecar is now stale because the store `changed`.
+    """
+    existing = CompactIndex.load(persist_directory)
+    fmt = fmt or (existing.format if existing else None)
+    if fmt is None or (existing is not None and existing.format == fmt and not changed):
+        return
+    store = Chroma(persist_directory=persist_directory)
+    index = CompactIndex.build(store, fmt)
+    index.save(persist_directory)
+    full_mb = index.codes.size * 4 / 2**20
+    print(f"✅ {fmt} compact index for {os.path.basename(persist_directory)}: "
+          f"{len(index.ids)} vectors, {index.nbytes / 2**20:.1f} MB (float32: {full_mb:.1f} MB)")
+
+
+def refresh_bm25_index(persist_directory, changed=False):
+    """Rebuild the BM25 sidecar whenever the store changed (or has none yet)."""
+    if not changed and BM25Index.load(persist_directory) is not None:
+        return
+    store = Chroma(persist_directory=persist_directory)
+    index = BM25Index.build(store)
+    index.save(persist_directory)
+    size_mb = os.path.getsize(os.path.join(persist_directory, "bm25_index.npz")) / 2**20
+    print(f"✅ BM25 index for {os.path.basename(persist_directory)}: "
+          f"{len(index.ids)} chunks, {len(index.vocab)} terms, {size_mb:.1f} MB on disk")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or incrementally update the per-specialty Chroma stores from Knowledge Base PDFs.")
+    parser.add_argument("specialists", nargs="*", default=specialists, help="default: all")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=128, help="chunks per embed/upsert call")
+    parser.add_argument("--rebuild", action="store_true", help="drop existing stores and manifests first")
+    parser.add_argument("--dry-run", action="store_true", help="only print the planned adds / updates / deletes")
+    parser.add_argument("--unified", action="store_true",
+                        help=f"write into the single {UNIFIED_STORE} store (filtered by `specialty` metadata) instead of one store per specialty")
+    parser.add_argument("--compact", choices=["int8", "float16"],
+                        help="also write a quantized sidecar index (used when RAG_VECTOR_FORMAT matches)")
+    args = parser.parse_args(argv)
+
+    if args.rebuild and not args.dry_run:
+        if args.unified:
+            # Other specialties share the unified store; only wipe it when rebuilding all of them
+            if set(args.specialists) == set(specialists):
+                shutil.rmtree(os.path.join(vector_stores_dir, UNIFIED_STORE), ignore_errors=True)
+        else:
+            for specialist in args.specialists:
+                shutil.rmtree(os.path.join(vector_stores_dir, specialist), ignore_errors=True)
+
+    force = args.rebuild and args.unified
+    plans = [plan for plan in (plan_specialist(s, args.unified, force) for s in args.specialists) if plan is not None]
+    for plan in plans:
+        print(plan.summary())
+    if args.dry_run:
+        print("--- Dry run, no changes made. ---")
+        return
+
+    changed = {plan.persist_directory for plan in plans if plan.has_work}
+    if changed:
+        embedding_model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs
+        )
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for plan in plans:
+                if plan.has_work:
+                    apply_plan(plan, pool, embedding_model, args.batch_size, max_in_flight=args.workers * 2)
+
+    # Sidecars are keyed by store directory (the unified store is shared by every plan)
+    for persist_directory in dict.fromkeys(plan.persist_directory for plan in plans):
+        if os.path.exists(persist_directory):
+            refresh_compact_index(persist_directory, args.compact, persist_directory in changed)
+            refresh_bm25_index(persist_directory, persist_directory in changed)
+
+    print("--- All specialists processed. ---" if changed else "--- Nothing to do. ---")
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        add_start_index=True 
-    )
-    chunked_documents = text_splitter.split_documents(all_chapter_docs)
-    print(f"Split {len(all_chapter_docs)} documents into {len(chunked_documents)} chunks for {specialist}.")
-
-    filtered_documents = filter_complex_metadata(chunked_documents) 
-    
-    if not os.path.exists(persist_directory):
-        os.makedirs(persist_directory)
-
-    vector_store = Chroma.from_documents(
-        documents=filtered_documents,
-        embedding=embedding_model,
-        persist_directory=persist_directory
-    )
-    print(f"✅ Vector store for {specialist} created successfully at: {persist_directory}\n")
 
-print("--- All specialists processed. ---")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,23 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from .AI_hospital import myapp
+from .AI_hospital import myapp, llm_triage, llm, llm_rag, vector_rag, rag_answer_cache, query_embedder, context_compressor, history_manager, tool_dispatch_stats, ASK_NODES as _GRAPH_ASK_NODES, AGENT_NODE_STREAMS
 from . import database, models, oauth2
+from .config import settings
 from .mongo_client import get_conversation_logs
-from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
+from .thread_lifecycle import ThreadLifecycleManager
+from .blocking_io import run_blocking
+from .checkpointer import checkpointer_ready
+from .llm_scheduler import llm_scheduler
+from .history import SUMMARY_TAG
+from langchain_core.messages import HumanMessage, ToolMessage, AIMessage, AIMessageChunk
 from sse_starlette.sse import EventSourceResponse
 import json
 
 router = APIRouter()
 
-ASK_NODES = {
-    "GP_AskUser", "Ophthal_AskUser", "Pedia_AskUser", "Ortho_AskUser",
-    "Dermat_AskUser", "ENT_AskUser", "Gynec_AskUser", "Psych_AskUser",
-    "IntMed_AskUser", "Patho_AskUser", "Radio_AskUser",
-}
+# Both tables are generated from the specialist registry in AI_hospital.py
+ASK_NODES = set(_GRAPH_ASK_NODES)
 
 def _make_config(thread_id: str):
     return {"configurable": {"thread_id": thread_id}}
@@ -36,6 +39,11 @@ def _initial_inputs(user_text: str, patient_id: int):
         "current_report": [],
         "current_agent": "GP",
         "patient_id": patient_id, 
+        "route": None,
+        "self_loops": 0,
+        "history": {},
+        "patient_info": "",
+        "final_report": [],
     }
 
 def _extract_ask_question(state_values: dict) -> Optional[str]:
@@ -94,6 +102,31 @@ def _speaker_for_key(stream_key: str) -> str:
         return "Radiologist"
     return "Assistant"
 
+def _stream_modes(stream_tokens: bool):
+    return ["values", "messages"] if stream_tokens else ["values"]
+
+def _delta_payload(msg_chunk, metadata: dict) -> Optional[dict]:
+    """Convert an LLM token chunk (stream_mode="messages") into a `delta` payload.
+
+    Only tokens from agent nodes are forwarded; the RAG synthesis call that runs
+    inside the *_Tooler nodes is internal and stays hidden, and so is the history
+    summarizer that runs inside the agent nodes (tagged "nostream", dropped here too).
+    """
+    node = metadata.get("langgraph_node")
+    stream_key = AGENT_NODE_STREAMS.get(node)
+    if stream_key is None or not isinstance(msg_chunk, AIMessageChunk):
+        return None
+    if SUMMARY_TAG in (metadata.get("tags") or ()):
+        return None
+    if not isinstance(msg_chunk.content, str) or not msg_chunk.content:
+        return None
+    return {
+        "id": msg_chunk.id,
+        "content": msg_chunk.content,
+        "speaker": _speaker_for_key(stream_key),
+        "current_agent": node,
+    }
+
 def _chunk_to_payload(chunk: dict) -> Optional[dict]:
     """Convert a graph chunk to a frontend payload."""
     current_agent = chunk.get("current_agent")
@@ -146,6 +179,7 @@ def _save_conversation_to_mongo(thread_id: str, patient_id: int, state_values: d
             "patho_QnA": state_values.get("patho_QnA", []),
             "radio_QnA": state_values.get("radio_QnA", []),
             "current_report": state_values.get("current_report", []),
+            "final_report": state_values.get("final_report", []),
             "final_agent": state_values.get("current_agent"),
         }
         
@@ -158,6 +192,15 @@ def _save_conversation_to_mongo(thread_id: str, patient_id: int, state_values: d
         print(f"⚠️ MongoDB save failed: {e}")
 
 
+thread_manager = ThreadLifecycleManager(
+    myapp,
+    on_evict=_save_conversation_to_mongo,
+    idle_ttl_seconds=settings.thread_idle_ttl_seconds,
+    max_threads=settings.thread_max_resident,
+    spill_dir=settings.thread_spill_dir,
+)
+
+
 def _new_tool_calls(chunk: dict, seen_ids: set) -> list[dict]:
     """Extract newly issued tool calls from the stream chunk."""
     out: list[dict] = []
@@ -186,6 +229,7 @@ def _new_tool_calls(chunk: dict, seen_ids: set) -> list[dict]:
 async def start_graph_stream(
     message: str, 
     token: str, 
+    stream_tokens: bool = True,
     db: Session = Depends(database.get_db)
 ):
     credentials_exception = HTTPException(
@@ -206,7 +250,12 @@ async def start_graph_stream(
         current_agent = "GP"
         seen_tool_ids: set = set()
         
-        async for chunk in myapp.astream(inputs, config, stream_mode="values"):
+        async for mode, chunk in myapp.astream(inputs, config, stream_mode=_stream_modes(stream_tokens)):
+            if mode == "messages":
+                delta = _delta_payload(*chunk)
+                if delta:
+                    yield {"event": "delta", "data": json.dumps({"thread_id": thread_id, **delta})}
+                continue
             for tc in _new_tool_calls(chunk, seen_tool_ids):
                 yield {"event": "tool", "data": json.dumps({"thread_id": thread_id, **tc})}
             payload = _chunk_to_payload(chunk)
@@ -218,7 +267,7 @@ async def start_graph_stream(
                     payload.setdefault("current_agent", current_agent)
                 yield {"event": "message", "data": json.dumps({"thread_id": thread_id, **payload})}
         
-        state = myapp.get_state(config)
+        state = await myapp.aget_state(config)
         state_values = state.values or {}
         next_nodes = set(state.next or [])
         current_agent = state_values.get("current_agent", current_agent)
@@ -231,6 +280,7 @@ async def start_graph_stream(
             if current_agent:
                 ask_payload["current_agent"] = current_agent
                 ask_payload["speaker"] = current_agent
+            await thread_manager.touch(thread_id, patient_id)
             yield {"event": "ask_user", "data": json.dumps(ask_payload)}
         else:
             final = _last_assistant_text(state_values)
@@ -238,7 +288,8 @@ async def start_graph_stream(
             if current_agent:
                 final_payload["current_agent"] = current_agent
             # Save complete conversation to MongoDB
-            _save_conversation_to_mongo(thread_id, patient_id, state_values)
+            await run_blocking(_save_conversation_to_mongo, thread_id, patient_id, state_values)
+            await thread_manager.release(thread_id)
             yield {"event": "final", "data": json.dumps(final_payload)}
 
     return EventSourceResponse(event_gen())
@@ -247,7 +298,8 @@ async def start_graph_stream(
 async def resume_graph_stream(
     thread_id: str, 
     user_reply: str,
-    token: str 
+    token: str,
+    stream_tokens: bool = True,
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -257,22 +309,40 @@ async def resume_graph_stream(
     resume_patient_id = int(token_data.id)
     
     config = _make_config(thread_id)
-    state = myapp.get_state(config)
-    if state is None:
+    state = await myapp.aget_state(config)
+    if (state is None or not state.values) and await thread_manager.restore(thread_id):
+        state = await myapp.aget_state(config)
+    if state is None or not state.values:
         raise HTTPException(status_code=404, detail="Thread not found or expired")
 
     stream_key, tool_msg = _inject_user_reply_as_tool_message(state.values or {}, user_reply)
     if not tool_msg:
         raise HTTPException(status_code=400, detail="No pending ask_user call to answer")
     
+    # Restart the idle clock now: the patient may have taken most of the TTL to answer
+    await thread_manager.touch(thread_id, resume_patient_id)
     current_stream: List = state.values.get(stream_key, [])
     updated_stream = current_stream + [tool_msg]
-    myapp.update_state(config, {stream_key: updated_stream})
+    await myapp.aupdate_state(config, {stream_key: updated_stream})
 
     async def event_gen():
+        # Not evictable while this run is writing checkpoints
+        await thread_manager.pin(thread_id)
+        try:
+            async for event in _resume_events():
+                yield event
+        finally:
+            await thread_manager.unpin(thread_id)
+
+    async def _resume_events():
         current_agent = (state.values or {}).get("current_agent", "GP")
         seen_tool_ids: set = set()
-        async for chunk in myapp.astream(None, config, stream_mode="values"):
+        async for mode, chunk in myapp.astream(None, config, stream_mode=_stream_modes(stream_tokens)):
+            if mode == "messages":
+                delta = _delta_payload(*chunk)
+                if delta:
+                    yield {"event": "delta", "data": json.dumps({"thread_id": thread_id, **delta})}
+                continue
             for tc in _new_tool_calls(chunk, seen_tool_ids):
                 yield {"event": "tool", "data": json.dumps({"thread_id": thread_id, **tc})}
             payload = _chunk_to_payload(chunk)
@@ -283,7 +353,7 @@ async def resume_graph_stream(
                 elif current_agent and "content" in payload:
                     payload.setdefault("current_agent", current_agent)
                 yield {"event": "message", "data": json.dumps({"thread_id": thread_id, **payload})}
-        state2 = myapp.get_state(config)
+        state2 = await myapp.aget_state(config)
         state_values2 = state2.values or {}
         next_nodes = set(state2.next or [])
         current_agent = state_values2.get("current_agent", current_agent)
@@ -295,6 +365,7 @@ async def resume_graph_stream(
             if current_agent:
                 ask_payload["current_agent"] = current_agent
                 ask_payload["speaker"] = current_agent
+            await thread_manager.touch(thread_id, resume_patient_id)
             yield {"event": "ask_user", "data": json.dumps(ask_payload)}
         else:
             final = _last_assistant_text(state_values2)
@@ -302,7 +373,57 @@ async def resume_graph_stream(
             if current_agent:
                 final_payload["current_agent"] = current_agent
             # Save complete conversation to MongoDB
-            _save_conversation_to_mongo(thread_id, resume_patient_id, state_values2)
+            await run_blocking(_save_conversation_to_mongo, thread_id, resume_patient_id, state_values2)
+            await thread_manager.release(thread_id)
             yield {"event": "final", "data": json.dumps(final_payload)}
 
-    return EventSourceResponse(event_gen())
\ No newline at end of file
+    return EventSourceResponse(event_gen())
+
+
+@router.get("/graph/threads/metrics")
+def thread_metrics():
+    """Resident thread count/bytes and eviction counters for this worker."""
+    return thread_manager.metrics()
+
+
+@router.get("/graph/ready")
+def readiness():
+    """What this worker has loaded so far. `ready` is true once the checkpointer is open."""
+    rag = vector_rag.status()
+    return {
+        "ready": checkpointer_ready(),
+        "checkpointer": type(myapp.checkpointer).__name__,
+        "rag": rag,
+    }
+
+
+@router.get("/graph/rag/metrics")
+def rag_metrics():
+    """RAG cache counters. Every answer-cache hit is one synthesis call saved."""
+    return {
+        "answer_cache": rag_answer_cache.stats() if rag_answer_cache is not None else None,
+        "query_embeddings": query_embedder.stats(),
+        "context_compression": context_compressor.stats() if context_compressor is not None else None,
+    }
+
+
+@router.get("/graph/tools/metrics")
+def tools_metrics():
+    """Tool calls dispatched / timed out / peak concurrency per tool set, and search_internet cache counters."""
+    return tool_dispatch_stats()
+
+
+@router.get("/graph/llm/metrics")
+def llm_metrics():
+    """LLM scheduler (queue depth, admission waits, 429s, retries), per-role backend health / failovers, history folding."""
+    return {
+        "scheduler": llm_scheduler.stats(),
+        "providers": {pool.role: pool.stats() for pool in (llm_triage, llm, llm_rag)},
+        "history": history_manager.stats(),
+    }
+
+
+@router.get("/graph/db/metrics")
+def db_metrics():
+    """SQLAlchemy pool: connections in use / overflow, checkout wait (mean, p95, max) and checkout timeouts."""
+    return database.pool_stats()
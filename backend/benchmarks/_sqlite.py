@@ -0,0 +1,44 @@
+"""
+Shared setup for the database benchmarks (and tests): placeholder settings, SQLite-compatible defaults, patients.
+
+Import it before anything that reads `backend.config`: the settings require
+database and JWT variables, which get placeholder values here when unset.
+"""
+
+import os
+
+for _var in ("DATABASE_PASSWORD", "DATABASE_NAME", "DATABASE_USERNAME", "SECRET_KEY", "ALGORITHM"):
+    os.environ.setdefault(_var, "benchmark")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+from sqlalchemy import func, select, text
+
+from backend import models
+from backend.database import Base
+
+_BATCH = 50_000
+
+
+def use_current_timestamp(setattr=setattr):
+    """SQLite has no now(): point the models' now() server defaults at CURRENT_TIMESTAMP.
+
+    Tests pass `monkeypatch.setattr` so the change is undone afterwards.
+    """
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            default = column.server_default
+            if default is not None and "now()" in str(getattr(default, "arg", "")):
+                setattr(default, "arg", text("CURRENT_TIMESTAMP"))
+
+
+def seed_patients(engine, count: int) -> list:
+    """Insert `count` patients after the existing ones (one statement per batch); returns their ids in order."""
+    table = models.Patient.__table__
+    with engine.begin() as conn:
+        first = (conn.execute(select(func.max(table.c.patient_id))).scalar() or 0) + 1
+        ids = list(range(first, first + count))
+        for i in range(0, count, _BATCH):
+            conn.execute(table.insert(), [
+                {"patient_id": p, "email": f"patient{p}@example.org", "password": "x", "name": f"Patient {p}"}
+                for p in ids[i:i + _BATCH]])
+    return ids
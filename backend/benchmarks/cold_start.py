@@ -0,0 +1,53 @@
+"""
+Cold-start benchmark: time and peak RSS to import the graph module.
+
+Each run happens in a fresh interpreter. `lazy` is the current startup path
+(nothing RAG-related is loaded); `eager` also calls `vector_rag.warm_up()`, which
+is what importing `AI_hospital` used to cost before the stores became lazy.
+
+    python -m backend.benchmarks.cold_start --runs 3
+
+Run from the repository root so `./backend/vector_stores` resolves.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_CHILD = """
+import json, os, resource, time
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+start = time.perf_counter()
+from backend import AI_hospital
+if {eager}:
+    AI_hospital.vector_rag.warm_up()
+seconds = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_mb}}))
+"""
+
+
+def _run(eager: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(eager=eager)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(runs: int):
+    for label, eager in (("lazy", False), ("eager", True)):
+        results = [_run(eager) for _ in range(runs)]
+        seconds = statistics.median(r["seconds"] for r in results)
+        rss = statistics.median(r["rss_mb"] for r in results)
+        print(f"{label:5s} import: median {seconds:.2f}s, peak RSS {rss:.0f} MB ({runs} runs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,89 @@
+"""
+Recall@5 vs memory for the compact (float16 / int8) vector sidecar.
+
+Holds out `--queries` chunk embeddings from a store as the query set, indexes
+the rest, and compares each compact format, with and without the full-precision
+re-rank, against exact float32 search.
+
+    python -m backend.benchmarks.compact_recall --store "Internal Medicine"
+    python -m backend.benchmarks.compact_recall --synthetic 50000   # no stores needed
+
+Run from the repository root so `./backend/vector_stores` resolves.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Knowledge_notebooks.compact_index import approximate_scores, quantize
+
+
+def _store_vectors(name: str) -> np.ndarray:
+    from langchain_chroma import Chroma
+    store = Chroma(persist_directory=os.path.join("backend", "vector_stores", name))
+    return np.asarray(store.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+
+def _synthetic_vectors(n: int, dim: int = 1024, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main(args):
+    vectors = _synthetic_vectors(args.synthetic) if args.synthetic else _store_vectors(args.store)
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 10), replace=False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    corpus, queries = vectors[mask], vectors[held_out]
+    k = args.k
+
+    truth = _top_k(queries @ corpus.T, k)
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} held-out queries, recall@{k}")
+    print(f"{'index':24s} {'memory':>10s} {'recall':>8s} {'query':>10s}")
+    print(f"{'float32 exact':24s} {corpus.nbytes / 2**20:8.1f}MB {1.0:8.3f} {'-':>10s}")
+
+    for fmt in ("float16", "int8"):
+        codes, scales = quantize(corpus, fmt)
+        nbytes = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        for factor in (1, args.rerank_factor):
+            start = time.perf_counter()
+            found = []
+            for q in queries:
+                approx = approximate_scores(codes, scales, q)
+                n = k * factor
+                candidates = np.argpartition(-approx, n - 1)[:n]
+                # Re-rank on the float32 vectors (in the service these are fetched from Chroma by id)
+                exact = corpus[candidates] @ q
+                found.append(candidates[np.argsort(-exact)[:k]])
+            per_query = (time.perf_counter() - start) / len(queries) * 1000
+            label = f"{fmt} " + (f"+ rerank x{factor}" if factor > 1 else "(no rerank)")
+            print(f"{label:24s} {nbytes / 2**20:8.1f}MB {_recall(np.array(found), truth):8.3f} {per_query:8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="Internal Medicine")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic normalized vectors instead of a store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    main(parser.parse_args())
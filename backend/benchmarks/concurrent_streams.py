@@ -0,0 +1,76 @@
+"""
+Load benchmark: do concurrent consultations still serialize on one worker?
+
+Runs N consultations through `myapp.astream` at the same time with the GP model
+replaced by a fake that takes `--latency` seconds per call. In `async` mode the fake
+awaits (like `ainvoke` on a real provider); in `blocking` mode it sleeps on the event
+loop thread, which is what the old synchronous `llm.invoke` nodes did.
+
+    python -m backend.benchmarks.concurrent_streams --streams 20 --latency 1.0
+    python -m backend.benchmarks.concurrent_streams --streams 20 --latency 1.0 --mode blocking
+
+Fully serialized streams take ~streams * latency; concurrent ones take ~latency.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from uuid import uuid4
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+
+from backend import AI_hospital
+from backend.llm_scheduler import LLMScheduler
+from backend.api import _initial_inputs, _make_config
+
+UNTHROTTLED = LLMScheduler(requests_per_minute=1e9, tokens_per_minute=1e12)
+
+
+class _FakeGP:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "ask_user", "args": {"question": "What brings you in today?"}, "id": str(uuid4())}],
+        )
+
+
+async def _one_stream(patient_id: int) -> float:
+    config = _make_config(str(uuid4()))
+    start = time.perf_counter()
+    async for _ in AI_hospital.myapp.astream(_initial_inputs("Hello doctor", patient_id), config, stream_mode="values"):
+        pass
+    return time.perf_counter() - start
+
+
+async def main(streams: int, latency: float, mode: str):
+    AI_hospital.gp_llm = _FakeGP(latency, blocking=(mode == "blocking"))
+    AI_hospital.llm_scheduler = UNTHROTTLED  # fake models: keep the Groq quota out of the measurement
+    start = time.perf_counter()
+    per_stream = await asyncio.gather(*(_one_stream(i + 1) for i in range(streams)))
+    wall = time.perf_counter() - start
+    serial = streams * latency
+    print(f"mode={mode} streams={streams} latency={latency:.2f}s")
+    print(f"wall time      : {wall:.2f}s (fully serialized would be ~{serial:.2f}s)")
+    print(f"per-stream mean: {sum(per_stream) / len(per_stream):.2f}s, max {max(per_stream):.2f}s")
+    print(f"overlap factor : {serial / wall:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--mode", choices=["async", "blocking"], default="async")
+    args = parser.parse_args()
+    asyncio.run(main(args.streams, args.latency, args.mode))
@@ -0,0 +1,130 @@
+"""
+Concurrency stress test: many consultations through one compiled graph at once, checked for cross-talk.
+
+Each of `--consultations` patients runs a full consultation concurrently on the
+real graph from `build_graph()`:
+
+1. GP asks a question, records triage with Patient_data_report and refers to a specialist.
+2. The specialist consults the Pathologist, adds a report and writes its final report.
+
+The scripted model answers after `--latency-ms`, so every node of every thread
+interleaves with the others. Every triage summary, question and report carries
+the patient's marker (`patient-<n>`). Before each model call the benchmark
+checks that each prompt only mentions its own patient. At the end it checks
+that each thread's `patient_info` and `final_report` belong to that patient.
+It exits non-zero on any leak.
+
+    python -m backend.benchmarks.consultation_isolation --consultations 200
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from uuid import uuid4
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend import AI_hospital
+from backend.llm_scheduler import LLMScheduler
+from backend.api import _initial_inputs, _inject_user_reply_as_tool_message
+
+UNTHROTTLED = LLMScheduler(requests_per_minute=1e9, tokens_per_minute=1e12)
+MARKER = re.compile(r"patient-(\d+)")
+
+
+def _call(name, **args):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": str(uuid4())}])
+
+
+class _ScriptedModel:
+    """Plays every agent; the turn is derived from how many AI messages the agent's window already holds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.leaks = []
+        prefixes = {AI_hospital.GP_PREFIX.content: "GP", AI_hospital.PATHO_PREFIX.content: "Pathologist",
+                    AI_hospital.RADIO_PREFIX.content: "Radiologist"}
+        prefixes.update({p.content: node for node, p in AI_hospital.SPECIALIST_PREFIXES.items()})
+        self.agents = prefixes
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.calls += 1
+        agent = self.agents[messages[0].content]
+        prompt = "\n".join(str(m.content) for m in messages[1:]) + str([m.tool_calls for m in messages if isinstance(m, AIMessage)])
+        patients = set(MARKER.findall(prompt))
+        if len(patients) != 1:
+            self.leaks.append((agent, sorted(patients)))
+        patient = min(patients) if patients else "?"
+        turn = sum(isinstance(m, AIMessage) for m in messages)
+        await asyncio.sleep(self.latency)
+
+        if agent == "GP":
+            script = [
+                _call("ask_user", question="How old are you?"),
+                _call("Patient_data_report", data=f"patient-{patient}: 40 years old, persistent cough"),
+                _call("refer_to_specialist", specialist=AI_hospital.SPECIALISTS[int(patient) % len(AI_hospital.SPECIALISTS)].node),
+            ]
+        elif agent in AI_hospital.HELPER_NODES:
+            script = [AIMessage(content=f"This is the final report to specialist from {agent} labs: normal CBC for patient-{patient}")]
+        else:
+            script = [
+                _call("consult_helper", helper="Pathologist", question=f"CBC for patient-{patient}"),
+                _call("add_report", report=f"Assessment of patient-{patient}: viral bronchitis"),
+                AIMessage(content=f"Final Report: patient-{patient} has viral bronchitis"),
+            ]
+        return script[min(turn, len(script) - 1)]
+
+
+async def _consultation(app, n):
+    config = {"configurable": {"thread_id": str(uuid4())}, "recursion_limit": 100}
+    inputs = _initial_inputs(f"Hello doctor, I am patient-{n}", None)
+    while True:
+        async for _ in app.astream(inputs, config, stream_mode="values"):
+            pass
+        state = await app.aget_state(config)
+        if not set(state.next) & set(AI_hospital.ASK_NODES):
+            return n, state.values
+        key, tool_message = _inject_user_reply_as_tool_message(state.values, f"patient-{n} is 40")
+        await app.aupdate_state(config, {key: state.values[key] + [tool_message]})
+        inputs = None
+
+
+async def main(args):
+    model = _ScriptedModel(args.latency_ms / 1000)
+    for name in ("gp_llm", "specialist_llm", "pathllm", "radllm"):
+        setattr(AI_hospital, name, model)
+    AI_hospital.llm_scheduler = UNTHROTTLED  # fake model: keep the Groq quota out of the measurement
+    app = AI_hospital.build_graph().compile(interrupt_before=AI_hospital.ASK_NODES, checkpointer=MemorySaver())
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_consultation(app, n) for n in range(args.consultations)))
+    elapsed = time.perf_counter() - start
+
+    wrong_state = [
+        n for n, values in results
+        if MARKER.findall(values.get("patient_info") or "") != [str(n)]
+        or set(MARKER.findall(" ".join(values.get("final_report") or []))) != {str(n)}
+    ]
+    print(f"{args.consultations} concurrent consultations, {model.calls} LLM calls in {elapsed:.2f}s "
+          f"({args.consultations / elapsed:.1f} consultations/s, {model.calls / elapsed:.0f} calls/s)")
+    print(f"prompts mentioning another patient: {len(model.leaks)}")
+    print(f"threads with another patient's patient_info / final_report: {len(wrong_state)}")
+    if model.leaks or wrong_state:
+        print(f"❌ isolation violated, e.g. {(model.leaks or wrong_state)[:3]}")
+        sys.exit(1)
+    print("✅ every consultation only saw its own patient")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultations", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,87 @@
+"""
+Prompt tokens and latency of the RAG synthesis call, raw chunks vs compressed context.
+
+For each query, retrieves the top chunks from `--domain` exactly like
+VectorRAG_Retrival and builds the synthesis prompt three ways: the raw
+`Document` list (old behaviour), merged/stripped passages, and merged passages
+with sentence selection under `--budget` tokens. Token counts are the ~4 chars
+per token estimate; with `--llm` each prompt is also sent to `llm_rag` and the
+provider-reported input tokens and wall latency are shown.
+
+    python -m backend.benchmarks.context_compression --domain Ophthalmologist
+    python -m backend.benchmarks.context_compression --domain Pathology --llm
+
+Run from the repository root so `./backend/vector_stores` resolves.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from backend import AI_hospital
+from Knowledge_notebooks.context_compression import ContextCompressor, estimate_tokens
+
+DEFAULT_QUERIES = [
+    "first-line treatment for allergic conjunctivitis",
+    "differential diagnosis of painless vision loss",
+    "interpretation of raised HbA1c and fasting glucose",
+    "management of acute otitis media in children",
+    "red flags in low back pain",
+]
+
+
+def _prompt(context: str, query: str) -> list:
+    return [
+        SystemMessage(content=f"<context>\n{context}\n</context>\n\nBased ONLY on the documents in the context above, "
+                              f"provide a clear, consolidated answer to the following question.\n\nQuestion: {query}"),
+        HumanMessage(content="Help me with this"),
+    ]
+
+
+async def _run(args):
+    rag = AI_hospital.vector_rag
+    variants = {
+        "raw documents": None,
+        "merged": ContextCompressor(sentence_selection=False),
+        f"merged + sentences ({args.budget})": ContextCompressor(sentence_selection=True, token_budget=args.budget),
+    }
+    rows = {name: {"tokens": [], "provider_tokens": [], "latency": []} for name in variants}
+
+    for query in args.queries or DEFAULT_QUERIES:
+        embedding = (await asyncio.to_thread(rag.embed_documents, [query]))[0]
+        docs = await asyncio.to_thread(rag.search_by_vector, [args.domain], embedding, args.k)
+        if docs is None:
+            raise SystemExit(f"No vector store for {args.domain}")
+        for name, compressor in variants.items():
+            context = str(docs) if compressor is None else compressor.compress(docs, query)
+            messages = _prompt(context, query)
+            rows[name]["tokens"].append(sum(estimate_tokens(m.content) for m in messages))
+            if args.llm:
+                start = time.perf_counter()
+                response = await AI_hospital.llm_rag.ainvoke(messages)
+                rows[name]["latency"].append(time.perf_counter() - start)
+                usage = getattr(response, "usage_metadata", None) or {}
+                rows[name]["provider_tokens"].append(usage.get("input_tokens", 0))
+
+    print(f"{'context':32s} {'est. prompt tokens':>18s} {'provider tokens':>16s} {'latency':>9s}")
+    for name, row in rows.items():
+        provider = f"{statistics.mean(row['provider_tokens']):.0f}" if row["provider_tokens"] else "-"
+        latency = f"{statistics.median(row['latency']):.2f}s" if row["latency"] else "-"
+        print(f"{name:32s} {statistics.mean(row['tokens']):18.0f} {provider:>16s} {latency:>9s}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domain", default="Ophthalmologist")
+    parser.add_argument("--queries", nargs="*")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=400)
+    parser.add_argument("--llm", action="store_true", help="also call llm_rag (uses the Groq quota)")
+    asyncio.run(_run(parser.parse_args()))
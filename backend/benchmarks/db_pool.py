@@ -0,0 +1,147 @@
+"""
+Connection-pool load test: N concurrent consultations writing reports while patients read their history.
+
+Each consultation opens a consultation row, then for `--turns` agent turns
+"thinks" (`--think-ms`, the LLM call) and writes `--findings-per-turn`
+findings, and finishes with a final report. Writes go through
+`report_writer.acreate_consultation` / `awrite_reports`, i.e. the graph's real
+path onto the blocking-I/O threads (BLOCKING_IO_WORKERS). Meanwhile
+`--readers` threads (FastAPI runs sync routes on a 40-thread pool) call the
+/history/consultations handler every `--read-interval-ms`. Every statement is delayed by
+`--latency-ms` to stand in for the network round trip to Postgres.
+
+The same workload runs on two pools:
+
+* defaults: what `create_engine(url)` gave before (pool_size 5, max_overflow 10).
+* configured: DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT_SECONDS from settings.
+
+Peak in-use against capacity, checkout wait (p95, max) and checkout timeouts
+come from the pool metrics served at /graph/db/metrics. The default database
+is a temporary SQLite file; pass `--database-url` to run against Postgres.
+
+    python -m backend.benchmarks.db_pool --consultations 100 --readers 40
+    python -m backend.benchmarks.db_pool --database-url postgresql://user:pw@localhost/bench
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.benchmarks._sqlite import seed_patients, use_current_timestamp  # first: placeholder settings
+from backend import report_writer
+from backend.config import settings
+from backend.database import Base, PoolMetrics, instrumented_pool
+from backend.routers import history
+
+
+def _engine(url, metrics, pool_size, max_overflow, timeout, latency):
+    connect_args = {"check_same_thread": False, "timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(url, poolclass=instrumented_pool(metrics), pool_size=pool_size,
+                           max_overflow=max_overflow, pool_timeout=timeout, pool_pre_ping=True,
+                           connect_args=connect_args)
+    if url.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _wal(dbapi_conn, _):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _round_trip(*args):
+        time.sleep(latency)
+    return engine
+
+
+async def _consultation(patient_id, args, rng):
+    consultation_id = await report_writer.acreate_consultation(patient_id)
+    for turn in range(args.turns):
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+        findings = [(f"Finding {turn}.{i}: within normal limits", False) for i in range(args.findings_per_turn)]
+        await report_writer.awrite_reports(patient_id, consultation_id, findings)
+    await report_writer.awrite_reports(patient_id, consultation_id, [("Final Report: Diagnosis: viral illness", True)])
+
+
+def _reader(Session, patient_ids, stop, errors, seed, interval):
+    rng = random.Random(seed)
+    while not stop.wait(rng.uniform(0.5, 1.5) * interval):
+        db = Session()
+        try:
+            history.get_consultation_history(db=db, current_user=SimpleNamespace(patient_id=rng.choice(patient_ids)))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+
+async def _run(name, url, pool_size, max_overflow, args, patient_ids):
+    metrics = PoolMetrics(window=1_000_000)
+    engine = _engine(url, metrics, pool_size, max_overflow, args.pool_timeout, args.latency_ms / 1000)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    report_writer.SessionLocal = Session
+
+    stop, reader_errors = threading.Event(), []
+    readers = ThreadPoolExecutor(max_workers=max(args.readers, 1))
+    for i in range(args.readers):
+        readers.submit(_reader, Session, patient_ids, stop, reader_errors, i, args.read_interval_ms / 1000)
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_consultation(pid, args, rng) for pid in patient_ids[:args.consultations]),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    readers.shutdown(wait=True)
+
+    failed = sum(isinstance(r, Exception) for r in results)
+    stats = metrics.stats()
+    print(f"{name:10s} {pool_size:>4d}+{max_overflow:<4d} {stats['peak_checked_out']:>8d} {stats['checkouts']:>9d} "
+          f"{stats['wait_ms_p95']:>9.1f} {stats['wait_ms_max']:>9.1f} {stats['timeouts']:>8d} "
+          f"{failed:>6d} {len(reader_errors):>7d} {elapsed:>7.2f}s")
+    engine.dispose()
+
+
+async def main(args):
+    tmp = None
+    url = args.database_url
+    if url is None:
+        tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmp.name, 'db_pool.sqlite')}"
+    if url.startswith("sqlite"):
+        use_current_timestamp()
+
+    setup = create_engine(url)
+    Base.metadata.create_all(setup)
+    patient_ids = seed_patients(setup, args.consultations)
+    setup.dispose()
+
+    print(f"{args.consultations} concurrent consultations ({args.turns} turns, {args.findings_per_turn} findings/turn), "
+          f"{args.readers} history readers, {settings.blocking_io_workers} blocking-I/O threads, "
+          f"{args.latency_ms:.0f} ms/statement, pool timeout {args.pool_timeout:.0f}s")
+    print(f"{'pool':10s} {'size':>9s} {'peak use':>8s} {'checkouts':>9s} {'p95 wait':>9s} {'max wait':>9s} "
+          f"{'timeouts':>8s} {'failed':>6s} {'read err':>7s} {'wall':>8s}")
+    await _run("defaults", url, 5, 10, args, patient_ids)
+    await _run("configured", url, settings.db_pool_size, settings.db_max_overflow, args, patient_ids)
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultations", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--findings-per-turn", type=int, default=2)
+    parser.add_argument("--think-ms", type=float, default=200.0)
+    parser.add_argument("--readers", type=int, default=40)
+    parser.add_argument("--read-interval-ms", type=float, default=50.0)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--pool-timeout", type=float, default=settings.db_pool_timeout_seconds)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None)
+    asyncio.run(main(parser.parse_args()))
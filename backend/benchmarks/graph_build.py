@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: graph construction / compile time and per-step overhead.
+
+Builds and compiles the consultation graph `--reps` times, then drives `--steps`
+GP turns (GP -> GP_AskUser interrupt) with a zero-latency fake model, so what is
+left is pure LangGraph + node overhead.
+
+    python -m backend.benchmarks.graph_build --reps 20 --steps 200
+
+Compare against an older checkout by running the same command there.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from uuid import uuid4
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+_import_start = time.perf_counter()
+from backend import AI_hospital
+from backend.llm_scheduler import LLMScheduler
+_import_seconds = time.perf_counter() - _import_start
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend.api import _initial_inputs, _make_config
+
+UNTHROTTLED = LLMScheduler(requests_per_minute=1e9, tokens_per_minute=1e12)
+
+
+class _InstantGP:
+    async def ainvoke(self, messages, *args, **kwargs):
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "ask_user", "args": {"question": "What brings you in today?"}, "id": str(uuid4())}],
+        )
+
+
+def _time_compile(reps: int) -> list:
+    timings = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        graph = AI_hospital.build_graph()
+        graph.compile(interrupt_before=AI_hospital.ASK_NODES, checkpointer=MemorySaver())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def _time_steps(steps: int) -> list:
+    AI_hospital.gp_llm = _InstantGP()
+    AI_hospital.llm_scheduler = UNTHROTTLED  # fake models: keep the Groq quota out of the measurement
+    timings = []
+    for i in range(steps):
+        config = _make_config(str(uuid4()))
+        start = time.perf_counter()
+        async for _ in AI_hospital.myapp.astream(_initial_inputs("Hello doctor", i + 1), config, stream_mode="values"):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _ms(values: list) -> str:
+    return f"mean={statistics.mean(values) * 1000:.2f}ms median={statistics.median(values) * 1000:.2f}ms"
+
+
+def main(reps: int, steps: int):
+    graph = AI_hospital.myapp.get_graph()
+    print(f"module import (incl. RAG init): {_import_seconds:.2f}s")
+    print(f"nodes={len(graph.nodes)} bound_llms={len(AI_hospital._bound_llms)} tool_nodes={len(AI_hospital._tool_nodes)}")
+    print(f"build+compile x{reps}: {_ms(_time_compile(reps))}")
+    print(f"GP step x{steps}:      {_ms(asyncio.run(_time_steps(steps)))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reps", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+    main(args.reps, args.steps)
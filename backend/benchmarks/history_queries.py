@@ -0,0 +1,170 @@
+"""
+Query plans and latencies of the four /history endpoints, before and after the 0001_history_indexes migration.
+
+Seeds `--patients` patients with `--consultations` consultations each. Every
+consultation has `--orders` lab orders, each with a result, and a medical
+report on all but the newest (still active) one. The defaults come to about
+six million rows. The benchmark then drops the history indexes and, for each
+endpoint:
+
+* captures the SQL the handler in routers/history.py sends (engine event),
+* prints its plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN ANALYZE on Postgres),
+* times the handler for `--samples` random patients (p50 / p95).
+
+Then it runs `migrations.run_migrations` (reporting how long the index build
+took) and repeats. The default database is a temporary SQLite file; pass
+`--database-url` to use an empty Postgres database.
+
+    python -m backend.benchmarks.history_queries
+    python -m backend.benchmarks.history_queries --patients 2000 --samples 50
+    python -m backend.benchmarks.history_queries --database-url postgresql://user:pw@localhost/bench
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.benchmarks._sqlite import seed_patients, use_current_timestamp  # first: placeholder settings
+from backend import migrations, models
+from backend.database import Base
+from backend.routers import history
+
+ENDPOINTS = [
+    ("/history/consultations", history.get_consultation_history),
+    ("/history/lab-results", history.get_lab_results_history),
+    ("/history/complete", history.get_complete_history),
+    ("/history/summary", history.get_history_summary),
+]
+_BATCH = 50_000
+
+
+def _insert(conn, table, rows):
+    for i in range(0, len(rows), _BATCH):
+        conn.execute(table.insert(), rows[i:i + _BATCH])
+
+
+def _seed(engine, args):
+    rng = random.Random(args.seed)
+    epoch = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    patient_ids = seed_patients(engine, args.patients)
+    consultation_id = order_id = 0
+    for first in range(0, args.patients, 10_000):  # seed in slices to bound memory
+        consultations, orders, results, reports = [], [], [], []
+        for patient_id in patient_ids[first:first + 10_000]:
+            for n in range(args.consultations):
+                consultation_id += 1
+                newest = n == args.consultations - 1
+                consultations.append({
+                    "consultation_id": consultation_id, "patient_id": patient_id,
+                    "status": "Active" if newest else rng.choice(("Completed", "Completed", "Abandoned")),
+                    "started_at": epoch + timedelta(minutes=rng.randrange(1_000_000)),
+                })
+                for _ in range(args.orders):
+                    order_id += 1
+                    orders.append({"order_id": order_id, "consultation_id": consultation_id,
+                                   "test_name": "Helper Finding", "status": "Completed"})
+                    results.append({"order_id": order_id, "findings": "Within normal limits."})
+                if not newest:
+                    reports.append({"consultation_id": consultation_id, "diagnosis": "Viral illness",
+                                    "treatment": "See details"})
+        with engine.begin() as conn:
+            _insert(conn, models.Consultation.__table__, consultations)
+            _insert(conn, models.LabOrder.__table__, orders)
+            _insert(conn, models.LabResult.__table__, results)
+            _insert(conn, models.MedicalReport.__table__, reports)
+    return args.patients + consultation_id + 2 * order_id + (consultation_id - args.patients)
+
+
+class _Capture:
+    def __init__(self, engine):
+        self.statement = None
+        event.listen(engine, "before_cursor_execute", self._hit)
+
+    def _hit(self, conn, cursor, statement, parameters, context, executemany):
+        self.statement = (statement, parameters)
+
+
+def _plan(engine, statement, parameters):
+    explain = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN (ANALYZE, BUFFERS) "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(explain + statement, parameters).fetchall()
+    if engine.dialect.name == "sqlite":
+        return [f"{'  ' * (row[1] > 0)}{row[-1]}" for row in rows]
+    return [row[0] for row in rows]
+
+
+def _measure(engine, Session, capture, args, label):
+    rng = random.Random(args.seed + 1)
+    patients = [rng.randint(1, args.patients) for _ in range(args.samples)]
+    print(f"\n=== {label} ===")
+    for path, handler in ENDPOINTS:
+        user = SimpleNamespace(patient_id=patients[0], name="Bench", email="bench@example.org")
+        with Session() as db:
+            handler(db=db, current_user=user)
+        statement, parameters = capture.statement
+        latencies = []
+        for patient_id in patients:
+            user.patient_id = patient_id
+            with Session() as db:
+                start = time.perf_counter()
+                handler(db=db, current_user=user)
+                latencies.append(1000 * (time.perf_counter() - start))
+        latencies.sort()
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"\n{path}: p50 {statistics.median(latencies):8.2f} ms  p95 {p95:8.2f} ms")
+        for line in _plan(engine, statement, parameters):
+            print(f"    {line}")
+
+
+def main(args):
+    tmp = None
+    url = args.database_url
+    if url is None:
+        tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmp.name, 'history.sqlite')}"
+    if url.startswith("sqlite"):
+        use_current_timestamp()
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:  # measure the unindexed schema an existing deployment has
+        for index in migrations.HISTORY_INDEXES:
+            index.drop(conn, checkfirst=True)
+        migrations.schema_migrations.drop(conn, checkfirst=True)
+
+    start = time.perf_counter()
+    rows = _seed(engine, args)
+    print(f"Seeded {rows:,} rows ({args.patients:,} patients x {args.consultations} consultations, "
+          f"{args.orders} lab orders each) in {time.perf_counter() - start:.1f}s")
+
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    capture = _Capture(engine)
+    _measure(engine, Session, capture, args, "without history indexes")
+
+    start = time.perf_counter()
+    applied = migrations.run_migrations(engine)
+    print(f"\nMigrations {applied} took {time.perf_counter() - start:.1f}s")
+    _measure(engine, Session, capture, args, "with 0001_history_indexes")
+
+    engine.dispose()
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--consultations", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=2)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,64 @@
+"""
+Prompt size over a long consultation: whole channel vs HistoryManager window.
+
+A synthetic specialist channel grows by one turn per call. Each turn is an
+ask_user question and the patient's answer, and every `--rag-every` turns a
+VectorRAG_Retrival call with a long tool result. Before each call the benchmark
+measures the estimated prompt tokens for the full channel (what agents used to
+send) and for the windowed one (summary + recent tail, extractive summarizer so
+no model is needed). It also checks that no window starts with an orphaned
+ToolMessage.
+
+    python -m backend.benchmarks.history_window --turns 60
+"""
+
+import argparse
+import asyncio
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from backend.history import HistoryManager
+from backend.llm_scheduler import estimate_tokens
+
+
+def _turn(n, rag_every):
+    call_id = str(uuid4())
+    if rag_every and n % rag_every == rag_every - 1:
+        call = {"name": "VectorRAG_Retrival", "args": {"query": f"differential for finding {n}", "agent": "Internal Medicine"}, "id": call_id}
+        result = " ".join(f"Guideline sentence {i} about finding {n}." for i in range(60))
+        return [AIMessage(content="", tool_calls=[call]), ToolMessage(content=result, name="VectorRAG_Retrival", tool_call_id=call_id)]
+    call = {"name": "ask_user", "args": {"question": f"Question {n}: how long have you had symptom {n}?"}, "id": call_id}
+    answer = f"Answer {n}: about {n % 7 + 1} days, it gets worse in the evening and after meals."
+    return [AIMessage(content="", tool_calls=[call]), ToolMessage(content=answer, name="ask_user", tool_call_id=call_id)]
+
+
+async def main(args):
+    manager = HistoryManager({"specialist_messages": args.budget}, keep_turns=args.keep_turns,
+                             summary_tokens=args.summary_tokens)
+    state = {"specialist_messages": [HumanMessage(content="I have had chest discomfort and fatigue for a month")], "history": {}}
+    full_total = windowed_total = orphans = 0
+    print(f"{'turn':>5s} {'full prompt':>12s} {'windowed':>9s}")
+    for n in range(args.turns):
+        window, update = await manager.window(state, "specialist_messages")
+        state.update(update)
+        full, sent = estimate_tokens(state["specialist_messages"]), estimate_tokens(window)
+        full_total += full
+        windowed_total += sent
+        first = next((m for m in window if m.type != "system"), None)
+        orphans += isinstance(first, ToolMessage)
+        if n % max(args.turns // 10, 1) == 0 or n == args.turns - 1:
+            print(f"{n:5d} {full:12d} {sent:9d}")
+        state["specialist_messages"] = state["specialist_messages"] + _turn(n, args.rag_every)
+    print(f"total prompt tokens: full {full_total}, windowed {windowed_total} "
+          f"({windowed_total / full_total:.0%}); folds {manager.folds}; orphaned tool results {orphans}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--budget", type=int, default=4000)
+    parser.add_argument("--keep-turns", type=int, default=6)
+    parser.add_argument("--summary-tokens", type=int, default=400)
+    parser.add_argument("--rag-every", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Burst behaviour against a rate-limited provider: direct calls vs LLMScheduler.
+
+A fake provider accepts `--rpm` requests per rolling minute and answers 429
+beyond that, with a `--latency` second call time. `--interactive`
+interactive turns and `--background` RAG syntheses are fired at once. In
+`direct` mode each caller does what the old nodes did: call the provider and
+retry after a fixed delay on 429. In `scheduled` mode every call goes through
+LLMScheduler. The benchmark reports provider 429s and per-priority latency.
+Time is scaled down by `--speedup` so a "minute" passes in a few seconds.
+
+    python -m backend.benchmarks.llm_scheduler --interactive 30 --background 30 --rpm 30
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import deque
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.llm_scheduler import LLMScheduler, Priority
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class _FakeProvider:
+    def __init__(self, rpm: int, window: float, latency: float):
+        self.rpm = rpm
+        self.window = window
+        self.latency = latency
+        self.accepted = deque()
+        self.rejected = 0
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        now = time.monotonic()
+        while self.accepted and now - self.accepted[0] > self.window:
+            self.accepted.popleft()
+        if len(self.accepted) >= self.rpm:
+            self.rejected += 1
+            raise RateLimitError("rate limit exceeded")
+        self.accepted.append(now)
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 300, "output_tokens": 100, "total_tokens": 400})
+
+
+async def _direct(provider, messages, retry_delay):
+    while True:
+        try:
+            return await provider.ainvoke(messages)
+        except RateLimitError:
+            await asyncio.sleep(retry_delay)
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+def _summary(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(0.95 * (len(samples) - 1))]
+    print(f"  {label:12s} p50 {statistics.median(samples):6.2f}s   p95 {p95:6.2f}s   max {samples[-1]:6.2f}s")
+
+
+async def main(args):
+    window = 60.0 / args.speedup
+    messages = [HumanMessage(content="x" * 1200)]
+    for mode in ("direct", "scheduled"):
+        provider = _FakeProvider(args.rpm, window, args.latency)
+        scheduler = LLMScheduler(
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_output_tokens=100,
+            max_attempts=50,
+            retry_max_wait=window / 4,
+            period=window,
+        )
+
+        def call(priority):
+            if mode == "direct":
+                return _direct(provider, messages, window / 10)
+            return scheduler.ainvoke(provider, messages, priority)
+
+        jobs = [(Priority.INTERACTIVE, call(Priority.INTERACTIVE)) for _ in range(args.interactive)]
+        jobs += [(Priority.BACKGROUND, call(Priority.BACKGROUND)) for _ in range(args.background)]
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(_timed(coro) for _, coro in jobs))
+        print(f"{mode}: {len(jobs)} calls in {time.perf_counter() - start:.2f}s, provider 429s: {provider.rejected}")
+        for priority in Priority:
+            _summary(priority.name.lower(), [t for (p, _), t in zip(jobs, latencies) if p == priority])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactive", type=int, default=30)
+    parser.add_argument("--background", type=int, default=30)
+    parser.add_argument("--rpm", type=int, default=30)
+    parser.add_argument("--tpm", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--speedup", type=float, default=30.0, help="a provider minute lasts 60/speedup seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+"""
+Prompt-prefix caching: the old prompt layout vs a static prefix followed by a per-turn context message.
+
+`--consultations` specialist consultations (different patients, same
+specialist) are replayed turn by turn. The patient data arrives
+before the first turn, a Pathologist answer lands in the QnA halfway through,
+add_report entries accumulate and every fifth turn adds a VectorRAG result. Each turn's prompt is built two ways:
+
+* legacy: one system message with the patient data, QnA and report *ahead of*
+  the static instructions (how the specialist prompt used to be formatted);
+* prefixed: `SPECIALIST_PREFIXES[node]` (built once at import), then the
+  `SPECIALIST_CONTEXT` message, then the channel.
+
+Offline (default), prompts go to a fake provider with an exact-prefix cache:
+128-token blocks, 1024-token minimum, like OpenAI-compatible APIs. Its latency
+is `--base-ms` plus `--uncached-us` per uncached prompt token. With `--live`,
+both layouts are sent to the configured specialist pool, and the provider's
+`cache_read` is reported where it reports one. Groq only caches some models.
+
+    python -m backend.benchmarks.prompt_prefix --turns 20 --consultations 4
+    python -m backend.benchmarks.prompt_prefix --turns 8 --consultations 2 --live
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from uuid import uuid4
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from backend import AI_hospital
+from backend.llm_scheduler import LLMScheduler, estimate_tokens
+
+BLOCK, MINIMUM = 128, 1024
+
+
+class _PrefixCachingProvider:
+    """Caches every prompt it has seen by 128-token block; a prompt reads the longest cached exact prefix."""
+
+    def __init__(self, base_ms, uncached_us):
+        self.base_ms = base_ms
+        self.uncached_us = uncached_us
+        self.blocks = set()
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        text = "\x00".join(f"{m.type}:{m.content}" for m in messages)
+        tokens = len(text) // 4
+        cached = 0
+        if tokens >= MINIMUM:
+            for end in range(BLOCK, tokens + 1, BLOCK):
+                if text[:4 * end] not in self.blocks:
+                    break
+                cached = end
+            self.blocks.update(text[:4 * end] for end in range(BLOCK, tokens + 1, BLOCK))
+        await asyncio.sleep((self.base_ms + self.uncached_us * (tokens - cached) / 1000) / 1000)
+        return AIMessage(content="ok", usage_metadata={
+            "input_tokens": tokens, "output_tokens": 1, "total_tokens": tokens + 1,
+            "input_token_details": {"cache_read": cached},
+        })
+
+
+def _consultation(turns, patient):
+    """(spec, patient_info, patho_QnA, current_report, channel) before each turn."""
+    spec = AI_hospital.SPECIALISTS[0]
+    patient_info = f"Patient {patient}: age {40 + 3 * patient}, chest tightness on exertion for {patient + 2} weeks, smoker."
+    channel = [HumanMessage(content="I have been getting chest tightness when I climb stairs")]
+    qna, report = [], []
+    for n in range(turns):
+        yield spec, patient_info, list(qna), list(report), list(channel)
+        call_id = str(uuid4())
+        if n % 5 == 1:
+            guideline = " ".join(f"Guideline sentence {i} on stable angina work-up." for i in range(50))
+            channel += [AIMessage(content="", tool_calls=[{"name": "VectorRAG_Retrival", "args": {"query": "stable angina", "agent": spec.rag_domain}, "id": call_id}]),
+                        ToolMessage(content=guideline, name="VectorRAG_Retrival", tool_call_id=call_id)]
+            continue
+        channel += [AIMessage(content="", tool_calls=[{"name": "ask_user", "args": {"question": f"Question {n}?"}, "id": call_id}]),
+                    ToolMessage(content=f"Answer {n}: it lasts a few minutes and eases with rest.", name="ask_user", tool_call_id=call_id)]
+        if n == turns // 2:
+            qna += ["Pathologist Answer report to specialist:", "Troponin negative, LDL 4.9 mmol/L, HbA1c 6.1%"]
+        if n % 4 == 3:
+            report.append(f"Finding {n}: exertional chest pain, stable pattern")
+
+
+def _prompt(layout, spec, patient_info, qna, report, channel):
+    context = AI_hospital._context(
+        AI_hospital.SPECIALIST_CONTEXT, patient_info=patient_info,
+        radio_qna=AI_hospital._recent_or_none([]), patho_qna=AI_hospital._recent_or_none(qna),
+        current_report=AI_hospital._recent_or_none(report),
+    )
+    prefix = AI_hospital.SPECIALIST_PREFIXES[spec.node]
+    if layout == "legacy":
+        return [SystemMessage(content=f"{context.content}\n\n{prefix.content}")] + channel
+    return [prefix, context] + channel
+
+
+async def main(args):
+    if args.live:
+        provider, scheduler = AI_hospital.llm, AI_hospital.llm_scheduler
+    else:
+        scheduler = LLMScheduler(requests_per_minute=1e9, tokens_per_minute=1e12)
+    print(f"{'layout':10s} {'prompt tokens':>13s} {'cache read':>10s} {'hit rate':>8s} {'mean latency':>12s}")
+    for layout in ("legacy", "prefixed"):
+        if not args.live:
+            provider = _PrefixCachingProvider(args.base_ms, args.uncached_us)
+        scheduler.prompt_cache.clear()
+        build = latency = 0.0
+        prompt_tokens = 0
+        turns = [turn for patient in range(args.consultations) for turn in _consultation(args.turns, patient)]
+        for turn in turns:
+            start = time.perf_counter()
+            messages = _prompt(layout, *turn)
+            build += time.perf_counter() - start
+            prompt_tokens += estimate_tokens(messages)
+            start = time.perf_counter()
+            await scheduler.ainvoke(provider, messages)
+            latency += time.perf_counter() - start
+        counts = next(iter(scheduler.cache_stats().values()), {})
+        hit_rate = counts.get("hit_rate")
+        print(f"{layout:10s} {prompt_tokens:13d} {counts.get('cache_read_tokens', 0):10d} "
+              f"{'n/a' if hit_rate is None else f'{hit_rate:.0%}':>8s} {1000 * latency / len(turns):10.0f}ms"
+              f"   (prompt build {1e6 * build / len(turns):.0f}us/turn)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--consultations", type=int, default=4, help="patients seeing the same specialist, one after another")
+    parser.add_argument("--base-ms", type=float, default=150.0, help="fake provider: fixed latency per call")
+    parser.add_argument("--uncached-us", type=float, default=200.0, help="fake provider: microseconds per uncached prompt token")
+    parser.add_argument("--live", action="store_true", help="call the configured specialist pool instead of the fake provider")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Offline check of ProviderPool routing: stub backends with different latency and 429 rates.
+
+Each scenario sends `--calls` concurrent-ish calls (`--concurrency` at a time)
+to a pool of StubChatModel backends. It reports how the calls were split
+across backends, failovers, errors that reached the caller, and latency.
+Nothing leaves the machine.
+
+    python -m backend.benchmarks.provider_failover --calls 300
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from backend.llm_providers import Backend, ProviderPool, StubChatModel
+
+SCENARIOS = {
+    # name: [(backend name, latency ms, 429 rate), ...] in preference order
+    "slow primary": [("primary", 400, 0.0), ("secondary", 80, 0.0)],
+    "flaky primary": [("primary", 80, 0.3), ("secondary", 120, 0.0)],
+    "primary down": [("primary", 80, 1.0), ("secondary", 120, 0.0)],
+    "single flaky": [("only", 80, 0.3)],
+}
+
+
+async def _scenario(name, spec, args):
+    backends = [
+        Backend(label, StubChatModel(model=label, latency_ms=latency, error_rate=errors, seed=i))
+        for i, (label, latency, errors) in enumerate(spec)
+    ]
+    pool = ProviderPool(name, backends, timeout=args.timeout, cooldown=args.cooldown).bind_tools([])
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def one(n):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await pool.ainvoke([HumanMessage(content=f"call {n}")])
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one(n) for n in range(args.calls)))
+    split = ", ".join(f"{b.name} {b.calls - b.failures}" for b in backends)
+    p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))] if latencies else float("nan")
+    median = statistics.median(latencies) if latencies else float("nan")
+    print(f"{name:14s} served: {split:28s} failovers {pool.counters['failovers']:4d}  "
+          f"errors {errors:4d}  p50 {median * 1000:6.0f}ms  p95 {p95 * 1000:6.0f}ms")
+
+
+async def main(args):
+    for name, spec in SCENARIOS.items():
+        await _scenario(name, spec, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--cooldown", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+Query-embedding latency under concurrent load: per-request calls vs QueryEmbedder.
+
+Fires `--requests` embeddings from `--concurrency` concurrent "consultations"
+(a `--repeat` fraction of them re-ask an earlier question) and reports p50/p99.
+By default the model is a CPU-bound fake whose cost is `--call-ms` per forward
+pass plus `--text-ms` per text, which is how a batch of bge-large behaves on CPU;
+pass `--real` to use the configured HuggingFace model instead.
+
+    python -m backend.benchmarks.rag_latency --requests 400 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Knowledge_notebooks.query_embedder import QueryEmbedder
+from backend.blocking_io import run_blocking
+
+
+class _FakeModel:
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+
+    def embed_documents(self, texts):
+        busy_until = time.perf_counter() + (self.call_ms + self.text_ms * len(texts)) / 1000
+        while time.perf_counter() < busy_until:
+            pass
+        return [[float(len(t))] * 8 for t in texts]
+
+
+def _queries(n: int, repeat: float) -> list:
+    seen = []
+    for i in range(n):
+        if seen and random.random() < repeat:
+            seen.append(random.choice(seen))
+        else:
+            seen.append(f"first-line treatment for condition {i}")
+    return seen
+
+
+async def _drive(embed, queries: list, concurrency: int) -> list:
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(q):
+        async with sem:
+            start = time.perf_counter()
+            await embed(q)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(q) for q in queries))
+    return latencies
+
+
+def _report(label: str, latencies: list, wall: float):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:9s} p50={statistics.median(ordered) * 1000:7.2f}ms p99={p99 * 1000:7.2f}ms wall={wall:.2f}s")
+
+
+async def main(args):
+    if args.real:
+        from Knowledge_notebooks.initialize_rag import VectorRAG
+        embed_documents = VectorRAG().embed_documents
+    else:
+        embed_documents = _FakeModel(args.call_ms, args.text_ms).embed_documents
+    queries = _queries(args.requests, args.repeat)
+
+    async def unbatched(q):
+        return (await run_blocking(embed_documents, [q]))[0]
+
+    embedder = QueryEmbedder(embed_documents, run_blocking, wait_ms=args.wait_ms, max_batch=args.max_batch)
+    for label, embed in (("per-call", unbatched), ("embedder", embedder.embed)):
+        start = time.perf_counter()
+        latencies = await _drive(embed, queries, args.concurrency)
+        _report(label, latencies, time.perf_counter() - start)
+    print(f"embedder stats: {embedder.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeat", type=float, default=0.3)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--call-ms", type=float, default=40.0)
+    parser.add_argument("--text-ms", type=float, default=4.0)
+    parser.add_argument("--real", action="store_true")
+    main_args = parser.parse_args()
+    asyncio.run(main(main_args))
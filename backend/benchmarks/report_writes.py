@@ -0,0 +1,131 @@
+"""
+Database round trips per consultation for the add_report / Patient_data_report writes.
+
+Each consultation triages (one consultation row), files `--findings` helper
+findings, `--per-turn` per agent turn, and closes with a final report.
+Three strategies run it:
+
+* legacy: the old write path (copied here). A session per call, the active
+  consultation re-queried each time, and a finding committed twice (order, then result).
+* writer: report_writer with the consultation id cached in state. One
+  transaction per add_report, order and result in one flush.
+* buffered: report_writer with REPORT_BUFFERING. One transaction per agent turn.
+
+Round trips = SQL statements + BEGINs + COMMITs, counted with engine events.
+The default database is in-memory SQLite. Pass `--database-url` to measure a
+real Postgres; the tables are created there.
+
+    python -m backend.benchmarks.report_writes --consultations 50 --findings 6
+    python -m backend.benchmarks.report_writes --database-url postgresql://user:pw@localhost/bench
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.benchmarks._sqlite import seed_patients, use_current_timestamp  # first: placeholder settings
+from backend import models, report_writer
+from backend.database import Base
+
+
+class _RoundTrips:
+    def __init__(self, engine):
+        self.count = 0
+        for name in ("before_cursor_execute", "begin", "commit"):
+            event.listen(engine, name, self._hit)
+
+    def _hit(self, *args, **kwargs):
+        self.count += 1
+
+
+# ---- legacy write path (copied from the AI_hospital.py helpers this replaced) ----
+
+def _legacy_create(Session, patient_id):
+    with Session() as db:
+        existing = db.query(models.Consultation).filter(
+            models.Consultation.patient_id == patient_id, models.Consultation.status == "Active").first()
+        if existing:
+            existing.status = "Abandoned"
+            db.commit()
+        new_consult = models.Consultation(patient_id=patient_id, status="Active")
+        db.add(new_consult)
+        db.commit()
+        db.refresh(new_consult)
+        return new_consult.consultation_id
+
+
+def _legacy_write(Session, patient_id, report, is_final):
+    with Session() as db:
+        consult = db.query(models.Consultation).filter(
+            models.Consultation.patient_id == patient_id, models.Consultation.status == 'Active'
+        ).order_by(models.Consultation.consultation_id.desc()).first()
+        if not consult:
+            return
+        if is_final:
+            db.add(models.MedicalReport(consultation_id=consult.consultation_id, diagnosis=report, treatment="See details"))
+            consult.status = "Completed"
+            db.commit()
+        else:
+            new_order = models.LabOrder(consultation_id=consult.consultation_id, test_name="Helper Finding", status="Completed")
+            db.add(new_order)
+            db.commit()
+            db.add(models.LabResult(order_id=new_order.order_id, findings=report))
+            db.commit()
+
+
+def _turns(findings, per_turn):
+    reports = [(f"Finding {i}: within normal limits", False) for i in range(findings)]
+    turns = [reports[i:i + per_turn] for i in range(0, findings, per_turn)]
+    return turns + [[("Final Report: Diagnosis: viral illness", True)]]
+
+
+def _run(strategy, Session, patient_ids, args):
+    for patient_id in patient_ids:
+        if strategy == "legacy":
+            _legacy_create(Session, patient_id)
+            for turn in _turns(args.findings, args.per_turn):
+                for report, is_final in turn:
+                    _legacy_write(Session, patient_id, report, is_final)
+            continue
+        consultation_id = report_writer.create_consultation(patient_id)
+        for turn in _turns(args.findings, args.per_turn):
+            if strategy == "buffered":
+                report_writer.write_reports(patient_id, consultation_id, turn)
+            else:
+                for report in turn:
+                    report_writer.write_reports(patient_id, consultation_id, [report])
+
+
+def main(args):
+    if args.database_url.startswith("sqlite"):
+        engine = create_engine(args.database_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        use_current_timestamp()
+    else:
+        engine = create_engine(args.database_url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    report_writer.SessionLocal = Session
+    patient_ids = seed_patients(engine, args.consultations)
+
+    counter = _RoundTrips(engine)
+    print(f"{args.consultations} consultations, {args.findings} findings each ({args.per_turn} per turn) + final report")
+    print(f"{'strategy':10s} {'round trips / consultation':>27s} {'ms / consultation':>18s}")
+    for strategy in ("legacy", "writer", "buffered"):
+        before = counter.count
+        start = time.perf_counter()
+        _run(strategy, Session, patient_ids, args)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy:10s} {(counter.count - before) / args.consultations:27.1f} "
+              f"{1000 * elapsed / args.consultations:18.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultations", type=int, default=50)
+    parser.add_argument("--findings", type=int, default=6)
+    parser.add_argument("--per-turn", type=int, default=2)
+    parser.add_argument("--database-url", default="sqlite://")
+    main(parser.parse_args())
@@ -0,0 +1,271 @@
+"""
+Replay scripted consultations and count LLM calls: legacy substring routing vs structured routing.
+
+Each scenario is a script of what every agent "says" (ask the patient, record
+triage, refer, consult a helper, add a report, final report, or idle chatter)
+and what the patient answers. The same script is replayed twice:
+
+* legacy: a faithful copy of the old routers. They scan the last message for
+  `"ent"`, `"internal"`, `"pathologist"`, ... That includes the patient's answer
+  injected on resume, and referrals and helper requests are plain text.
+* structured: the real graph from `build_graph()` with scripted fake models.
+  Referrals and helper requests are refer_to_specialist / consult_helper tool
+  calls, and the loop guard is active.
+
+An agent the script never expected to reach (a misroute) asks one question and
+writes a report, as a real specialist would. An agent that is called again
+after its script has run out repeats its last answer, as a model given the same
+context does. The GP repeating a referral the router did not recognise is the
+"loop back to GP" case. Both runs stop at `--max-calls`.
+
+    python -m backend.benchmarks.routing_replay
+"""
+
+import argparse
+import asyncio
+import os
+from uuid import uuid4
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend import AI_hospital
+from backend.llm_scheduler import LLMScheduler
+from backend.api import _initial_inputs, _inject_user_reply_as_tool_message
+
+UNTHROTTLED = LLMScheduler(requests_per_minute=1e9, tokens_per_minute=1e12)
+
+
+def ask(q): return ("ask", q)
+def record(data): return ("record", data)
+def refer(name, phrasing): return ("refer", name, phrasing)
+def consult(helper, q): return ("consult", helper, q)
+def report(text): return ("report", text)
+def final(text): return ("final", f"Final Report: {text}")
+def helper_final(lab, text): return ("final", f"This is the final report to specialist from {lab} labs: {text}")
+def chatter(text): return ("chatter", text)
+
+
+SCENARIOS = {
+    "clean referral": {
+        "target": "Pediatrician",
+        "patient": ["My son has a high fever", "He is six", "About four days", "No rash", "CBC: WBC 14k, CRP 40"],
+        "GP": [ask("What brings you in?"), ask("How old is he?"), ask("How long?"),
+               record("6yo boy, fever 4 days"), refer("Pediatrics", "Pediatrics")],
+        "Pediatrician": [ask("Any rash?"), consult("Pathologist", "CBC and CRP please"),
+                         report("Likely bacterial infection"), final("Bacterial infection; antibiotics")],
+        "Pathologist": [ask("Please share the CBC and CRP results"), report("Leukocytosis, raised CRP"),
+                        helper_final("Pathology", "Leukocytosis with raised CRP")],
+    },
+    "'ent' in a reply": {
+        "target": "Dermatologist",
+        "patient": ["An itchy rash that appeared after I went hiking", "I am 34", "Red, raised, ring-shaped"],
+        "GP": [ask("What brings you in?"), ask("How old are you?"), record("34yo, itchy annular rash"),
+               refer("Dermatology", "Dermatology")],
+        "Dermatologist": [ask("Does it look ring-shaped?"), report("Tinea corporis"), final("Tinea corporis; topical antifungal")],
+    },
+    "wordy referral": {
+        "target": "Internal Medicine",
+        "patient": ["Tired all the time and always thirsty", "I am 52", "Yes, type 2 diabetes in my father"],
+        "GP": [ask("What brings you in?"), ask("How old are you?"), record("52yo, fatigue, polydipsia"),
+               refer("Internal Medicine", "Not pediatrics or psychiatry: Internal Medicine should see this adult.")],
+        "Internal Medicine": [ask("Any family history of diabetes?"), report("Suspected type 2 diabetes"),
+                              final("Suspected type 2 diabetes; HbA1c")],
+    },
+    "helper named by patient": {
+        "target": "Orthopedist",
+        "patient": ["My knee hurts when I run", "I am 28", "A radiologist looked at an X-ray last year, it was normal"],
+        "GP": [ask("What brings you in?"), ask("How old are you?"), record("28yo, knee pain on running"),
+               refer("Orthopedics", "Orthopedist")],
+        "Orthopedist": [ask("Any imaging before?"), report("Patellofemoral pain"), final("Patellofemoral pain syndrome; physio")],
+    },
+    "department name": {
+        "target": "Orthopedist",
+        "patient": ["My wrist hurts after a fall", "I am 45", "Swollen, can't bend it"],
+        "GP": [ask("What brings you in?"), ask("How old are you?"), record("45yo, wrist pain after fall"),
+               refer("Orthopedics", "Orthopedics")],
+        "Orthopedist": [ask("Can you bend it?"), report("Suspected scaphoid fracture"), final("Suspected scaphoid fracture; X-ray")],
+    },
+    "chatty GP": {
+        "target": "Psychiatrist",
+        "patient": ["I can't sleep and feel low", "I am 40"],
+        "GP": [ask("What brings you in?"), ask("How old are you?"), record("40yo, low mood, insomnia"),
+               chatter("Thank you, I have what I need."), refer("Psychiatry", "Psychiatry")],
+        "Psychiatrist": [ask("How long have you felt low?"), final("Depressive episode; therapy referral")],
+    },
+    "GP never refers": {
+        "target": None,
+        "patient": ["I feel a bit off"],
+        "GP": [ask("What brings you in?"), chatter("I understand. Let me think about the best option for you.")],
+    },
+}
+
+_DEFAULT_SPECIALIST = [ask("Can you tell me more?"), report("Unclear presentation"), final("Unclear; follow up")]
+_DEFAULT_HELPER = [helper_final("the", "No abnormal findings")]
+
+
+class _Script:
+    def __init__(self, scenario):
+        self.turns = {agent: list(turns) for agent, turns in scenario.items() if isinstance(turns, list) and agent != "patient"}
+        self.patient = list(scenario["patient"])
+        self.calls = 0
+        self.visited = []
+        self.last = {}
+
+    def next_turn(self, agent):
+        self.calls += 1
+        if agent not in self.visited:
+            self.visited.append(agent)
+        default = [chatter("How can I help?")] if agent == "GP" else (
+            list(_DEFAULT_HELPER) if agent in AI_hospital.HELPER_NODES else list(_DEFAULT_SPECIALIST))
+        turns = self.turns.setdefault(agent, default)
+        if turns:
+            self.last[agent] = turns.pop(0)
+        return self.last[agent]
+
+    def reply(self):
+        return self.patient.pop(0) if self.patient else "I don't know."
+
+
+def _tool_message(name, args):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": str(uuid4())}])
+
+
+def _render(turn, structured):
+    kind = turn[0]
+    if kind == "ask":
+        return _tool_message("ask_user", {"question": turn[1]})
+    if kind == "record":
+        return _tool_message("Patient_data_report", {"data": turn[1]})
+    if kind == "report":
+        return _tool_message("add_report", {"report": turn[1]})
+    if kind == "refer":
+        return _tool_message("refer_to_specialist", {"specialist": turn[1]}) if structured else AIMessage(content=turn[2])
+    if kind == "consult":
+        if structured:
+            return _tool_message("consult_helper", {"helper": turn[1], "question": turn[2]})
+        what = "a blood report" if turn[1] == "Pathologist" else "imaging studies"
+        return AIMessage(content=f"I need {what} from {turn[1]}, {turn[2]}")
+    return AIMessage(content=turn[1])
+
+
+# ---- legacy routing (copied from the substring routers this replaced) ----
+
+_LEGACY_GP_KEYWORDS = [
+    ("Pediatrician", ("pediatrics", "pediatrician")), ("Ophthalmologist", ("ophthalmology", "ophthalmologist")),
+    ("Orthopedist", ("orthopedist",)), ("Dermatologist", ("dermatology", "dermatologist")),
+    ("Gynecologist", ("gynecology", "gynecologist")), ("Psychiatrist", ("psychiatry", "psychiatrist")),
+    ("Internal Medicine", ("internal medicine", "internal")), ("ENT", ("ent",)),
+]
+
+
+def _legacy_route(agent, content, stack):
+    content = content.lower()
+    if agent == "GP":
+        for node, keywords in _LEGACY_GP_KEYWORDS:
+            if any(k in content for k in keywords):
+                return node
+        return "GP"
+    if agent in AI_hospital.HELPER_NODES:
+        if "final report" in content and "specialist" in content:
+            return stack.pop() if stack else "Orthopedist"
+        return agent
+    if "pathologist" in content:
+        stack.append(agent)
+        return "Pathologist"
+    if "radiologist" in content:
+        stack.append(agent)
+        return "Radiologist"
+    if "final report:" in content:
+        return "end"
+    return agent
+
+
+def _legacy_run(scenario, max_calls):
+    script, stack, agent = _Script(scenario), [], "GP"
+    while agent != "end" and script.calls < max_calls:
+        message = _render(script.next_turn(agent), structured=False)
+        if message.tool_calls:
+            if message.tool_calls[0]["name"] == "ask_user":
+                # api.py injects the answer as a ToolMessage and the router runs again on *its* text
+                agent = _legacy_route(agent, script.reply(), stack)
+            continue  # *_Tooler -> back to the same agent
+        agent = _legacy_route(agent, message.content, stack)
+    return script, agent == "end"
+
+
+# ---- structured routing: the real graph with scripted models ----
+
+class _ScriptedModel:
+    def __init__(self, script):
+        self.script = script
+        self.titles = {f"High Quality {s.title}.": s.node for s in AI_hospital.SPECIALISTS}
+
+    def _agent(self, system_prompt):
+        if "Medical Router AI" in system_prompt:
+            return "GP"
+        for helper in AI_hospital.HELPER_NODES:
+            if f"High Quality {helper}." in system_prompt:
+                return helper
+        return next(node for title, node in self.titles.items() if title in system_prompt)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        if self.script.calls >= self.script.max_calls:
+            raise _Exhausted()
+        return _render(self.script.next_turn(self._agent(messages[0].content)), structured=True)
+
+
+class _Exhausted(Exception):
+    pass
+
+
+async def _structured_run(scenario, max_calls):
+    script = _Script(scenario)
+    script.max_calls = max_calls
+    model = _ScriptedModel(script)
+    for name in ("gp_llm", "specialist_llm", "pathllm", "radllm"):
+        setattr(AI_hospital, name, model)
+    AI_hospital.llm_scheduler = UNTHROTTLED  # fake models: keep the Groq quota out of the measurement
+    app = AI_hospital.build_graph().compile(interrupt_before=AI_hospital.ASK_NODES, checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": str(uuid4())}, "recursion_limit": 4 * max_calls}
+    inputs = _initial_inputs("Hello doctor", None)
+    try:
+        while True:
+            async for _ in app.astream(inputs, config, stream_mode="values"):
+                pass
+            state = await app.aget_state(config)
+            if not set(state.next) & set(AI_hospital.ASK_NODES):
+                return script, not state.next
+            key, tool_message = _inject_user_reply_as_tool_message(state.values, script.reply())
+            await app.aupdate_state(config, {key: state.values[key] + [tool_message]})
+            inputs = None
+    except _Exhausted:
+        return script, False
+
+
+async def main(args):
+    print(f"{'scenario':26s} {'legacy calls':>12s} {'structured':>10s}   legacy specialists / structured specialists")
+    totals, misrouted = [0, 0], [0, 0]
+    for name, scenario in SCENARIOS.items():
+        legacy, legacy_done = _legacy_run(scenario, args.max_calls)
+        structured, structured_done = await _structured_run(scenario, args.max_calls)
+        for i, script in enumerate((legacy, structured)):
+            totals[i] += script.calls
+            misrouted[i] += any(a not in ("GP", scenario["target"], *AI_hospital.HELPER_NODES) for a in script.visited)
+
+        def seen(script, done):
+            visited = [a for a in script.visited if a != "GP"]
+            return ("" if done else "(limit) ") + (" > ".join(visited) or "-")
+        print(f"{name:26s} {legacy.calls:12d} {structured.calls:10d}   "
+              f"{seen(legacy, legacy_done)} / {seen(structured, structured_done)}  [want {scenario['target'] or '-'}]")
+    print(f"{'total LLM calls':26s} {totals[0]:12d} {totals[1]:10d}")
+    print(f"{'misrouted consultations':26s} {misrouted[0]:12d} {misrouted[1]:10d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-calls", type=int, default=40)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""
+search_internet under load: uncached vs SearchCache, then a replay run with the network switched off.
+
+`--consultations` concurrent consultations each issue `--searches` queries.
+Queries are drawn from a skewed pool of `--distinct` queries: clinicians
+search the same guidelines, often with different spacing and case. A fake
+Tavily answers after `--latency-ms` with a realistically shaped response
+(score, raw_content, images, ...).
+
+* uncached: what search_internet did before: one Tavily call per search, `json.dumps(indent=2)`.
+* cached: SearchCache in "record" mode. It counts upstream calls, cache hits, coalesced
+  in-flight duplicates and tool-message size, and writes the responses to a temp directory.
+* replay: the same workload from the recorded directory, with a fetch that fails if called.
+
+    python -m backend.benchmarks.search_cache --consultations 50 --searches 4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+
+from backend.search_cache import SearchCache
+
+
+class _FakeTavily:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def __call__(self, query):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {
+            "query": query, "follow_up_questions": None, "answer": None, "images": [],
+            "response_time": 1.02, "request_id": "0" * 32,
+            "results": [{
+                "url": f"https://example.org/{abs(hash(query)) % 1000}/{i}",
+                "title": f"{query.title()} - clinical overview {i}",
+                "content": f"{query} overview. " + "Evidence summary sentence.  " * 40,
+                "score": 0.9 - i / 10, "raw_content": None,
+            } for i in range(5)],
+        }
+
+
+def _offline(query):
+    raise RuntimeError("replay mode must not reach the network")
+
+
+def _workload(args):
+    rng = random.Random(args.seed)
+    pool = [f"first line treatment for condition {i}" for i in range(args.distinct)]
+    weights = [1 / (i + 1) for i in range(args.distinct)]
+    searches = []
+    for _ in range(args.consultations):
+        queries = rng.choices(pool, weights, k=args.searches)
+        searches.append([q.upper() if rng.random() < 0.2 else q.replace(" ", "  ") if rng.random() < 0.2 else q
+                         for q in queries])
+    return searches
+
+
+async def _run(search, workload):
+    latencies, sizes = [], []
+
+    async def consultation(queries):
+        for query in queries:
+            start = time.perf_counter()
+            text = await search(query)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(len(text))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(consultation(q) for q in workload))
+    return time.perf_counter() - start, latencies, sizes
+
+
+def _report(name, elapsed, latencies, sizes, upstream, extra=""):
+    print(f"{name:9s} wall {elapsed:5.2f}s  p50 {1000 * statistics.median(latencies):6.1f}ms  "
+          f"Tavily calls {upstream:4d}  mean tool message {statistics.mean(sizes):6.0f} chars  {extra}")
+
+
+async def main(args):
+    workload = _workload(args)
+    total = sum(len(q) for q in workload)
+    print(f"{total} searches from {args.consultations} concurrent consultations, {args.distinct} distinct queries")
+
+    tavily = _FakeTavily(args.latency_ms / 1000)
+
+    async def uncached(query):
+        return json.dumps(await tavily(query), indent=2)
+    _report("uncached", *await _run(uncached, workload), tavily.calls)
+
+    with tempfile.TemporaryDirectory() as replay_dir:
+        tavily = _FakeTavily(args.latency_ms / 1000)
+        cache = SearchCache(tavily, params={"max_results": 5}, mode="record", replay_dir=replay_dir)
+        _report("cached", *await _run(cache.search, workload), tavily.calls,
+                f"hits {cache.hits}, coalesced {cache.coalesced}")
+
+        replay = SearchCache(_offline, params={"max_results": 5}, mode="replay", replay_dir=replay_dir)
+        _report("replay", *await _run(replay.search, workload), 0, f"replay misses {replay.replay_misses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultations", type=int, default=50)
+    parser.add_argument("--searches", type=int, default=4)
+    parser.add_argument("--distinct", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Nine per-specialty Chroma stores vs one unified store filtered on `specialty`.
+
+For each layout, in a fresh interpreter: load the embedding model, then open
+every store and report the added load time, RSS and open file handles, and the
+latency of single- and cross-specialty searches (Internal Medicine + Pathology).
+
+Build the unified store first:
+
+    python backend/Knowledge_notebooks/vector_rag.py --unified
+    python -m backend.benchmarks.store_layout --queries 50
+
+Run from the repository root so `./backend/vector_stores` resolves.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+_CHILD = """
+import json, os, random, resource, statistics, sys, time
+sys.path.append(os.path.join(os.getcwd(), "backend"))
+from Knowledge_notebooks.initialize_rag import VectorRAG
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def fds():
+    return len(os.listdir("/proc/self/fd"))
+
+rag = VectorRAG({layout!r})
+rag.embedding_model
+base_rss, base_fds = rss_mb(), fds()
+start = time.perf_counter()
+for domain in rag.vector_store:
+    rag.get_store(domain)
+load = time.perf_counter() - start
+stores_rss, stores_fds = rss_mb() - base_rss, fds() - base_fds
+
+dim = len(rag.embed_documents(["probe"])[0])
+def query_ms(domains):
+    timings = []
+    for _ in range({queries}):
+        vec = [random.gauss(0, 1) for _ in range(dim)]
+        norm = sum(v * v for v in vec) ** 0.5
+        vec = [v / norm for v in vec]
+        t = time.perf_counter()
+        rag.search_by_vector(domains, vec, 5)
+        timings.append((time.perf_counter() - t) * 1000)
+    return statistics.median(timings)
+
+print(json.dumps({{
+    "load_s": load, "rss_mb": stores_rss, "fds": stores_fds,
+    "single_ms": query_ms(["Pathology"]),
+    "cross_ms": query_ms(["Internal Medicine", "Pathology"]),
+}}))
+"""
+
+
+def _run(layout: str, queries: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(layout=layout, queries=queries)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(queries: int):
+    print(f"{'layout':14s} {'open stores':>12s} {'+RSS':>9s} {'+fds':>6s} {'single q':>10s} {'cross q':>10s}")
+    for layout in ("per_specialty", "unified"):
+        r = _run(layout, queries)
+        print(f"{layout:14s} {r['load_s']:11.2f}s {r['rss_mb']:7.0f}MB {r['fds']:6d} "
+              f"{r['single_ms']:8.2f}ms {r['cross_ms']:8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    main(args.queries)
@@ -0,0 +1,122 @@
+"""
+One agent turn with several tool calls: one-by-one vs ToolNode.ainvoke vs ToolDispatcher.
+
+The turn calls a web search, a RAG lookup and three `add_report` writes. The
+writes have random latency, as DB round trips do. Optionally a hung search
+(`--hang`) is added. Each strategy runs the same turn `--turns` times:
+
+* sequential: await each call in turn (what a plain loop over tool calls does);
+* toolnode: `ToolNode.ainvoke` on the whole message (gathers all calls, no order, no timeout);
+* dispatcher: `ToolDispatcher` (independent calls gathered, writes in emitted order, per-tool timeout).
+
+Reported: mean turn latency, and turns whose reports reached the "database"
+out of order. With `--hang`, also turns that ran into the timeout instead
+of waiting for the hung call.
+
+    python -m backend.benchmarks.tool_dispatch --turns 20 --hang
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from backend.tool_dispatch import ToolDispatcher
+
+written = []
+
+
+@tool
+async def search_internet(query: str) -> str:
+    """Fake web search."""
+    await asyncio.sleep(10.0 if query == "hang" else 0.3)
+    return f"results for {query}"
+
+
+@tool
+async def VectorRAG_Retrival(query: str, agent: str) -> str:
+    """Fake RAG lookup."""
+    await asyncio.sleep(0.5)
+    return f"{agent}: {query}"
+
+
+@tool
+async def add_report(report: str) -> str:
+    """Fake report write."""
+    await asyncio.sleep(random.uniform(0.02, 0.15))
+    written.append(report)
+    return "saved"
+
+
+TOOLS = [search_internet, VectorRAG_Retrival, add_report]
+
+
+def _turn(hang):
+    def call(name, **args):
+        return {"name": name, "args": args, "id": str(uuid4())}
+    calls = [call("search_internet", query="chest pain"), call("VectorRAG_Retrival", query="angina", agent="Internal Medicine")]
+    calls += [call("add_report", report=f"section {i}") for i in range(3)]
+    if hang:
+        calls.append(call("search_internet", query="hang"))
+    return AIMessage(content="", tool_calls=calls)
+
+
+def _in_graph(run):
+    """ToolNode needs a graph runtime: run each strategy as the only node of a graph, like *_Tooler nodes."""
+    async def node(state: dict) -> dict:
+        return {"outputs": await run(state["message"])}
+    graph = StateGraph(dict)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    app = graph.compile()
+
+    async def invoke(message):
+        return (await app.ainvoke({"message": message}))["outputs"]
+    return invoke
+
+
+async def main(args):
+    random.seed(7)
+    node = ToolNode(TOOLS)
+    dispatcher = ToolDispatcher(node, sequential=("add_report",), timeouts={"search_internet": args.timeout})
+
+    async def sequential(message):
+        return [(await node.ainvoke({"messages": [AIMessage(content="", tool_calls=[c])]}))["messages"][0]
+                for c in message.tool_calls]
+
+    async def toolnode(message):
+        return (await node.ainvoke({"messages": [message]}))["messages"]
+
+    async def dispatched(message):
+        return await dispatcher.dispatch(message, {})
+
+    strategies = {"sequential": sequential, "toolnode": toolnode, "dispatcher": dispatched}
+    strategies = {name: _in_graph(run) for name, run in strategies.items()}
+    print(f"{'strategy':12s} {'mean turn':>10s} {'reports out of order':>21s} {'timed-out calls':>16s}")
+    for name, run in strategies.items():
+        total, disordered, errors = 0.0, 0, 0
+        for _ in range(args.turns):
+            written.clear()
+            message = _turn(args.hang)
+            start = time.perf_counter()
+            outputs = await run(message)
+            total += time.perf_counter() - start
+            disordered += written != [f"section {i}" for i in range(3)]
+            errors += sum(getattr(m, "status", None) == "error" for m in outputs)
+            assert [m.tool_call_id for m in outputs] == [c["id"] for c in message.tool_calls]
+        print(f"{name:12s} {1000 * total / args.turns:8.0f}ms {disordered:21d} {errors:16d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--hang", action="store_true", help="add a search call that takes 10s")
+    parser.add_argument("--timeout", type=float, default=1.0, help="dispatcher timeout for search_internet")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,26 @@
+"""
+Bounded thread pool for blocking calls (SQLAlchemy, pymongo, ...) made from async code.
+
+The SSE endpoints run the graph on the event loop; any synchronous DB call made
+there would stall every other patient's stream on the worker. Wrap such calls in
+`await run_blocking(func, *args)` instead.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .config import settings
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.blocking_io_workers,
+    thread_name_prefix="blocking-io",
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the bounded pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, call)
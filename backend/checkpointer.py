@@ -0,0 +1,78 @@
+"""
+LangGraph checkpointer backends.
+
+The backend is picked by `settings.checkpointer_backend`:
+- "postgres": AsyncPostgresSaver on a psycopg connection pool pointed at the same
+  database as `database.engine`. Paused consultations survive restarts and any
+  uvicorn worker can resume any thread.
+- "sqlite":   AsyncSqliteSaver on a local file, handy for tests and single-node dev.
+- "memory":   in-process MemorySaver (old behaviour, single worker only).
+
+The async savers bind to the running event loop, so they are opened on app
+startup (see `main.py`) instead of at import time.
+"""
+
+from typing import Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from .config import settings
+from .database import SQLALCHEMY_DATABASE_URL
+
+_pool = None
+_sqlite_conn = None
+_saver: Optional[BaseCheckpointSaver] = None
+
+
+async def open_checkpointer() -> BaseCheckpointSaver:
+    """Create (once) and return the configured checkpointer."""
+    global _pool, _sqlite_conn, _saver
+    if _saver is not None:
+        return _saver
+
+    backend = settings.checkpointer_backend.lower()
+    if backend == "postgres":
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+        _pool = AsyncConnectionPool(
+            conninfo=SQLALCHEMY_DATABASE_URL,
+            min_size=settings.checkpointer_pool_min_size,
+            max_size=settings.checkpointer_pool_max_size,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        )
+        await _pool.open()
+        _saver = AsyncPostgresSaver(_pool)
+        await _saver.setup()
+    elif backend == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        _sqlite_conn = await aiosqlite.connect(settings.checkpointer_sqlite_path)
+        _saver = AsyncSqliteSaver(_sqlite_conn)
+        await _saver.setup()
+    elif backend == "memory":
+        _saver = MemorySaver()
+    else:
+        raise ValueError(f"Unknown checkpointer backend: {settings.checkpointer_backend}")
+
+    print(f"✅ Checkpointer ready ({backend})")
+    return _saver
+
+
+def checkpointer_ready() -> bool:
+    """True once `open_checkpointer` has run on this worker."""
+    return _saver is not None
+
+
+async def close_checkpointer():
+    """Release pooled connections on shutdown."""
+    global _pool, _sqlite_conn, _saver
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+    if _sqlite_conn is not None:
+        await _sqlite_conn.close()
+        _sqlite_conn = None
+    _saver = None
@@ -20,6 +20,115 @@ class Settings(BaseSettings):
     groq_api_key: str | None = None
     mongodb_uri: str = "mongodb://localhost:27017/ai_hospital"
 
+    # LangGraph checkpointer: "postgres" (shared across workers), "sqlite" (tests) or "memory"
+    checkpointer_backend: str = "postgres"
+    checkpointer_sqlite_path: str = "checkpoints.sqlite"
+    checkpointer_pool_min_size: int = 1
+    checkpointer_pool_max_size: int = 10
+
+    # Idle consultation threads are archived to Mongo and evicted from the checkpointer
+    thread_idle_ttl_seconds: int = 1800
+    thread_max_resident: int = 500
+    thread_sweep_interval_seconds: int = 60
+    thread_spill_dir: str | None = None
+
+    # Loop guard: an agent whose plain-text answer routes back to itself more than this many times in a row
+    # ends the run (GP / specialists) or hands back to the caller (Pathologist / Radiologist)
+    graph_max_self_loops: int = 3
+
+    # Prompt history per channel (history.py): once a channel's unsummarized tail exceeds its token budget,
+    # all but the last `history_keep_turns` turns are folded into a running summary ("llm" or "extractive")
+    history_enabled: bool = True
+    history_gp_token_budget: int = 3000
+    history_specialist_token_budget: int = 4000
+    history_patho_token_budget: int = 2500
+    history_radio_token_budget: int = 2500
+    history_keep_turns: int = 6
+    history_summary_tokens: int = 400
+    history_summarizer: str = "llm"
+    # QnA / report lists inlined into specialist and helper prompts keep their newest entries within this budget
+    history_qna_token_budget: int = 1500
+
+    # Tool calls in one agent turn run concurrently (add_report / Patient_data_report in order); a call past its
+    # timeout returns an error ToolMessage (the two writers have none). Per-tool overrides: "name=seconds,..."
+    tool_timeout_seconds: float = 30.0
+    tool_timeouts: str | None = "VectorRAG_Retrival=180,search_internet=20"
+
+    # search_internet: results cached by normalized query (TTL + LRU), identical in-flight queries share one call,
+    # compacted to title/url/content. Mode "live", "record" (also store raw responses) or "replay" (stored only)
+    search_cache_enabled: bool = True
+    search_cache_ttl_seconds: int = 3600
+    search_cache_max_entries: int = 512
+    search_result_max_chars: int = 600
+    search_mode: str = "live"
+    search_replay_dir: str | None = None
+
+    # add_report: queue findings and write all of a turn's reports in one transaction when the tool batch ends
+    report_buffering: bool = False
+
+    # Threads for blocking DB / Mongo calls made from the async graph path
+    blocking_io_workers: int = 16
+
+    # SQLAlchemy pool (database.py), per worker process. pool_size + max_overflow should cover blocking_io_workers;
+    # router threads beyond that wait, and a checkout waiting past the timeout raises. Pre-ping drops dead connections.
+    # Each worker opens up to pool_size + max_overflow (twice that with db_async_enabled) + checkpointer_pool_max_size
+    # Postgres connections: 10 + 10 + 10 = 30, so 3 workers fit Postgres's default max_connections=100
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    # Also open an asyncpg engine on startup; report_writer then writes from the graph without a blocking-I/O thread
+    db_async_enabled: bool = False
+
+    # RAG embedding model / Chroma stores load lazily; optionally warm them up after startup
+    rag_warmup_on_startup: bool = False
+    rag_warmup_domains: str | None = None  # comma-separated, default all
+    # "per_specialty" (nine stores) or "unified" (one store filtered on `specialty`, see vector_rag.py --unified)
+    rag_store_layout: str = "per_specialty"
+    # "float32" (Chroma HNSW) or "int8"/"float16" (sidecar from vector_rag.py --compact, re-ranked on full precision)
+    rag_vector_format: str = "float32"
+    rag_rerank_factor: int = 4
+    # Chunks sent to llm_rag, and candidates each retriever (dense / BM25) contributes to the fusion
+    rag_top_k: int = 5
+    rag_candidates_k: int = 10
+    rag_hybrid: bool = True  # fuse BM25 (bm25_index.npz sidecar) with dense results; no-op without a sidecar
+    # Dedupe/stitch overlapping chunks and drop metadata before synthesis; optionally keep only query-relevant sentences
+    rag_compress_context: bool = True
+    rag_sentence_selection: bool = False
+    rag_context_token_budget: int = 800
+
+    # Semantic cache of synthesized VectorRAG answers (per specialty, cosine on query embedding)
+    rag_cache_enabled: bool = True
+    rag_cache_threshold: float = 0.92
+    rag_cache_require_same_terms: bool = True  # also require equal content terms (allergic vs bacterial, child vs adult)
+    rag_cache_max_entries: int = 256
+    rag_cache_ttl_seconds: int = 86400
+    rag_cache_dir: str | None = None
+
+    # Query embeddings: LRU by normalized text, misses micro-batched into one forward pass
+    rag_embed_cache_size: int = 1024
+    rag_embed_batch_wait_ms: float = 5.0
+    rag_embed_max_batch: int = 32
+
+    # LLM backends per role, "provider:model" in preference order (providers: groq, gemini, stub);
+    # calls go to the fastest healthy backend and fail over on 429 / timeout / 5xx
+    llm_triage_models: str = "groq:qwen/qwen3-32b"
+    llm_specialist_models: str = "groq:qwen/qwen3-32b"
+    llm_rag_models: str = "groq:qwen/qwen3-32b"
+    llm_timeout_seconds: float = 60.0
+    llm_cooldown_seconds: float = 30.0  # a failed backend is tried last for this long
+    llm_stub_latency_ms: float = 50.0
+    llm_stub_error_rate: float = 0.0
+
+    # Shared LLM quota (Groq free tier for qwen3-32b); calls queue by priority and retry 429s with jitter
+    llm_requests_per_minute: int = 30
+    llm_tokens_per_minute: int = 6000
+    llm_burst_fraction: float = 0.1  # share of each per-minute limit that may be spent at once
+    llm_max_output_tokens: int = 1024  # reserved per call, corrected from usage_metadata afterwards
+    llm_max_attempts: int = 5
+    llm_retry_max_wait_seconds: float = 30.0
+
     model_config = SettingsConfigDict(
         env_file=str(_ENV_FILE),
         env_file_encoding="utf-8",
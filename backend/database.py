@@ -1,27 +1,167 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import psycopg2
-from psycopg2.extras import RealDictCursor
+"""
+SQLAlchemy engine, sessions and connection-pool metrics.
+
+Sessions are checked out by the routers (`get_db`) and by the graph's tools
+(`report_writer`, through `run_blocking`), so up to `blocking_io_workers` graph
+threads plus FastAPI's threadpool can hold a connection at the same time.
+`db_pool_size + db_max_overflow` should cover that; a checkout that waits
+longer than `db_pool_timeout` raises instead of hanging the request.
+
+Every checkout is timed. `pool_stats()` reports in-use / overflow counts and
+checkout waits (mean, p95, max) and timeouts, served at `/graph/db/metrics`.
+
+With DB_ASYNC_ENABLED, `open_async_engine()` (called on startup) also opens an
+asyncpg engine. `report_writer` then writes from the SSE paths without going
+through the blocking-I/O threads.
+"""
+
+import threading
 import time
+from collections import deque
 from urllib.parse import quote_plus
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
 
 # URL-encode password to handle special characters like @
 encoded_password = quote_plus(settings.database_password)
-SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{encoded_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+_DATABASE_LOCATION = f'{settings.database_username}:{encoded_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+SQLALCHEMY_DATABASE_URL = f'postgresql://{_DATABASE_LOCATION}'
+ASYNC_DATABASE_URL = f'postgresql+asyncpg://{_DATABASE_LOCATION}'
+
+
+class PoolMetrics:
+    """Checkout wait times (last `window` checkouts), timeouts and peak in-use count for one pool."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.pool = None
+
+    def record(self, wait: float, checked_out: int = None, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self._waits.append(wait)
+            if checked_out is not None:
+                self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+        pool = self.pool
+        return {
+            "size": pool.size() if pool is not None else None,
+            "checked_out": pool.checkedout() if pool is not None else None,
+            "overflow": pool.overflow() if pool is not None else None,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_mean": round(1000 * sum(waits) / len(waits), 2) if waits else None,
+            "wait_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else None,
+            "wait_ms_max": round(1000 * waits[-1], 2) if waits else None,
+        }
+
+
+class _TimedCheckout:
+    """Pool mixin: time `_do_get` (the queue wait plus any new connection) into `metrics`."""
+
+    metrics: PoolMetrics
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics.pool = self  # engine.dispose() recreates the pool from self.__class__
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start, self.checkedout())
+        return conn
+
+
+def instrumented_pool(metrics: PoolMetrics, base=QueuePool):
+    """A `base` pool class that records every checkout into `metrics`."""
+    return type(f"Timed{base.__name__}", (_TimedCheckout, base), {"metrics": metrics})
+
+
+def pool_options():
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+pool_metrics = PoolMetrics()
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=instrumented_pool(pool_metrics), **pool_options())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+async_pool_metrics = PoolMetrics()
+async_engine = None
+AsyncSessionLocal = None
+
+
+def open_async_engine():
+    """Create (once) the asyncpg engine when DB_ASYNC_ENABLED is set. Needs the `asyncpg` and `greenlet` packages."""
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None or not settings.db_async_enabled:
+        return async_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=instrumented_pool(async_pool_metrics, AsyncAdaptedQueuePool),
+        **pool_options(),
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    print("✅ Async DB engine ready (asyncpg)")
+    return async_engine
+
+
+async def dispose_engines():
+    """Close pooled connections on shutdown."""
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine, AsyncSessionLocal = None, None
+    engine.dispose()
+
+
+def pool_stats():
+    return {
+        "sync": pool_metrics.stats(),
+        "async": async_pool_metrics.stats() if async_engine is not None else None,
+    }
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """`get_db` for async endpoints; requires `open_async_engine()` to have run."""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async DB engine is not open (set DB_ASYNC_ENABLED)")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,173 @@
+"""
+Bounded prompt history per message channel: recent turns verbatim, older turns folded into a running summary.
+
+Agents used to send their whole channel (`[SystemPrompt] + state['specialist_messages']`)
+on every turn, so prompt size grew with the consultation and total tokens grew
+quadratically. `HistoryManager.window` returns what to send instead:
+
+* a summary message, if older turns have been folded;
+* the channel since the last fold, verbatim.
+
+Once that verbatim tail exceeds the channel's token budget, everything except
+the last `keep_turns` turns is folded into the summary. The summary and the
+index it covers are stored in `AgentState['history']`, so they are checkpointed
+with the thread and each message is summarized once. Cuts fall on turn
+boundaries only. An AIMessage with tool calls always stays with its
+ToolMessages.
+
+The summarizer runs inside the agent node, so its model call is tagged with
+`SUMMARY_RUN_CONFIG`: "nostream" keeps langgraph's messages stream (the SSE
+`delta` events) from forwarding its tokens as the agent's reply.
+"""
+
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+
+from .llm_scheduler import estimate_tokens
+
+_THINK = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+SUMMARY_TAG = "history_summary"
+# Config for the summarizer's model call: not streamed to the client, and recognisable in traces
+SUMMARY_RUN_CONFIG = {"tags": [TAG_NOSTREAM, SUMMARY_TAG], "run_name": SUMMARY_TAG}
+
+
+def strip_think(text: str) -> str:
+    """`text` without the <think>...</think> reasoning blocks some models (qwen3) emit, trimmed."""
+    return _THINK.sub("", text or "").strip()
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        content = " ".join(p if isinstance(p, str) else p.get("text", "") for p in content if isinstance(p, (str, dict)))
+    return strip_think(content)
+
+
+def _clip(text: str, chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars - 1] + "…"
+
+
+def render(messages, chars: int = 400) -> list:
+    """One compact line per message, used as summarizer input and as the extractive summary."""
+    lines = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            label = "Patient" if message.name == "ask_user" else f"Result of {message.name}"
+            lines.append(f"{label}: {_clip(_text(message.content), chars)}")
+        elif isinstance(message, AIMessage):
+            text = _text(message.content)
+            if text:
+                lines.append(f"Doctor: {_clip(text, chars)}")
+            for call in message.tool_calls or []:
+                args = ", ".join(f"{k}={_clip(str(v), chars // 2)}" for k, v in (call.get("args") or {}).items())
+                lines.append(f"Doctor called {call['name']}({args})")
+        elif isinstance(message, HumanMessage):
+            lines.append(f"Patient: {_clip(_text(message.content), chars)}")
+    return lines
+
+
+def recent_entries(entries, budget_tokens: int) -> str:
+    """Join the newest `entries` that fit in `budget_tokens`; for the QnA / report lists inlined into prompts."""
+    if not entries:
+        return "None"
+    kept, used = [], 0
+    for entry in reversed(entries):
+        cost = (len(entry) + 3) // 4
+        if kept and used + cost > budget_tokens:
+            break
+        kept.append(entry)
+        used += cost
+    omitted = len(entries) - len(kept)
+    joined = ", ".join(reversed(kept))
+    return f"[{omitted} earlier entries omitted] {joined}" if omitted else joined
+
+
+def _turn_starts(messages) -> list:
+    """Indexes where a turn may begin: anything but a ToolMessage (those belong to the preceding tool call)."""
+    return [i for i, m in enumerate(messages) if not isinstance(m, ToolMessage)]
+
+
+class HistoryManager:
+    def __init__(self, budgets: dict, keep_turns: int = 6, summary_tokens: int = 300, summarizer=None,
+                 enabled: bool = True):
+        """
+        budgets: channel -> token budget for the verbatim tail.
+        summarizer: `async (previous_summary, lines, max_tokens) -> str`; None keeps an extractive summary.
+        """
+        self.budgets = budgets
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.enabled = enabled
+        self.folds = 0
+        self.folded_messages = 0
+        self.summarizer_failures = 0
+        self.tokens_full = 0
+        self.tokens_sent = 0
+
+    def _extractive(self, previous: str, lines: list) -> str:
+        # Newest lines win: drop from the front until the summary fits its budget
+        lines = ([previous] if previous else []) + lines
+        while len(lines) > 1 and estimate_tokens([SystemMessage(content="\n".join(lines))]) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _cut(self, tail, budget: int) -> int:
+        """How many leading messages of `tail` to fold: all but the last `keep_turns` turns, fewer if over budget."""
+        starts = _turn_starts(tail)
+        if len(starts) <= 1:
+            return 0
+        keep = max(1, min(self.keep_turns, len(starts) - 1))
+        # Still too big with `keep` turns (e.g. long tool results): keep fewer, but always the last one
+        while keep > 1 and estimate_tokens(tail[starts[-keep]:]) > budget:
+            keep -= 1
+        return starts[-keep]
+
+    async def window(self, state, channel: str):
+        """(messages to send, state update) for `channel`; the update is {} when nothing was folded."""
+        messages = list(state.get(channel) or [])
+        history = dict(state.get("history") or {})
+        entry = history.get(channel) or {"summary": "", "upto": 0}
+        summary, upto = entry["summary"], min(entry["upto"], len(messages))
+        tail = messages[upto:]
+        update = {}
+
+        budget = self.budgets.get(channel)
+        if self.enabled and budget and estimate_tokens(tail) > budget:
+            cut = self._cut(tail, budget)
+            if cut:
+                lines = render(tail[:cut])
+                summary = await self._summarize(summary, lines)
+                upto += cut
+                tail = tail[cut:]
+                self.folds += 1
+                self.folded_messages += cut
+                history[channel] = {"summary": summary, "upto": upto}
+                update = {"history": history}
+
+        prefix = [SystemMessage(content=f"Summary of the earlier conversation (older turns are not shown):\n{summary}")] if summary else []
+        self.tokens_full += estimate_tokens(messages)
+        self.tokens_sent += estimate_tokens(prefix + tail)
+        return prefix + tail, update
+
+    async def _summarize(self, previous: str, lines: list) -> str:
+        if self.summarizer is not None:
+            try:
+                return await self.summarizer(previous, lines, self.summary_tokens)
+            except Exception as e:
+                self.summarizer_failures += 1
+                print(f"⚠️ History summarizer failed ({type(e).__name__}); keeping an extractive summary")
+        return self._extractive(previous, lines)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "folds": self.folds,
+            "folded_messages": self.folded_messages,
+            "summarizer_failures": self.summarizer_failures,
+            "est_tokens_full_history": self.tokens_full,
+            "est_tokens_sent": self.tokens_sent,
+        }
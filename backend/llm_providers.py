@@ -0,0 +1,260 @@
+"""
+Provider pools behind `llm` / `llm_rag`: per-role model lists, latency/error-aware routing, failover.
+
+Each role (`triage` for the GP, `specialist` for specialists and helpers, `rag`
+for VectorRAG synthesis) is configured as an ordered list of `provider:model`
+backends, e.g. `LLM_SPECIALIST_MODELS=groq:qwen/qwen3-32b,gemini:gemini-2.5-flash`.
+A call goes to the healthiest backend: lowest smoothed latency, penalised by
+recent error rate, with ties broken by list order. If that backend is rate
+limited, times out or is unreachable, it is cooled down and the call fails over
+to the next backend. `stub:<name>` is a local fake chat model, so routing and
+failover can be exercised offline.
+
+Failover only happens before the first token. Once a backend has streamed
+tokens (they go straight to the patient's SSE stream), replaying the call on
+another backend would show a partial answer followed by a complete one, so
+the error is raised instead.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables.config import ensure_config, patch_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .config import settings
+from .llm_scheduler import is_rate_limited
+
+# Transport-level failures worth trying another backend for (class names, so optional SDKs need not be imported)
+_TRANSIENT_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceUnavailable",
+    "DeadlineExceeded", "ConnectError", "ReadTimeout", "TimeoutException",
+}
+
+
+def is_transient(exc: BaseException) -> bool:
+    if is_rate_limited(exc) or isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return (isinstance(status, int) and status >= 500) or type(exc).__name__ in _TRANSIENT_ERRORS
+
+
+class _TokenWatch(BaseCallbackHandler):
+    """Notes whether an attempt has streamed any token."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.streamed = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.streamed = self.streamed or bool(token)
+
+
+def _with_handler(config, handler):
+    """`config` (or the graph's current config) with `handler` added next to the inherited callbacks."""
+    config = ensure_config(config)
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=False)
+    else:
+        callbacks = list(callbacks or []) + [handler]
+    return patch_config(config, callbacks=callbacks)
+
+
+class StubRateLimitError(Exception):
+    status_code = 429
+
+
+class StubChatModel(BaseChatModel):
+    """Offline chat model: fixed latency, optional random 429s, echoes the last message; supports `bind_tools`."""
+
+    model: str = "stub"
+    latency_ms: float = 50.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+    _rng: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        if self._rng.random() < self.error_rate:
+            raise StubRateLimitError(f"stub:{self.model} rate limited")
+        last = messages[-1].content if messages else ""
+        text = f"[{self.model}] {last if isinstance(last, str) else repr(last)}"[:500]
+        tokens = sum(len(str(m.content)) for m in messages) // 4
+        message = AIMessage(
+            content=text,
+            usage_metadata={"input_tokens": tokens, "output_tokens": len(text) // 4,
+                            "total_tokens": tokens + len(text) // 4},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+
+def make_chat_model(provider: str, model: str, temperature: float):
+    """Instantiate one backend. Provider SDKs are imported only when configured."""
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        # llm_scheduler owns retries so backoff is shared across consultations
+        return ChatGroq(model=model, api_key=settings.groq_api_key or os.getenv("GROQ_API_KEY"),
+                        temperature=temperature, max_retries=0)
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, google_api_key=settings.gemini_api_key or os.getenv("GEMINI_API_KEY"),
+                                      temperature=temperature, max_retries=0)
+    if provider == "stub":
+        return StubChatModel(model=model or "stub", latency_ms=settings.llm_stub_latency_ms,
+                             error_rate=settings.llm_stub_error_rate)
+    raise ValueError(f"Unknown LLM provider: {provider!r} (expected groq, gemini or stub)")
+
+
+class Backend:
+    """One `provider:model` with its health: smoothed latency, smoothed error rate and a cool-down deadline."""
+
+    def __init__(self, name: str, model, alpha: float = 0.2):
+        self.name = name
+        self.model = model
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def score(self) -> float:
+        # Unmeasured backends score 0 so each is tried once; list order breaks ties
+        return (self.latency or 0.0) * (1.0 + 4.0 * self.error_rate)
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def record(self, latency: Optional[float], failed: bool):
+        self.calls += 1
+        self.failures += failed
+        self.error_rate += self.alpha * (float(failed) - self.error_rate)
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+
+    def stats(self, now: float):
+        return {
+            "backend": self.name,
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "cooling_down_s": round(max(self.cooldown_until - now, 0.0), 1),
+        }
+
+
+class ProviderPool:
+    """
+    Chat-model facade over several backends; `ainvoke` and `bind_tools` behave like a single model.
+
+    `bind_tools` returns a pool of bound backends that shares the parent's
+    health records, so latency and failures observed by any agent steer every
+    role using the same backend.
+    """
+
+    def __init__(self, role: str, backends: List[Backend], timeout: float, cooldown: float,
+                 runnables=None, counters=None):
+        self.role = role
+        self.backends = backends
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.runnables = runnables or [b.model for b in backends]
+        self.counters = counters if counters is not None else {"failovers": 0, "failed_mid_stream": 0}
+
+    def bind_tools(self, tools, **kwargs) -> "ProviderPool":
+        bound = [b.model.bind_tools(tools, **kwargs) for b in self.backends]
+        return ProviderPool(self.role, self.backends, self.timeout, self.cooldown, bound, self.counters)
+
+    def ranked(self):
+        """Backend indexes, healthiest first; cooling-down backends last (still tried if all are cooling)."""
+        now = time.monotonic()
+        return sorted(range(len(self.backends)),
+                      key=lambda i: (self.backends[i].cooling(now), self.backends[i].score(), i))
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        last_error = None
+        for attempt, i in enumerate(self.ranked()):
+            backend = self.backends[i]
+            start = time.monotonic()
+            watch = _TokenWatch()
+            try:
+                response = await asyncio.wait_for(
+                    self.runnables[i].ainvoke(messages, _with_handler(config, watch), **kwargs), self.timeout
+                )
+            except Exception as e:
+                if not is_transient(e) or watch.streamed:
+                    backend.record(None, failed=True)
+                    if watch.streamed:  # its tokens already reached the stream; a replay elsewhere would repeat them
+                        self.counters["failed_mid_stream"] += 1
+                        if is_transient(e):
+                            backend.cooldown_until = time.monotonic() + self.cooldown
+                    raise
+                backend.record(time.monotonic() - start if isinstance(e, asyncio.TimeoutError) else None, failed=True)
+                if not backend.cooling(time.monotonic()):
+                    print(f"⚠️ LLM backend {backend.name} ({self.role}) failed: {type(e).__name__}; "
+                          f"deprioritised for {self.cooldown:.0f}s")
+                backend.cooldown_until = time.monotonic() + self.cooldown
+                last_error = e
+                continue
+            backend.record(time.monotonic() - start, failed=False)
+            self.counters["failovers"] += attempt > 0
+            return response
+        raise last_error
+
+    def stats(self):
+        now = time.monotonic()
+        return {"failovers": self.counters["failovers"], "failed_mid_stream": self.counters["failed_mid_stream"],
+                "backends": [b.stats(now) for b in self.backends]}
+
+
+def parse_backends(spec: str):
+    """`"groq:qwen/qwen3-32b, stub:fast"` -> [("groq", "qwen/qwen3-32b"), ("stub", "fast")]."""
+    backends = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item:
+            provider, _, model = item.partition(":")
+            backends.append((provider.strip().lower(), model.strip()))
+    if not backends:
+        raise ValueError("An LLM role needs at least one provider:model backend")
+    return backends
+
+
+_backends = {}
+
+
+def provider_pool(role: str, spec: str, temperature: float) -> ProviderPool:
+    """Pool for one role. Backends with the same provider, model and temperature are shared across roles."""
+    backends = []
+    for provider, model in parse_backends(spec):
+        key = (provider, model, temperature)
+        if key not in _backends:
+            _backends[key] = Backend(f"{provider}:{model}", make_chat_model(provider, model, temperature))
+        backends.append(_backends[key])
+    return ProviderPool(role, backends, settings.llm_timeout_seconds, settings.llm_cooldown_seconds)
@@ -0,0 +1,233 @@
+"""
+Process-wide scheduler for LLM calls: token buckets for requests/min and tokens/min, priorities, retry.
+
+Every consultation shares one Groq quota. Without throttling, concurrent
+consultations burst past it and all get 429s. Route every model call through
+`await llm_scheduler.ainvoke(model, messages, priority)`. The call waits for a
+request token and enough tokens-per-minute budget for its estimated size.
+Interactive agent turns go ahead of background RAG synthesis. The call is
+retried with jittered exponential backoff when the provider still rate-limits.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from enum import IntEnum
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from .config import settings
+
+try:  # Gemini (google-api-core) is optional; Groq signals rate limits with a 429 status instead
+    from google.api_core.exceptions import ResourceExhausted
+except ImportError:
+    ResourceExhausted = ()
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # GP / specialist / helper turns a patient is waiting on
+    BACKGROUND = 1   # VectorRAG synthesis and other work behind a tool call
+
+
+def estimate_tokens(messages) -> int:
+    """Rough prompt size (~4 characters per token), used to reserve tokens-per-minute budget."""
+    chars = 0
+    for message in messages:
+        content = getattr(message, "content", message)
+        chars += len(content) if isinstance(content, str) else len(str(content))
+        chars += len(str(getattr(message, "tool_calls", "") or ""))
+    return chars // 4 + 4 * len(messages)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """429 from Groq/OpenAI-style clients or ResourceExhausted from Gemini."""
+    if isinstance(exc, ResourceExhausted):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+class TokenBucket:
+    """
+    `limit` units per `period` seconds: holds at most a `burst_fraction` share of
+    the limit and refills the rest evenly; the level can go negative (debt).
+
+    The burst comes out of the refill rate, so a rolling window of `period`
+    seconds never admits more than `limit` units. Providers that enforce rolling-window
+    limits would otherwise reject a full bucket spent on top of a minute of refill.
+    """
+
+    def __init__(self, limit: float, burst_fraction: float = 0.1, period: float = 60.0):
+        self.capacity = max(1.0, limit * burst_fraction)
+        self.rate = max(limit - self.capacity, 1.0) / period
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        """Spend `amount` units (negative refunds an over-reservation, never above capacity)."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self):
+        """Provider said we're over quota: assume the bucket is empty."""
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls one at a time in (priority, arrival) order when both buckets allow.
+
+    Waiters form a heap. Only the head may consume, so a large background
+    request is never starved by a stream of small ones, and it never jumps
+    ahead of an interactive turn. A 429 drains the request bucket, so every
+    waiter backs off, not only the caller that was rejected. After a response,
+    the token reservation is corrected with the provider's `usage_metadata`,
+    and prompt-cache reads are counted per model role where the provider
+    reports them (`input_token_details.cache_read`).
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, burst_fraction: float = 0.1,
+                 max_output_tokens: int = 1024, max_attempts: int = 5, retry_max_wait: float = 30.0,
+                 period: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute, burst_fraction, period)
+        self.tokens = TokenBucket(tokens_per_minute, burst_fraction, period)
+        self.max_output_tokens = max_output_tokens
+        self.max_attempts = max_attempts
+        self.retry_max_wait = retry_max_wait
+        self._waiting = []
+        self._seq = itertools.count()
+        self._changed = None
+        self._waits = {p: deque(maxlen=512) for p in Priority}
+        self.admitted = {p.name.lower(): 0 for p in Priority}
+        self.rate_limited = 0
+        self.retries = 0
+        self.failures = 0
+        self.prompt_cache = {}
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def acquire(self, priority: Priority, tokens: int):
+        """Wait until this request is at the head of the queue and both buckets can pay for it."""
+        entry = (int(priority), next(self._seq), tokens)
+        heapq.heappush(self._waiting, entry)
+        enqueued = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if self._waiting[0] is entry:
+                    timeout = max(self.requests.delay(1), self.tokens.delay(tokens))
+                    if timeout <= 0:
+                        heapq.heappop(self._waiting)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                if self._changed is None:
+                    self._changed = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+        finally:
+            self._notify()
+        self._waits[Priority(priority)].append(time.monotonic() - enqueued)
+        self.admitted[Priority(priority).name.lower()] += 1
+
+    async def ainvoke(self, model, messages, priority: Priority = Priority.INTERACTIVE, config=None):
+        """`await model.ainvoke(messages, config)` under the rate limits, retrying rate-limit errors with jitter."""
+        reserved = estimate_tokens(messages) + self.max_output_tokens
+        retrying = AsyncRetrying(
+            retry=retry_if_exception(is_rate_limited),
+            wait=wait_random_exponential(multiplier=1, max=self.retry_max_wait),
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    self.retries += 1
+                await self.acquire(priority, reserved)
+                try:
+                    response = await (model.ainvoke(messages) if config is None else model.ainvoke(messages, config))
+                except Exception as e:
+                    if is_rate_limited(e):
+                        self.rate_limited += 1
+                        self.requests.drain()
+                        self._notify()
+                    else:
+                        self.failures += 1
+                    raise
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.tokens.take(usage["total_tokens"] - reserved)
+        self._record_cache(getattr(model, "role", None) or "other", usage)
+        return response
+
+    def _record_cache(self, role: str, usage: dict):
+        counts = self.prompt_cache.setdefault(role, {"calls": 0, "reporting": 0, "input_tokens": 0, "cache_read_tokens": 0})
+        counts["calls"] += 1
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        if cached is None:
+            return  # provider does not report prompt caching for this call
+        counts["reporting"] += 1
+        counts["input_tokens"] += usage.get("input_tokens") or 0
+        counts["cache_read_tokens"] += cached
+
+    def cache_stats(self):
+        return {
+            role: {**counts, "hit_rate": round(counts["cache_read_tokens"] / counts["input_tokens"], 3)
+                   if counts["input_tokens"] else None}
+            for role, counts in self.prompt_cache.items()
+        }
+
+    def stats(self):
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[priority.name.lower()] = {
+                "samples": len(ordered),
+                "mean_ms": round(1000 * sum(ordered) / len(ordered), 1) if ordered else None,
+                "p95_ms": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else None,
+            }
+        return {
+            "queue_depth": {p.name.lower(): sum(1 for e in self._waiting if e[0] == p) for p in Priority},
+            "admitted": dict(self.admitted),
+            "wait": waits,
+            "requests_available": round(max(self.requests.level, 0.0), 2),
+            "tokens_available": round(self.tokens.level),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "failures": self.failures,
+            "prompt_cache": self.cache_stats(),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    burst_fraction=settings.llm_burst_fraction,
+    max_output_tokens=settings.llm_max_output_tokens,
+    max_attempts=settings.llm_max_attempts,
+    retry_max_wait=settings.llm_retry_max_wait_seconds,
+)
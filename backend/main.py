@@ -1,9 +1,16 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .api import router
+from .api import router, thread_manager
+from .config import settings
+from .AI_hospital import myapp, vector_rag
+from .blocking_io import run_blocking
+from .checkpointer import open_checkpointer, close_checkpointer
 from .cors_config import add_cors_middleware
 from .routers import users, oauth, history
 from sqlalchemy.orm import Session
 from . import models, database
+from .migrations import run_migrations
 
 SPECIALISTS = [
     {"name": "Dr. A. Eye", "specialty": "Ophthalmologist"},
@@ -31,10 +38,30 @@ def seed_doctors():
         db.close()
 
 models.Base.metadata.create_all(bind=database.engine)
+run_migrations(database.engine)
 seed_doctors()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Paused consultations live in the shared checkpointer, so any worker can resume them
+    myapp.checkpointer = await open_checkpointer()
+    database.open_async_engine()
+    sweeper = asyncio.create_task(thread_manager.run_sweeper(settings.thread_sweep_interval_seconds))
+    warmup = None
+    if settings.rag_warmup_on_startup:
+        # Serve requests right away; the first RAG call waits on the same lock if it wins the race
+        domains = [d.strip() for d in settings.rag_warmup_domains.split(",")] if settings.rag_warmup_domains else None
+        warmup = asyncio.create_task(run_blocking(vector_rag.warm_up, domains))
+    yield
+    sweeper.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    await close_checkpointer()
+    await database.dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 add_cors_middleware(app)
 app.include_router(users.router)
 app.include_router(oauth.router)
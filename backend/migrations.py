@@ -0,0 +1,111 @@
+"""
+Idempotent schema migrations, applied on startup after `create_all`.
+
+`create_all` only creates missing tables, so an index added to `models.py`
+never reaches a database whose tables already exist. Each entry of
+`MIGRATIONS` runs once per database, in order, and is recorded in
+`schema_migrations`. The steps also check before creating, so re-running one
+against a fresh database (where `create_all` already made the indexes), or
+after a partial run, is a no-op.
+
+On Postgres, indexes are built with CREATE INDEX CONCURRENTLY, so a startup
+against a live database does not block writes to the tables being indexed.
+That statement cannot run inside a transaction, so the migrations run on an
+autocommit connection, and a session-level advisory lock keeps concurrently
+starting workers from applying the same migration twice. A build that fails
+leaves an INVALID index behind; the next run drops and rebuilds it. Other
+databases (SQLite in the benchmarks) run each migration in one transaction.
+
+    python -m backend.migrations      # apply pending migrations and exit
+"""
+
+import re
+
+from sqlalchemy import Column, MetaData, String, Table, TIMESTAMP, select, text
+from sqlalchemy.schema import CreateIndex
+
+from . import models
+
+_LOCK_KEY = 7340021  # pg_advisory_lock id shared by every worker
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", TIMESTAMP(timezone=True), server_default=text("CURRENT_TIMESTAMP")),
+)
+
+# Indexes behind routers/history.py (patient's consultations newest first, child rows by parent id)
+# and report_writer's active-consultation lookup
+HISTORY_INDEXES = [
+    index
+    for model in (models.Consultation, models.LabOrder, models.LabResult, models.MedicalReport)
+    for index in sorted(model.__table__.indexes, key=lambda ix: ix.name)
+]
+
+
+def concurrent_index_ddl(index, dialect) -> str:
+    """Postgres `CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS ...` for `index`."""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    return re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX CONCURRENTLY ", ddl)
+
+
+def _create_index(conn, index):
+    if conn.dialect.name != "postgresql":
+        index.create(conn, checkfirst=True)
+        return
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": index.name}).first()
+    if invalid is not None:  # left by an interrupted concurrent build; IF NOT EXISTS would keep it
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+    conn.execute(text(concurrent_index_ddl(index, conn.dialect)))
+
+
+def _history_indexes(conn):
+    for index in HISTORY_INDEXES:
+        _create_index(conn, index)
+    for table in ("consultations", "lab_orders", "lab_results", "medical_reports"):
+        conn.execute(text(f"ANALYZE {table}"))  # fresh planner statistics for the new indexes
+
+
+MIGRATIONS = [
+    ("0001_history_indexes", _history_indexes),
+]
+
+
+def _apply(conn, version, migrate) -> bool:
+    schema_migrations.create(conn, checkfirst=True)
+    done = conn.execute(select(schema_migrations.c.version).where(schema_migrations.c.version == version))
+    if done.first() is not None:
+        return False
+    migrate(conn)
+    conn.execute(schema_migrations.insert().values(version=version))
+    return True
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations; returns the versions applied by this call."""
+    applied = []
+    if engine.dialect.name == "postgresql":
+        # Autocommit (CONCURRENTLY refuses to run in a transaction), serialized by a session-level lock
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+            try:
+                applied = [version for version, migrate in MIGRATIONS if _apply(conn, version, migrate)]
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+    else:
+        for version, migrate in MIGRATIONS:
+            with engine.begin() as conn:
+                if _apply(conn, version, migrate):
+                    applied.append(version)
+    for version in applied:
+        print(f"✅ DB migration applied: {version}")
+    return applied
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    run_migrations(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index, Text, TIMESTAMP
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import text
 from .database import Base
@@ -33,22 +33,30 @@ class Consultation(Base):
 
     patient = relationship("Patient") 
 
+    # Existing databases get these through migrations.py
+    __table_args__ = (
+        Index("ix_consultations_patient_started", "patient_id", started_at.desc()),  # history, newest first
+        Index("ix_consultations_patient_status", "patient_id", "status"),  # active consultation lookup
+    )
+
 class LabOrder(Base):
     __tablename__ = "lab_orders"
     order_id = Column(Integer, primary_key=True, nullable=False)
-    consultation_id = Column(Integer, ForeignKey("consultations.consultation_id", ondelete="CASCADE"), nullable=False)
+    consultation_id = Column(Integer, ForeignKey("consultations.consultation_id", ondelete="CASCADE"), nullable=False, index=True)
     test_name = Column(String, nullable=False)
     status = Column(String, server_default="Pending")
 
+    results = relationship("LabResult")  # lets an order and its result be written in one flush
+
 class LabResult(Base):
     __tablename__ = "lab_results"
     result_id = Column(Integer, primary_key=True, nullable=False)
-    order_id = Column(Integer, ForeignKey("lab_orders.order_id", ondelete="CASCADE"), nullable=False)
+    order_id = Column(Integer, ForeignKey("lab_orders.order_id", ondelete="CASCADE"), nullable=False, index=True)
     findings = Column(Text, nullable=False)
 
 class MedicalReport(Base):
     __tablename__ = "medical_reports"
     report_id = Column(Integer, primary_key=True, nullable=False)
-    consultation_id = Column(Integer, ForeignKey("consultations.consultation_id", ondelete="CASCADE"), nullable=False)
+    consultation_id = Column(Integer, ForeignKey("consultations.consultation_id", ondelete="CASCADE"), nullable=False, index=True)
     diagnosis = Column(Text, nullable=False)
     treatment = Column(Text, nullable=False)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Database writes behind Patient_data_report and add_report: one session, one transaction, few round trips.
+
+The consultation is resolved once per thread: `create_consultation` returns its
+id, the tools hand it back as an artifact, and it is kept in
+`AgentState['consultation_id']`. Later writes go straight to that id instead
+of re-querying the newest active consultation. `write_reports` writes any
+number of findings and final reports in a single transaction. That transaction
+first locks the consultation row and checks it is still Active, so a thread
+whose consultation was abandoned (the patient started a new one) or completed
+cannot keep writing to it. A lab order and its result go out in the same flush
+through `LabOrder.results`. With REPORT_BUFFERING on, add_report only queues
+its finding, and the tool node writes every finding of the turn with one
+`write_reports` call at turn end.
+
+The graph calls the async wrappers (`acreate_consultation`, `awrite_reports`).
+They use the asyncpg engine when DB_ASYNC_ENABLED opened one, and otherwise
+run the sync functions on the blocking-I/O threads.
+"""
+
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from . import database, models
+from .blocking_io import run_blocking
+from .database import SessionLocal
+
+
+def _abandon_active(patient_id: int):
+    return update(models.Consultation).where(
+        models.Consultation.patient_id == patient_id,
+        models.Consultation.status == "Active"
+    ).values(status="Abandoned")
+
+
+def _active_id(patient_id: int, consultation_id: Optional[int] = None):
+    """The patient's newest active consultation, or `consultation_id` if it is still active; row locked till commit."""
+    query = select(models.Consultation.consultation_id).where(
+        models.Consultation.patient_id == patient_id,
+        models.Consultation.status == "Active"
+    )
+    if consultation_id is not None:
+        query = query.where(models.Consultation.consultation_id == consultation_id)
+    return query.order_by(models.Consultation.consultation_id.desc()).limit(1).with_for_update()
+
+
+def _report_rows(consultation_id: int, reports):
+    """ORM rows for `reports`, and whether one of them is a final report."""
+    rows, completed = [], False
+    for text, is_final in reports:
+        if is_final:
+            rows.append(models.MedicalReport(consultation_id=consultation_id, diagnosis=text, treatment="See details"))
+            completed = True
+        else:
+            rows.append(models.LabOrder(
+                consultation_id=consultation_id,
+                test_name="Helper Finding",
+                status="Completed",
+                results=[models.LabResult(findings=text)],
+            ))
+    return rows, completed
+
+
+def _complete(consultation_id: int):
+    return update(models.Consultation).where(
+        models.Consultation.consultation_id == consultation_id
+    ).values(status="Completed")
+
+
+def _log_written(consultation_id: int, reports, completed: bool):
+    findings = sum(not is_final for _, is_final in reports)
+    if findings:
+        print(f"✅ DB: Saved {findings} LAB RESULT(s) for Consult #{consultation_id}")
+    if completed:
+        print(f"✅ DB: Saved FINAL REPORT for Consult #{consultation_id}")
+
+
+def create_consultation(patient_id: int) -> int:
+    """Abandon the patient's active consultation (if any) and open a new one, in one transaction."""
+    with SessionLocal() as db:
+        db.execute(_abandon_active(patient_id))
+        consult = models.Consultation(patient_id=patient_id, status="Active")
+        db.add(consult)
+        db.flush()
+        consultation_id = consult.consultation_id
+        db.commit()
+    print(f"✅ DB: Created Consultation #{consultation_id}")
+    return consultation_id
+
+
+def write_reports(patient_id: int, consultation_id: Optional[int], reports) -> Optional[int]:
+    """
+    Write `reports` ([(text, is_final), ...]) to the consultation in one transaction.
+
+    A finding becomes a LabOrder plus its LabResult; a final report becomes a
+    MedicalReport and completes the consultation. Returns the consultation id
+    written to (for the caller to cache), or None if the patient has no active
+    consultation or `consultation_id` is no longer active; nothing is written then.
+    """
+    with SessionLocal() as db:
+        consultation_id = db.execute(_active_id(patient_id, consultation_id)).scalar()
+        if consultation_id is None:
+            return None
+        rows, completed = _report_rows(consultation_id, reports)
+        db.add_all(rows)
+        if completed:
+            db.execute(_complete(consultation_id))
+        db.commit()
+    _log_written(consultation_id, reports, completed)
+    return consultation_id
+
+
+async def acreate_consultation(patient_id: int) -> int:
+    if database.AsyncSessionLocal is None:
+        return await run_blocking(create_consultation, patient_id)
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(_abandon_active(patient_id))
+        consult = models.Consultation(patient_id=patient_id, status="Active")
+        db.add(consult)
+        await db.flush()
+        consultation_id = consult.consultation_id
+        await db.commit()
+    print(f"✅ DB: Created Consultation #{consultation_id}")
+    return consultation_id
+
+
+async def awrite_reports(patient_id: int, consultation_id: Optional[int], reports) -> Optional[int]:
+    if database.AsyncSessionLocal is None:
+        return await run_blocking(write_reports, patient_id, consultation_id, reports)
+    async with database.AsyncSessionLocal() as db:
+        consultation_id = (await db.execute(_active_id(patient_id, consultation_id))).scalar()
+        if consultation_id is None:
+            return None
+        rows, completed = _report_rows(consultation_id, reports)
+        db.add_all(rows)
+        if completed:
+            await db.execute(_complete(consultation_id))
+        await db.commit()
+    _log_written(consultation_id, reports, completed)
+    return consultation_id
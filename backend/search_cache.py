@@ -0,0 +1,173 @@
+"""
+Cache in front of `search_internet`: content-addressed results, TTL + LRU bound, in-flight coalescing, compact output.
+
+A search is keyed by the SHA-256 of the normalized query and the search
+parameters. A repeated query within `ttl_seconds` is served from memory.
+Identical queries issued while one is already in flight share that request
+instead of each calling Tavily. Results are compacted before they reach the
+message history: only title, url and (clipped) content are kept, as
+whitespace-free JSON.
+
+`mode` controls the network:
+
+* "live" (default): call Tavily.
+* "record": call Tavily, and write each raw response to `<replay_dir>/<key>.json`.
+* "replay": only read `<replay_dir>`, never the network. Meant for load tests and CI.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from .blocking_io import run_blocking
+
+_KEEP_FIELDS = ("title", "url", "content")
+
+
+def search_key(query: str, params: dict) -> str:
+    normalized = " ".join(query.casefold().split())
+    payload = json.dumps({"query": normalized, **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def compact_result(result, max_chars: int = 600) -> str:
+    """Tavily response -> `{"answer"?, "results": [{"title", "url", "content"}]}` as compact JSON."""
+    if isinstance(result, str):
+        return " ".join(result.split())
+    if isinstance(result, list):
+        result = {"results": result}
+    compact = {}
+    if result.get("answer"):
+        compact["answer"] = result["answer"]
+    compact["results"] = []
+    for item in result.get("results") or []:
+        entry = {k: item[k] for k in _KEEP_FIELDS if item.get(k)}
+        if "content" in entry:
+            text = " ".join(str(entry["content"]).split())
+            entry["content"] = text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+        compact["results"].append(entry)
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class SearchCache:
+    def __init__(self, fetch, params=None, ttl_seconds=3600, max_entries=512, max_chars=600,
+                 mode="live", replay_dir=None, enabled=True):
+        """fetch: `async (query) -> raw Tavily result`; params: search settings that are part of the cache key."""
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown search mode: {mode!r} (expected live, record or replay)")
+        if mode != "live" and not replay_dir:
+            raise ValueError(f"Search mode {mode!r} needs a replay directory")
+        self.fetch = fetch
+        self.params = dict(params or {})
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.mode = mode
+        self.replay_dir = replay_dir
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (created, compact text)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.upstream_calls = 0
+        self.replay_misses = 0
+        self.raw_chars = 0
+        self.compact_chars = 0
+        if replay_dir:
+            os.makedirs(replay_dir, exist_ok=True)
+
+    def _replay_path(self, key: str) -> str:
+        return os.path.join(self.replay_dir, f"{key}.json")
+
+    def _read_replay(self, key: str):
+        try:
+            with open(self._replay_path(key), encoding="utf-8") as f:
+                return json.load(f)["result"]
+        except FileNotFoundError:
+            return None
+
+    def _write_replay(self, key: str, query: str, result):
+        tmp = self._replay_path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"query": query, "params": self.params, "result": result}, f, ensure_ascii=False)
+        os.replace(tmp, self._replay_path(key))
+
+    async def _load(self, key: str, query: str) -> str:
+        if self.mode == "replay":
+            result = await run_blocking(self._read_replay, key)
+            if result is None:
+                self.replay_misses += 1
+                raise ReplayMiss(f"no recorded search response for {query!r}")
+        else:
+            self.upstream_calls += 1
+            result = await self.fetch(query)
+            if self.mode == "record":
+                await run_blocking(self._write_replay, key, query, result)
+        text = compact_result(result, self.max_chars)
+        self.raw_chars += len(json.dumps(result, indent=2)) if not isinstance(result, str) else len(result)
+        self.compact_chars += len(text)
+        return text
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key: str, text: str):
+        self._entries[key] = (time.monotonic(), text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def search(self, query: str) -> str:
+        """Compact search results for `query`. Failures propagate to every coalesced caller and are not cached."""
+        key = search_key(query, self.params)
+        if self.enabled:
+            cached = self._get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        self.misses += 1
+        task = asyncio.ensure_future(self._load(key, query))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._settle(key, t))
+        # shield: a caller that times out or is cancelled does not cancel the search for the others
+        return await asyncio.shield(task)
+
+    def _settle(self, key: str, task):
+        self._inflight.pop(key, None)
+        if self.enabled and not task.cancelled() and task.exception() is None:
+            self._put(key, task.result())
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "upstream_calls": self.upstream_calls,
+            "replay_misses": self.replay_misses,
+            "in_flight": len(self._inflight),
+            "compaction_ratio": round(self.compact_chars / self.raw_chars, 3) if self.raw_chars else None,
+        }
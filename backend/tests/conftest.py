@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+# config.Settings requires these; the tests never reach a real database or provider
+for _var in ("DATABASE_PASSWORD", "DATABASE_NAME", "DATABASE_USERNAME", "SECRET_KEY", "ALGORITHM"):
+    os.environ.setdefault(_var, "test")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch, tmp_path):
+    """A temporary SQLite database with every table of `models.py`."""
+    from sqlalchemy import create_engine
+
+    from backend.benchmarks._sqlite import use_current_timestamp
+    from backend.database import Base
+
+    use_current_timestamp(monkeypatch.setattr)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
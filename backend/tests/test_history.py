@@ -0,0 +1,134 @@
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from backend.history import SUMMARY_RUN_CONFIG, HistoryManager, render, strip_think
+from backend.llm_scheduler import LLMScheduler
+
+
+def _turns(n, words=40):
+    messages = []
+    for i in range(n):
+        messages.append(HumanMessage(content=f"turn {i} " + "symptom " * words))
+        messages.append(AIMessage(content=f"reply {i} " + "question " * words))
+    return messages
+
+
+def test_think_blocks_are_stripped():
+    assert strip_think("<think>weighing\noptions</think>\n Cardiologist ") == "Cardiologist"
+    assert strip_think(None) == ""
+    assert render([AIMessage(content="<think>hmm</think>Any fever?")]) == ["Doctor: Any fever?"]
+
+
+def test_short_channel_is_sent_verbatim():
+    manager = HistoryManager({"messages": 10_000})
+    messages = _turns(3)
+    window, update = asyncio.run(manager.window({"messages": messages}, "messages"))
+    assert window == messages
+    assert update == {}
+
+
+def test_fold_keeps_the_last_turns_and_records_the_summary():
+    manager = HistoryManager({"messages": 200}, keep_turns=2, summary_tokens=1000)
+    messages = _turns(6)
+    window, update = asyncio.run(manager.window({"messages": messages}, "messages"))
+
+    assert isinstance(window[0], SystemMessage) and "turn 0" in window[0].content
+    assert window[1:] == messages[-2:]
+    assert update["history"]["messages"]["upto"] == len(messages) - 2
+
+    # The next turn starts from the stored fold; already-summarized messages are not folded again
+    window, update = asyncio.run(manager.window({"messages": messages, **update}, "messages"))
+    assert window[1:] == messages[-2:]
+    assert update == {}
+    assert manager.folds == 1
+
+
+def test_tool_results_stay_with_their_call():
+    manager = HistoryManager({"messages": 150}, keep_turns=1)
+    call = AIMessage(content="", tool_calls=[{"name": "ask_user", "args": {"question": "Since when?"}, "id": "c1"}])
+    result = ToolMessage(content="three days " * 40, tool_call_id="c1", name="ask_user")
+    messages = _turns(2) + [call, result]
+    window, _ = asyncio.run(manager.window({"messages": messages}, "messages"))
+    assert window[1:] == [call, result]
+
+
+def test_summarizer_failure_falls_back_to_an_extractive_summary():
+    async def broken(previous, lines, max_tokens):
+        raise RuntimeError("provider down")
+
+    manager = HistoryManager({"messages": 200}, keep_turns=1, summarizer=broken)
+    window, update = asyncio.run(manager.window({"messages": _turns(4)}, "messages"))
+    assert manager.summarizer_failures == 1
+    # Extractive summaries keep the newest folded lines that fit `summary_tokens`
+    assert "Doctor: reply 2" in update["history"]["messages"]["summary"]
+    assert window[0].content.endswith(update["history"]["messages"]["summary"])
+
+
+class _Streaming(BaseChatModel):
+    """Streams `reply` word by word."""
+
+    reply: str
+
+    @property
+    def _llm_type(self):
+        return "streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self.reply.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+
+class _State(TypedDict):
+    messages: Annotated[list, add_messages]
+    history: Annotated[dict, operator.or_]
+
+
+def test_summarizer_tokens_stay_off_the_messages_stream():
+    scheduler = LLMScheduler(requests_per_minute=1000, tokens_per_minute=1_000_000)
+    summarizer_model = _Streaming(reply="SECRET SUMMARY of the consultation")
+    agent_model = _Streaming(reply="How long have you had the cough?")
+
+    async def summarize(previous, lines, max_tokens):
+        response = await scheduler.ainvoke(summarizer_model, [HumanMessage("\n".join(lines))],
+                                           config=SUMMARY_RUN_CONFIG)
+        return response.content
+
+    manager = HistoryManager({"messages": 200}, keep_turns=1, summarizer=summarize)
+
+    async def agent(state):
+        window, update = await manager.window(state, "messages")
+        return {"messages": [await agent_model.ainvoke(window)], **update}
+
+    graph = StateGraph(_State)
+    graph.add_node("agent", agent)
+    graph.add_edge(START, "agent")
+    graph.add_edge("agent", END)
+    app = graph.compile()
+
+    async def stream():
+        tokens = []
+        async for chunk, metadata in app.astream({"messages": _turns(4), "history": {}}, stream_mode="messages"):
+            if isinstance(chunk, AIMessageChunk) and chunk.content:
+                tokens.append(chunk.content)
+        return "".join(tokens)
+
+    streamed = asyncio.run(stream())
+    assert manager.folds == 1 and manager.summarizer_failures == 0
+    assert "SECRET" not in streamed
+    assert "cough" in streamed
@@ -0,0 +1,72 @@
+import asyncio
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from backend.llm_providers import Backend, ProviderPool
+
+
+class _Flaky(BaseChatModel):
+    """Streams `tokens`, then raises a timeout (a transient error) if `fail` is set."""
+
+    tokens: list
+    fail: bool = False
+
+    @property
+    def _llm_type(self):
+        return "flaky"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in self.tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        if self.fail:
+            raise asyncio.TimeoutError()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.fail:
+            raise asyncio.TimeoutError()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+
+class _Collect(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.tokens.append(token)
+
+
+def _pool(*models):
+    return ProviderPool("test", [Backend(f"b{i}", m) for i, m in enumerate(models)], timeout=5, cooldown=30)
+
+
+def test_fails_over_before_the_first_token():
+    pool = _pool(_Flaky(tokens=[], fail=True), _Flaky(tokens=["Hello", " there"]))
+    seen = _Collect()
+    response = asyncio.run(pool.ainvoke([HumanMessage("hi")], {"callbacks": [seen]}, stream=True))
+    assert response.content == "Hello there"
+    assert seen.tokens == ["Hello", " there"]
+    assert pool.stats()["failovers"] == 1
+
+
+def test_no_failover_after_tokens_reached_the_stream():
+    pool = _pool(_Flaky(tokens=["Partial"], fail=True), _Flaky(tokens=["Complete answer"]))
+    seen = _Collect()
+    try:
+        asyncio.run(pool.ainvoke([HumanMessage("hi")], {"callbacks": [seen]}, stream=True))
+    except asyncio.TimeoutError:
+        pass
+    else:
+        raise AssertionError("a mid-stream failure must not be replayed on another backend")
+    assert seen.tokens == ["Partial"]
+    assert pool.stats()["failovers"] == 0
+    assert pool.stats()["failed_mid_stream"] == 1
+    assert pool.backends[0].cooldown_until > 0
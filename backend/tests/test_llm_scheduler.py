@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend import llm_scheduler as scheduler_module
+from backend.llm_scheduler import LLMScheduler, Priority, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(scheduler_module, "time", SimpleNamespace(monotonic=lambda: now.t))
+    return now
+
+
+def test_bucket_burst_comes_out_of_the_refill_rate(clock):
+    bucket = TokenBucket(60, burst_fraction=0.1, period=60)
+    assert bucket.capacity == 6 and bucket.rate == pytest.approx(54 / 60)
+
+    # Over any rolling window of `period` seconds: burst + refill never exceed the limit
+    admitted = 0
+    for _ in range(600):
+        if bucket.delay(1) == 0:
+            bucket.take(1)
+            admitted += 1
+        clock.t += 0.1
+    assert admitted <= 60
+
+
+def test_bucket_delay_debt_refund_and_drain(clock):
+    bucket = TokenBucket(600, burst_fraction=0.1, period=60)  # capacity 60, 9 units/s
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert bucket.delay(9) == pytest.approx(1.0)
+    assert bucket.delay(10_000) == pytest.approx(60 / 9)  # capped at capacity
+
+    bucket.take(30)  # debt
+    assert bucket.level == -30
+    bucket.take(-1000)  # refund never fills past capacity
+    assert bucket.level == 60
+
+    bucket.drain()
+    assert bucket.level == 0
+    clock.t += 2
+    assert bucket.level == 0 and bucket.delay(18) == 0
+
+
+class _Model:
+    def __init__(self, log, name, failures=0, usage=None):
+        self.log, self.name, self.failures, self.usage = log, name, failures, usage
+
+    async def ainvoke(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise _RateLimited()
+        self.log.append(self.name)
+        return AIMessage(content="ok", usage_metadata=self.usage)
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+
+def test_interactive_requests_are_admitted_before_queued_background_ones():
+    # One request of burst, then one every 0.05s
+    scheduler = LLMScheduler(requests_per_minute=10, tokens_per_minute=1_000_000, period=0.45)
+    log = []
+
+    async def run():
+        scheduler.requests.take(scheduler.requests.capacity)
+        background = [asyncio.ensure_future(scheduler.ainvoke(_Model(log, f"bg{i}"), [HumanMessage("x")],
+                                                              Priority.BACKGROUND)) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(scheduler.ainvoke(_Model(log, "gp"), [HumanMessage("x")]))
+        await asyncio.gather(*background, interactive)
+
+    asyncio.run(run())
+    assert log == ["gp", "bg0", "bg1"]
+    assert scheduler.stats()["admitted"] == {"interactive": 1, "background": 2}
+
+
+def test_rate_limit_drains_the_bucket_and_retries():
+    scheduler = LLMScheduler(requests_per_minute=100, tokens_per_minute=1_000_000, period=0.5, retry_max_wait=0.01)
+    log = []
+    asyncio.run(scheduler.ainvoke(_Model(log, "gp", failures=2), [HumanMessage("x")]))
+
+    assert log == ["gp"]
+    assert scheduler.rate_limited == 2 and scheduler.retries == 2 and scheduler.failures == 0
+
+
+def test_token_reservation_is_corrected_with_reported_usage():
+    scheduler = LLMScheduler(requests_per_minute=100, tokens_per_minute=100_000, max_output_tokens=1000)
+    before = scheduler.tokens.level
+    usage = {"input_tokens": 40, "output_tokens": 10, "total_tokens": 50,
+             "input_token_details": {"cache_read": 30}}
+    model = _Model([], "gp", usage=usage)
+    model.role = "specialist"
+    asyncio.run(scheduler.ainvoke(model, [HumanMessage("x")]))
+
+    assert scheduler.tokens.level == pytest.approx(before - 50, abs=1)
+    assert scheduler.cache_stats()["specialist"]["hit_rate"] == 0.75
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import inspect, select
+from sqlalchemy.dialects import postgresql
+
+from backend import migrations
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    """The tables without the history indexes, like a deployment from before 0001."""
+    with sqlite_engine.begin() as conn:
+        for index in migrations.HISTORY_INDEXES:
+            index.drop(conn)
+    return sqlite_engine
+
+
+def _index_names(engine):
+    inspector = inspect(engine)
+    return {ix["name"] for table in ("consultations", "lab_orders", "lab_results", "medical_reports")
+            for ix in inspector.get_indexes(table)}
+
+
+def test_applies_once_and_records_the_version(engine):
+    assert migrations.run_migrations(engine) == ["0001_history_indexes"]
+    assert {ix.name for ix in migrations.HISTORY_INDEXES} <= _index_names(engine)
+    with engine.connect() as conn:
+        assert conn.execute(select(migrations.schema_migrations.c.version)).scalars().all() == ["0001_history_indexes"]
+
+    assert migrations.run_migrations(engine) == []
+
+
+def test_steps_are_idempotent_on_a_fresh_database(engine):
+    with engine.begin() as conn:
+        migrations._history_indexes(conn)  # e.g. create_all already made the indexes
+    assert migrations.run_migrations(engine) == ["0001_history_indexes"]
+
+
+def test_postgres_builds_indexes_concurrently():
+    statements = [migrations.concurrent_index_ddl(ix, postgresql.dialect()) for ix in migrations.HISTORY_INDEXES]
+    assert all(s.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS ") for s in statements)
+    assert any("started_at DESC" in s for s in statements)
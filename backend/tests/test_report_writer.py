@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, report_writer
+from backend.benchmarks._sqlite import seed_patients
+
+
+@pytest.fixture
+def db(monkeypatch, sqlite_engine):
+    """report_writer on a temporary SQLite database, with patients 1 and 2."""
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=sqlite_engine)
+    monkeypatch.setattr(report_writer, "SessionLocal", Session)
+    assert seed_patients(sqlite_engine, 2) == [1, 2]
+    return Session
+
+
+def _findings(Session, consultation_id):
+    with Session() as session:
+        return session.execute(select(func.count()).select_from(models.LabOrder)
+                               .where(models.LabOrder.consultation_id == consultation_id)).scalar()
+
+
+def test_writes_to_the_cached_or_newest_active_consultation(db):
+    consultation_id = report_writer.create_consultation(1)
+    assert report_writer.write_reports(1, consultation_id, [("finding", False)]) == consultation_id
+    assert report_writer.write_reports(1, None, [("another", False)]) == consultation_id
+    assert _findings(db, consultation_id) == 2
+
+
+def test_no_writes_to_an_abandoned_consultation(db):
+    old = report_writer.create_consultation(1)
+    new = report_writer.create_consultation(1)  # the patient started over; `old` is abandoned
+
+    assert report_writer.write_reports(1, old, [("late finding", False), ("Final Report: flu", True)]) is None
+    assert _findings(db, old) == 0
+    with db() as session:
+        assert session.get(models.Consultation, old).status == "Abandoned"
+        assert session.scalar(select(func.count()).select_from(models.MedicalReport)) == 0
+    assert report_writer.write_reports(1, None, [("finding", False)]) == new
+
+
+def test_no_writes_after_the_final_report(db):
+    consultation_id = report_writer.create_consultation(1)
+    assert report_writer.write_reports(1, consultation_id, [("Final Report: flu", True)]) == consultation_id
+    assert report_writer.write_reports(1, consultation_id, [("late finding", False)]) is None
+    assert _findings(db, consultation_id) == 0
+
+
+def test_another_patients_consultation_is_not_written(db):
+    consultation_id = report_writer.create_consultation(2)
+    assert report_writer.write_reports(1, consultation_id, [("finding", False)]) is None
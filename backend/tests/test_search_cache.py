@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.search_cache import ReplayMiss, SearchCache, compact_result, search_key
+
+
+class _Tavily:
+    """Fake upstream: counts calls, answers after `delay`, fails while `fail` is set."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self, query):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {"results": [{"title": query, "url": "https://example.org", "content": "text  " * 5, "score": 0.9}]}
+
+
+def test_key_ignores_case_and_spacing_but_not_params():
+    assert search_key("Chest  pain ", {"max_results": 2}) == search_key("chest pain", {"max_results": 2})
+    assert search_key("chest pain", {"max_results": 2}) != search_key("chest pain", {"max_results": 3})
+
+
+def test_compact_keeps_title_url_and_clipped_content():
+    compact = json.loads(compact_result({"answer": "a", "results": [{"title": "t", "url": "u", "content": "x" * 50,
+                                                                     "raw_content": "dropped"}]}, max_chars=10))
+    assert compact == {"answer": "a", "results": [{"title": "t", "url": "u", "content": "x" * 9 + "…"}]}
+
+
+def test_concurrent_identical_queries_share_one_upstream_call():
+    upstream = _Tavily()
+    cache = SearchCache(upstream)
+
+    async def run():
+        return await asyncio.gather(*(cache.search("Chest pain") for _ in range(5)), cache.search("chest  PAIN"))
+
+    results = asyncio.run(run())
+    assert upstream.calls == 1
+    assert len(set(results)) == 1
+    assert cache.stats()["coalesced"] == 5 and cache.misses == 1
+
+    asyncio.run(cache.search("chest pain"))  # now a cache hit
+    assert upstream.calls == 1 and cache.hits == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    upstream = _Tavily()
+    upstream.fail = True
+    cache = SearchCache(upstream)
+
+    async def run():
+        return await asyncio.gather(cache.search("fever"), cache.search("fever"), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(run()))
+    upstream.fail = False
+    asyncio.run(cache.search("fever"))
+    assert upstream.calls == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_search():
+    upstream = _Tavily(delay=0.2)
+    cache = SearchCache(upstream)
+
+    async def run():
+        impatient = asyncio.ensure_future(cache.search("rash"))
+        patient = asyncio.ensure_future(cache.search("rash"))
+        await asyncio.sleep(0.05)
+        impatient.cancel()
+        return await patient
+
+    assert "rash" in asyncio.run(run())
+    assert upstream.calls == 1 and cache.stats()["entries"] == 1
+
+
+def test_lru_bound_and_ttl():
+    upstream = _Tavily(delay=0)
+    cache = SearchCache(upstream, max_entries=2)
+    for query in ("a", "b", "a", "c"):  # "b" is least recently used when "c" arrives
+        asyncio.run(cache.search(query))
+    assert cache.evictions == 1
+    asyncio.run(cache.search("a"))
+    assert upstream.calls == 3
+
+    cache.ttl_seconds = 0
+    asyncio.run(cache.search("a"))
+    assert upstream.calls == 4
+
+
+def test_record_then_replay_without_the_network(tmp_path):
+    upstream = _Tavily(delay=0)
+    recorded = asyncio.run(SearchCache(upstream, mode="record", replay_dir=str(tmp_path)).search("cough"))
+
+    offline = _Tavily(delay=0)
+    replay = SearchCache(offline, mode="replay", replay_dir=str(tmp_path))
+    assert asyncio.run(replay.search("Cough")) == recorded
+    assert offline.calls == 0
+    with pytest.raises(ReplayMiss):
+        asyncio.run(replay.search("headache"))
+    assert replay.stats()["replay_misses"] == 1
@@ -0,0 +1,37 @@
+import numpy as np
+
+from Knowledge_notebooks.semantic_cache import SemanticAnswerCache, key_terms
+
+# Near neighbours in embedding space get the same vector here, so only the term guard tells them apart
+_VEC = np.ones(8, dtype=np.float32) / np.sqrt(8)
+
+
+def test_rephrasing_keeps_key_terms():
+    assert key_terms("Treating allergic conjunctivitis?") == key_terms("what is the treatment for allergic conjunctivitis")
+    assert key_terms("allergic conjunctivitis treatment") != key_terms("bacterial conjunctivitis treatment")
+    assert key_terms("amoxicillin dose for a child") != key_terms("amoxicillin dose for an adult")
+
+
+def test_near_neighbour_with_different_terms_misses():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put("Ophthalmologist", "allergic conjunctivitis treatment", _VEC, "antihistamine drops")
+
+    assert cache.get("Ophthalmologist", _VEC, query_text="bacterial conjunctivitis treatment") is None
+    assert cache.get("Ophthalmologist", _VEC, query_text="allergic conjunctivitis treatment in a child") is None
+    assert cache.get("Ophthalmologist", _VEC, query_text="how to treat allergic conjunctivitis") == "antihistamine drops"
+    assert cache.stats()["term_rejections"] == 2
+
+
+def test_guard_picks_the_entry_with_matching_terms():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put("Pediatrician", "paracetamol dose child", _VEC, "15 mg/kg")
+    cache.put("Pediatrician", "paracetamol dose adult", _VEC * 0.999, "1 g")
+
+    assert cache.get("Pediatrician", _VEC, query_text="paracetamol dose for a child") == "15 mg/kg"
+    assert cache.get("Pediatrician", _VEC, query_text="paracetamol dose for an adult") == "1 g"
+
+
+def test_guard_can_be_disabled():
+    cache = SemanticAnswerCache(threshold=0.9, require_same_terms=False)
+    cache.put("Ophthalmologist", "allergic conjunctivitis treatment", _VEC, "antihistamine drops")
+    assert cache.get("Ophthalmologist", _VEC, query_text="bacterial conjunctivitis treatment") == "antihistamine drops"
@@ -0,0 +1,113 @@
+import asyncio
+import operator
+import time
+from types import SimpleNamespace
+from typing import Annotated, TypedDict
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from backend.thread_lifecycle import ThreadLifecycleManager
+
+
+class _State(TypedDict):
+    log: Annotated[list, operator.add]
+
+
+def _app():
+    graph = StateGraph(_State)
+    graph.add_node("step", lambda state: {"log": ["step"]})
+    graph.add_edge(START, "step")
+    graph.add_edge("step", END)
+    return graph.compile(checkpointer=MemorySaver())
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _manager(app, **kwargs):
+    archived = []
+    manager = ThreadLifecycleManager(SimpleNamespace(checkpointer=app.checkpointer),
+                                     on_evict=lambda tid, pid, values: archived.append((tid, pid, values)), **kwargs)
+    return manager, archived
+
+
+def test_evict_spill_restore_round_trip(tmp_path):
+    async def run():
+        app = _app()
+        manager, archived = _manager(app, idle_ttl_seconds=0, spill_dir=str(tmp_path))
+        await app.ainvoke({"log": ["hello"]}, _config("t1"))
+        await manager.touch("t1", patient_id=7)
+        await asyncio.sleep(0.01)
+
+        assert await manager.sweep() == 1
+        assert archived == [("t1", 7, {"log": ["hello", "step"]})]
+        assert (await app.aget_state(_config("t1"))).values == {}
+
+        assert await manager.restore("t1")
+        assert (await app.aget_state(_config("t1"))).values == {"log": ["hello", "step"]}
+        assert not (tmp_path / "t1.pkl").exists()
+        assert not await manager.restore("t1")
+        assert manager.metrics()["restored_total"] == 1
+
+    asyncio.run(run())
+
+
+def test_sweep_spares_thread_written_by_another_worker():
+    async def run():
+        app = _app()
+        manager, archived = _manager(app, idle_ttl_seconds=0)
+        await app.ainvoke({"log": ["hello"]}, _config("t1"))
+        await manager.touch("t1")
+        time.sleep(0.01)
+        await app.aupdate_state(_config("t1"), {"log": ["resumed elsewhere"]})  # e.g. a resume on worker B
+
+        assert await manager.sweep() == 1
+        assert archived == []
+        assert (await app.aget_state(_config("t1"))).values["log"][-1] == "resumed elsewhere"
+        assert manager.metrics()["skipped_active_total"] == 1
+
+    asyncio.run(run())
+
+
+def test_skipped_thread_stays_tracked_and_is_evicted_once_idle():
+    async def run():
+        app = _app()
+        manager, archived = _manager(app, idle_ttl_seconds=0)
+        await app.ainvoke({"log": ["hello"]}, _config("t1"))
+        await manager.touch("t1", patient_id=7)
+        time.sleep(0.01)
+        # Written by this worker without a pin, e.g. a resume whose client left before the stream started
+        await app.aupdate_state(_config("t1"), {"log": ["resumed"]})
+
+        assert await manager.sweep() == 1
+        assert archived == [] and manager.metrics()["skipped_active_total"] == 1
+
+        await asyncio.sleep(0.01)
+        assert await manager.sweep() == 1  # still tracked, and nothing new was written
+        assert archived == [("t1", 7, {"log": ["hello", "step", "resumed"]})]
+        assert (await app.aget_state(_config("t1"))).values == {}
+
+    asyncio.run(run())
+
+
+def test_pinned_thread_survives_ttl_and_cap():
+    async def run():
+        app = _app()
+        manager, archived = _manager(app, idle_ttl_seconds=0, max_threads=1)
+        for tid in ("t1", "t2"):
+            await app.ainvoke({"log": [tid]}, _config(tid))
+        await manager.touch("t1")
+        await manager.pin("t1")
+        await manager.touch("t2")  # over the cap, but t1 is pinned
+        await asyncio.sleep(0.01)
+        assert await manager.sweep() == 1  # t2 only
+        assert [tid for tid, _, _ in archived] == ["t2"]
+
+        await manager.unpin("t1")
+        await asyncio.sleep(0.01)
+        assert await manager.sweep() == 1
+        assert [tid for tid, _, _ in archived] == ["t2", "t1"]
+
+    asyncio.run(run())
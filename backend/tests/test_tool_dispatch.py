@@ -0,0 +1,84 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from backend.tool_dispatch import ToolDispatcher, parse_timeouts
+
+written = []
+
+
+@tool
+async def add_report(text: str) -> str:
+    """Append a finding to the consultation."""
+    await asyncio.sleep(0.05 if text == "first" else 0.0)  # a slow first write must still land first
+    written.append(text)
+    return f"saved {text}"
+
+
+@tool
+async def search_internet(query: str) -> str:
+    """Search the web."""
+    await asyncio.sleep(10 if query == "hang" else 0.05)
+    return f"results for {query}"
+
+
+def _message(*calls):
+    return AIMessage(content="", tool_calls=[{"name": n, "args": a, "id": f"c{i}"} for i, (n, a) in enumerate(calls)])
+
+
+def _dispatcher(**kwargs):
+    return ToolDispatcher(ToolNode([add_report, search_internet]), sequential=("add_report",), **kwargs)
+
+
+def _dispatch(dispatcher, message):
+    """ToolNode needs a graph runtime: dispatch from the only node of a graph, like the *_Tooler nodes."""
+    async def node(state: dict) -> dict:
+        return {"outputs": await dispatcher.dispatch(state["message"], {})}
+    graph = StateGraph(dict)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    return asyncio.run(graph.compile().ainvoke({"message": message}))["outputs"]
+
+
+def test_parse_timeouts():
+    assert parse_timeouts(" search_internet=15, VectorRAG_Retrival=90,,") == {
+        "search_internet": 15.0, "VectorRAG_Retrival": 90.0}
+    assert parse_timeouts(None) == {}
+
+
+def test_writes_keep_their_order_while_searches_overlap():
+    written.clear()
+    dispatcher = _dispatcher()
+    message = _message(("search_internet", {"query": "a"}), ("add_report", {"text": "first"}),
+                       ("search_internet", {"query": "b"}), ("add_report", {"text": "second"}))
+    results = _dispatch(dispatcher, message)
+
+    assert written == ["first", "second"]
+    assert [r.tool_call_id for r in results] == ["c0", "c1", "c2", "c3"]
+    assert results[1].content == "saved first"
+    assert dispatcher.max_concurrent == 3  # both searches alongside the chain of writes
+
+
+def test_a_hung_call_times_out_without_stalling_the_turn():
+    written.clear()
+    dispatcher = _dispatcher(timeouts={"search_internet": 0.2})
+    message = _message(("search_internet", {"query": "hang"}), ("add_report", {"text": "kept"}))
+    results = _dispatch(dispatcher, message)
+
+    assert results[0].status == "error" and "timed out" in results[0].content
+    assert results[1].content == "saved kept"
+    assert dispatcher.stats()["timed_out"] == 1
+
+
+def test_sequential_tools_are_not_timed_out():
+    written.clear()
+    dispatcher = _dispatcher(default_timeout=0.01)
+    results = _dispatch(dispatcher, _message(("add_report", {"text": "first"})))
+
+    assert dispatcher.timeout("add_report") is None
+    assert results[0].content == "saved first" and written == ["first"]
+    assert dispatcher.timed_out == 0
@@ -0,0 +1,220 @@
+"""
+Lifecycle management for consultation threads in the LangGraph checkpointer.
+
+Every `/graph/start/stream` call creates a new thread and patients often abandon
+chats halfway, so without eviction the checkpointer grows forever. The manager
+keeps an LRU of the threads this worker has touched and evicts a thread when it
+has been idle longer than the TTL or when the resident cap is exceeded.
+
+Eviction archives the conversation through the `on_evict` callback (the Mongo
+archival in api.py), optionally spills the raw checkpoint to disk so the thread
+can be resumed later, and deletes it from the checkpointer.
+
+The checkpointer is shared by every worker, but the LRU is not: a thread paused
+here may be resumed on another worker. Before deleting, `_evict` therefore
+checks the latest checkpoint's own timestamp, and leaves the thread alone if it
+was written after this worker last saw it. A run in progress on this worker
+`pin`s its thread so the sweeper skips it entirely.
+"""
+
+import asyncio
+import os
+import pickle
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+from .blocking_io import run_blocking
+
+
+@dataclass
+class _ThreadEntry:
+    patient_id: Optional[int]
+    last_access: float  # monotonic, for the TTL
+    seen_at: float  # wall clock, compared with checkpoint timestamps written by any worker
+    nbytes: int
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def _checkpoint_time(latest) -> float:
+    ts = latest.checkpoint.get("ts")
+    return datetime.fromisoformat(ts).timestamp() if ts else 0.0
+
+
+def _checkpoint_nbytes(latest) -> int:
+    return len(pickle.dumps(latest.checkpoint, pickle.HIGHEST_PROTOCOL)) if latest else 0
+
+
+class ThreadLifecycleManager:
+    def __init__(
+        self,
+        app,
+        on_evict: Optional[Callable[[str, Optional[int], dict], None]] = None,
+        idle_ttl_seconds: float = 1800,
+        max_threads: int = 500,
+        spill_dir: Optional[str] = None,
+    ):
+        self.app = app
+        self.on_evict = on_evict
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_threads = max_threads
+        self.spill_dir = spill_dir
+        self._threads: "OrderedDict[str, _ThreadEntry]" = OrderedDict()
+        self._pinned: dict = {}  # thread_id -> number of runs in progress here
+        self._lock = asyncio.Lock()
+        self.evicted = 0
+        self.skipped_active = 0
+        self.spilled = 0
+        self.restored = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @property
+    def checkpointer(self):
+        return self.app.checkpointer
+
+    async def touch(self, thread_id: str, patient_id: Optional[int] = None):
+        """Mark a thread as recently used and evict the LRU tail if over the cap."""
+        latest = await self.checkpointer.aget_tuple(_config(thread_id))
+        nbytes = await run_blocking(_checkpoint_nbytes, latest)
+
+        async with self._lock:
+            previous = self._threads.pop(thread_id, None)
+            if patient_id is None and previous:
+                patient_id = previous.patient_id
+            self._threads[thread_id] = _ThreadEntry(patient_id, time.monotonic(), time.time(), nbytes)
+            overflow = []
+            for tid in list(self._threads):
+                if len(self._threads) <= self.max_threads:
+                    break
+                if tid not in self._pinned and tid != thread_id:  # pinned threads may push it past the cap
+                    overflow.append((tid, self._threads.pop(tid)))
+
+        for tid, entry in overflow:
+            await self._evict(tid, entry)
+
+    async def pin(self, thread_id: str):
+        """Keep a thread from being evicted while a run writes to it. Pair every call with `unpin`."""
+        async with self._lock:
+            self._pinned[thread_id] = self._pinned.get(thread_id, 0) + 1
+
+    async def unpin(self, thread_id: str):
+        """End a run. Its checkpoints were written here, so they count as seen by this worker."""
+        async with self._lock:
+            remaining = self._pinned.pop(thread_id, 0) - 1
+            if remaining > 0:
+                self._pinned[thread_id] = remaining
+            entry = self._threads.get(thread_id)
+            if entry is not None:
+                entry.last_access, entry.seen_at = time.monotonic(), time.time()
+
+    async def release(self, thread_id: str):
+        """Drop a finished thread. The caller has already archived it."""
+        async with self._lock:
+            self._threads.pop(thread_id, None)
+        await self.checkpointer.adelete_thread(thread_id)
+
+    async def sweep(self) -> int:
+        """Evict every thread idle for longer than the TTL. Returns the count evicted."""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        async with self._lock:
+            expired = [(tid, e) for tid, e in self._threads.items()
+                       if e.last_access < cutoff and tid not in self._pinned]
+            for tid, _ in expired:
+                del self._threads[tid]
+        for tid, entry in expired:
+            await self._evict(tid, entry)
+        return len(expired)
+
+    async def run_sweeper(self, interval_seconds: float = 60):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                evicted = await self.sweep()
+                if evicted:
+                    print(f"🧹 Evicted {evicted} idle consultation thread(s)")
+            except Exception as e:
+                print(f"⚠️ Thread sweep failed: {e}")
+
+    async def _evict(self, thread_id: str, entry: _ThreadEntry):
+        latest = await self.checkpointer.aget_tuple(_config(thread_id))
+        if latest is None:
+            return
+        written_at = _checkpoint_time(latest)
+        if written_at > entry.seen_at:
+            # Written since this worker last saw it (resumed elsewhere, or here outside pin/unpin).
+            # Keep tracking it from that write, so it is still evicted once idle.
+            self.skipped_active += 1
+            async with self._lock:
+                if thread_id not in self._threads:  # a touch in the meantime already re-tracked it
+                    entry.seen_at, entry.last_access = written_at, time.monotonic()
+                    self._threads[thread_id] = entry
+            return
+        if self.on_evict:
+            state_values = latest.checkpoint.get("channel_values", {})
+            await run_blocking(self.on_evict, thread_id, entry.patient_id, state_values)
+        if self.spill_dir:
+            await run_blocking(self._spill, thread_id, latest)
+            self.spilled += 1
+        await self.checkpointer.adelete_thread(thread_id)
+        self.evicted += 1
+
+    def _spill_path(self, thread_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{thread_id}.pkl")
+
+    def _spill(self, thread_id: str, latest):
+        data = {
+            "checkpoint": latest.checkpoint,
+            "metadata": latest.metadata,
+            "pending_writes": latest.pending_writes or [],
+        }
+        with open(self._spill_path(thread_id), "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _read_spill(path: str):
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def restore(self, thread_id: str) -> bool:
+        """Load a spilled thread back into the checkpointer. Returns False if none exists."""
+        if not self.spill_dir:
+            return False
+        path = self._spill_path(thread_id)
+        data = await run_blocking(self._read_spill, path)
+        if data is None:
+            return False
+
+        checkpoint = data["checkpoint"]
+        next_config = await self.checkpointer.aput(
+            _config(thread_id), checkpoint, data["metadata"], checkpoint["channel_versions"]
+        )
+        writes_by_task: dict = {}
+        for task_id, channel, value in data["pending_writes"]:
+            writes_by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            await self.checkpointer.aput_writes(next_config, writes, task_id)
+
+        await run_blocking(os.remove, path)
+        self.restored += 1
+        return True
+
+    def metrics(self) -> dict:
+        return {
+            "resident_threads": len(self._threads),
+            "resident_bytes": sum(e.nbytes for e in self._threads.values()),
+            "pinned_threads": len(self._pinned),
+            "max_threads": self.max_threads,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "evicted_total": self.evicted,
+            "skipped_active_total": self.skipped_active,
+            "spilled_total": self.spilled,
+            "restored_total": self.restored,
+        }
@@ -0,0 +1,95 @@
+"""
+Runs the tool calls of one agent turn: independent calls concurrently, side-effecting ones in order, each under a timeout.
+
+`ToolNode.ainvoke` gathers all calls of a message at once. It has no notion of
+calls that must not overlap: two `add_report` calls in one turn write the same
+consultation, and their order decides which one the database sees last. It also
+has no time limit, so one hung Tavily search or DB write stalls the whole
+turn. `ToolDispatcher.dispatch` runs each call through the same ToolNode (so
+state injection, artifacts and error handling are unchanged), with these rules:
+
+* calls to `sequential` tools run one after another, in the order the model emitted them;
+* every other call runs concurrently with those and with each other;
+* a call that exceeds its timeout gets an error ToolMessage, and the turn carries on.
+
+`sequential` tools get no timeout. Cancelling the await does not stop a DB
+write already running on a blocking-I/O thread: it would still commit after the
+model was told the call failed, and a retry would write it twice. Those writes
+are bounded by the connection pool's checkout timeout instead.
+
+ToolMessages are returned in tool-call order.
+"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+
+def parse_timeouts(spec: str | None) -> dict:
+    """`"search_internet=15, VectorRAG_Retrival=90"` -> {"search_internet": 15.0, "VectorRAG_Retrival": 90.0}."""
+    timeouts = {}
+    for item in (spec or "").split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class ToolDispatcher:
+    def __init__(self, node, sequential=(), timeouts=None, default_timeout: float = 30.0):
+        self.node = node
+        self.sequential = set(sequential)
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.calls = 0
+        self.timed_out = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    def timeout(self, name: str) -> float | None:
+        """Seconds allowed for a call to `name`; None (no limit) for the sequential, side-effecting tools."""
+        if name in self.sequential:
+            return None
+        return self.timeouts.get(name, self.default_timeout)
+
+    async def _run_one(self, message: AIMessage, call: dict, extra: dict) -> ToolMessage:
+        single = AIMessage(content=message.content, tool_calls=[call], id=message.id)
+        self.calls += 1
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            output = await asyncio.wait_for(self.node.ainvoke({**extra, 'messages': [single]}), self.timeout(call['name']))
+            return output['messages'][0]
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            print(f"⚠️ Tool {call['name']} timed out after {self.timeout(call['name']):.0f}s")
+            return ToolMessage(
+                content=f"Error: {call['name']} timed out after {self.timeout(call['name']):.0f}s. "
+                        f"Try again later or continue without it.",
+                name=call['name'], tool_call_id=call['id'], status="error",
+            )
+        finally:
+            self.concurrent -= 1
+
+    async def _run_in_order(self, message: AIMessage, calls, extra: dict) -> list:
+        return [await self._run_one(message, call, extra) for call in calls]
+
+    async def dispatch(self, message: AIMessage, extra: dict) -> list:
+        """ToolMessages for every call in `message`; `extra` is the rest of the ToolNode input (injected state)."""
+        calls = list(message.tool_calls or [])
+        ordered = [c for c in calls if c['name'] in self.sequential]
+        independent = [c for c in calls if c['name'] not in self.sequential]
+        results = await asyncio.gather(
+            self._run_in_order(message, ordered, extra),
+            *(self._run_one(message, call, extra) for call in independent),
+        )
+        by_id = {m.tool_call_id: m for m in results[0] + list(results[1:])}
+        return [by_id[call['id']] for call in calls]
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "timed_out": self.timed_out,
+            "in_flight": self.concurrent,
+            "max_concurrent": self.max_concurrent,
+        }
@@ -6,6 +6,7 @@ type ChatItem = {
   content: string
   speaker?: string
   timestamp?: Date
+  streaming?: boolean
 }
 
 type AskEvent = {
@@ -22,6 +23,14 @@ type MessageEventData = {
   current_agent?: string
 }
 
+type DeltaEventData = {
+  thread_id: string
+  id?: string
+  content: string
+  speaker?: string
+  current_agent?: string
+}
+
 type FinalEventData = {
   thread_id: string
   message: string | null
@@ -92,6 +101,17 @@ const formatTime = (date: Date) => {
   return date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
 }
 
+// Token deltas build a temporary bubble; the consolidated `message` event replaces it
+const appendDelta = (c: ChatItem[], data: DeltaEventData): ChatItem[] => {
+  const last = c[c.length - 1]
+  if (last && last.streaming && last.speaker === data.speaker) {
+    return [...c.slice(0, -1), { ...last, content: last.content + data.content }]
+  }
+  return [...c, { role: 'assistant', content: data.content, speaker: data.speaker, timestamp: new Date(), streaming: true }]
+}
+
+const dropDraft = (c: ChatItem[]): ChatItem[] => c.some(m => m.streaming) ? c.filter(m => !m.streaming) : c
+
 const BACKEND = import.meta.env.VITE_API_BASE || ''
 const LOGIN_URL = 'http://localhost:8000/login'
 const SIGNUP_URL = 'http://localhost:8000/users/'
@@ -306,12 +326,23 @@ export default function App() {
       setCurrentAgent('GP')
     })
 
+    es.addEventListener('delta', (e) => {
+      const data = JSON.parse((e as MessageEvent).data) as DeltaEventData
+      if (data.current_agent) setCurrentAgent(data.current_agent)
+      setIsTyping(false)
+      setChat((c) => appendDelta(c, data))
+    })
+
     es.addEventListener('message', (e) => {
       const data = JSON.parse((e as MessageEvent).data) as MessageEventData
       if (data.current_agent) setCurrentAgent(data.current_agent)
-      if (!data.content?.trim()) return
+      if (!data.content?.trim()) {
+        setChat(dropDraft)
+        return
+      }
       setIsTyping(false)
-      setChat((c) => {
+      setChat((prev) => {
+        const c = dropDraft(prev)
         const last = c[c.length - 1]
         if (last && last.role === 'assistant' && last.content === data.content) return c
         return [...c, { role: 'assistant', content: data.content, speaker: data.speaker, timestamp: new Date() }]
@@ -321,6 +352,7 @@ export default function App() {
 
     es.addEventListener('tool', (e) => {
       const data = JSON.parse((e as MessageEvent).data) as ToolEventData
+      setChat(dropDraft)
       setTools((prev) => prev.some(t => t.id === data.id) ? prev : [...prev, data])
     })
 
@@ -329,6 +361,7 @@ export default function App() {
       setPendingAsk(data)
       setIsTyping(false)
       if (data.current_agent) setCurrentAgent(data.current_agent)
+      setChat(dropDraft)
       if (data.question?.trim()) {
         setChat((c) => {
           const last = c[c.length - 1]
@@ -343,6 +376,7 @@ export default function App() {
       const data = JSON.parse((e as MessageEvent).data) as FinalEventData
       setIsTyping(false)
       if (data.current_agent) setCurrentAgent(data.current_agent)
+      setChat(dropDraft)
       if (data.message) setChat((c) => [...c, { role: 'assistant', content: data.message!, timestamp: new Date() }])
       es.close()
     })
@@ -365,12 +399,23 @@ export default function App() {
     setChat((c) => [...c, { role: 'user', content: reply, timestamp: new Date() }])
     setIsTyping(true)
 
+    es.addEventListener('delta', (e) => {
+      const data = JSON.parse((e as MessageEvent).data) as DeltaEventData
+      if (data.current_agent) setCurrentAgent(data.current_agent)
+      setIsTyping(false)
+      setChat((c) => appendDelta(c, data))
+    })
+
     es.addEventListener('message', (e) => {
       const data = JSON.parse((e as MessageEvent).data) as MessageEventData
       if (data.current_agent) setCurrentAgent(data.current_agent)
-      if (!data.content?.trim()) return
+      if (!data.content?.trim()) {
+        setChat(dropDraft)
+        return
+      }
       setIsTyping(false)
-      setChat((c) => {
+      setChat((prev) => {
+        const c = dropDraft(prev)
         const last = c[c.length - 1]
         if (last && last.role === 'assistant' && last.content === data.content) return c
         return [...c, { role: 'assistant', content: data.content, speaker: data.speaker, timestamp: new Date() }]
@@ -380,6 +425,7 @@ export default function App() {
 
     es.addEventListener('tool', (e) => {
       const data = JSON.parse((e as MessageEvent).data) as ToolEventData
+      setChat(dropDraft)
       setTools((prev) => prev.some(t => t.id === data.id) ? prev : [...prev, data])
     })
 
@@ -388,6 +434,7 @@ export default function App() {
       setPendingAsk(data)
       setIsTyping(false)
       if (data.current_agent) setCurrentAgent(data.current_agent)
+      setChat(dropDraft)
       if (data.question?.trim()) {
         setChat((c) => {
           const last = c[c.length - 1]
@@ -402,6 +449,7 @@ export default function App() {
       const data = JSON.parse((e as MessageEvent).data) as FinalEventData
       setIsTyping(false)
       if (data.current_agent) setCurrentAgent(data.current_agent)
+      setChat(dropDraft)
       if (data.message) setChat((c) => [...c, { role: 'assistant', content: data.message!, timestamp: new Date() }])
       es.close()
     })